@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import csv
+import itertools
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import wave
+
+import numpy as np
+
+r'''
+Benchmarks exported models over a grid of n_steps, batch sizes and runtimes (tf, tflite):
+  - every variant gets exported from the training checkpoint (all training flags apply)
+  - every variant gets measured in its own process through the Python Model/Stream API by
+    streaming the WAV files of a CSV in chunks of --chunk_ms (one concurrent stream per batch element)
+  - first-token latency gets measured in a separate pass that decodes intermediate results after every chunk
+  - real-time factor, first-token latency, per-chunk latency percentiles and peak memory get
+    printed as table and written as JSON
+
+As the TensorFlow and the TFLite flavor of the deepspeech package cannot be installed into the same
+environment, the Python interpreters of both can be specified by --tf_python and --tflite_python.
+
+Example:
+  python benchmark_export.py --checkpoint_dir ... --csv test.csv --scorer_path ... \
+    --bench_n_steps 8,16,32 --bench_batch_sizes 1,4 --bench_runtimes tf,tflite --bench_output bench.json
+'''
+
+CHUNK_LATENCY_PERCENTILES = [50, 90, 99]
+
+
+def read_audio(filename):
+    with wave.open(filename, 'rb') as fin:
+        return np.frombuffer(fin.readframes(fin.getnframes()), np.int16), fin.getframerate()
+
+
+def read_csv(csv_path):
+    with open(csv_path, 'r') as csvfile:
+        for row in csv.DictReader(csvfile):
+            # Relative paths are relative to the folder the CSV file is in
+            if not os.path.isabs(row['wav_filename']):
+                row['wav_filename'] = os.path.join(os.path.dirname(csv_path), row['wav_filename'])
+            yield row['wav_filename']
+
+
+def stream_file(stream, audio, chunk_samples, chunk_latencies, intermediate_every=0):
+    r'''
+    Streams audio in chunks, decoding intermediate results after every intermediate_every-th chunk (0 for never).
+    Returns the final result.
+    '''
+    for chunk_index, offset in enumerate(range(0, len(audio), chunk_samples)):
+        chunk_start = time.perf_counter()
+        stream.feedAudioContent(audio[offset:offset + chunk_samples])
+        if intermediate_every > 0 and (chunk_index + 1) % intermediate_every == 0:
+            stream.intermediateDecode()
+        chunk_latencies.append(time.perf_counter() - chunk_start)
+    return stream.finishStream()
+
+
+def first_token_latency(stream, audio, chunk_samples):
+    r'''
+    Streams audio in chunks, decoding intermediate results after every chunk like a live client would.
+    Returns the processing time until the first non-empty result or None if there is no such result.
+    '''
+    start = time.perf_counter()
+    for offset in range(0, len(audio), chunk_samples):
+        stream.feedAudioContent(audio[offset:offset + chunk_samples])
+        if len(stream.intermediateDecode()) > 0:
+            latency = time.perf_counter() - start
+            stream.freeStream()
+            return latency
+    text = stream.finishStream()
+    return time.perf_counter() - start if len(text) > 0 else None
+
+
+def run_concurrently(target, items):
+    r'''
+    Calls target for every item in its own thread and returns the results.
+    Re-raises the first exception of a failing call.
+    '''
+    results = [None] * len(items)
+    errors = [None] * len(items)
+
+    def run(index, item):
+        try:
+            results[index] = target(item)
+        except Exception as ex:  # pylint: disable=broad-except
+            errors[index] = ex
+
+    threads = [threading.Thread(target=run, args=(index, item)) for index, item in enumerate(items)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for error in errors:
+        if error is not None:
+            raise error
+    return results
+
+
+def measure(args):
+    r'''
+    Measures one exported model in this process and prints its results as JSON.
+    '''
+    import resource  # pylint: disable=import-outside-toplevel
+    from deepspeech import Model  # pylint: disable=import-outside-toplevel
+
+    model = Model(args.model)
+    if args.scorer:
+        model.enableExternalScorer(args.scorer)
+    audios = []
+    for wav_filename in read_csv(args.csv):
+        audio, rate = read_audio(wav_filename)
+        if rate != model.sampleRate():
+            raise ValueError('Sample rate of {} is {}, model expects {}'.format(wav_filename, rate, model.sampleRate()))
+        audios.append(audio)
+    if not audios:
+        raise ValueError('No audio files in {}'.format(args.csv))
+    audio_seconds = sum(len(audio) for audio in audios) / model.sampleRate()
+    if audio_seconds == 0:
+        raise ValueError('No audio samples in the files of {}'.format(args.csv))
+    chunk_samples = max(1, model.sampleRate() * args.chunk_ms // 1000)
+
+    chunk_latencies = []
+    scheduler = model.createBatchScheduler() if args.batch_size > 1 else None
+    create_stream = scheduler.createStream if scheduler else model.createStream
+
+    def run_stream(audio):
+        latencies = []
+        stream_file(create_stream(), audio, chunk_samples, latencies, intermediate_every=args.intermediate_every)
+        chunk_latencies.extend(latencies)
+
+    start = time.perf_counter()
+    # Files are streamed in groups of batch-size concurrent streams
+    for group_start in range(0, len(audios), args.batch_size):
+        run_concurrently(run_stream, audios[group_start:group_start + args.batch_size])
+    processing_time = time.perf_counter() - start
+
+    # Measured separately, as decoding after every chunk slows down the throughput measurement above
+    first_token_latencies = [first_token_latency(create_stream(), audio, chunk_samples) for audio in audios]
+    first_token_latencies = [latency for latency in first_token_latencies if latency is not None]
+    if scheduler:
+        scheduler.close()
+
+    result = {
+        'files': len(audios),
+        'audio_seconds': audio_seconds,
+        'processing_seconds': processing_time,
+        'rtf': processing_time / audio_seconds,
+        'first_token_latency_ms': 1000 * float(np.mean(first_token_latencies)) if first_token_latencies else None,
+        'peak_memory_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+    for percentile in CHUNK_LATENCY_PERCENTILES:
+        result['chunk_latency_p{}_ms'.format(percentile)] = 1000 * float(np.percentile(chunk_latencies, percentile))
+    print(json.dumps(result))
+
+
+def export_variants(args):
+    r'''
+    Exports all variants of the grid with the training code and returns their descriptions.
+    '''
+    import tensorflow.compat.v1 as tfv1  # pylint: disable=import-outside-toplevel
+    from deepspeech_training.train import export  # pylint: disable=import-outside-toplevel
+    from deepspeech_training.util.config import initialize_globals  # pylint: disable=import-outside-toplevel
+    from deepspeech_training.util.flags import FLAGS  # pylint: disable=import-outside-toplevel
+
+    initialize_globals()
+    variants = []
+    for runtime, n_steps, batch_size in itertools.product(args.bench_runtimes.split(','),
+                                                          map(int, args.bench_n_steps.split(',')),
+                                                          map(int, args.bench_batch_sizes.split(','))):
+        name = '{}_n{}_b{}'.format(runtime, n_steps, batch_size)
+        FLAGS.export_tflite = runtime == 'tflite'
+        FLAGS.n_steps = n_steps
+        FLAGS.export_batch_size = batch_size
+        FLAGS.export_dir = os.path.join(args.bench_dir, name)
+        FLAGS.export_file_name = 'output_graph'
+        tfv1.reset_default_graph()
+        export()
+        model_path = os.path.join(FLAGS.export_dir, 'output_graph' + ('.tflite' if FLAGS.export_tflite else '.pb'))
+        variants.append({'name': name, 'runtime': runtime, 'n_steps': n_steps, 'batch_size': batch_size,
+                         'model': model_path, 'model_size_mb': os.path.getsize(model_path) / 1024 / 1024})
+    return variants
+
+
+def measure_variant(args, variant, scorer):
+    python = args.tflite_python if variant['runtime'] == 'tflite' else args.tf_python
+    command = [python, os.path.abspath(__file__), '--measure',
+               '--model', variant['model'],
+               '--csv', args.csv,
+               '--batch_size', str(variant['batch_size']),
+               '--chunk_ms', str(args.chunk_ms),
+               '--intermediate_every', str(args.intermediate_every)]
+    if scorer:
+        command += ['--scorer', scorer]
+    process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    if process.returncode != 0:
+        return {'error': process.stderr.strip().split('\n')[-1]}
+    return json.loads(process.stdout.strip().split('\n')[-1])
+
+
+def format_value(value, digits=2):
+    if value is None:
+        return '-'
+    return '{:.{}f}'.format(value, digits) if isinstance(value, float) else str(value)
+
+
+def print_table(results):
+    columns = [('name', 'variant'), ('model_size_mb', 'size MB'), ('rtf', 'RTF'),
+               ('first_token_latency_ms', 'first token ms')] + \
+              [('chunk_latency_p{}_ms'.format(p), 'chunk p{} ms'.format(p)) for p in CHUNK_LATENCY_PERCENTILES] + \
+              [('peak_memory_mb', 'peak MB')]
+    rows = [[title for _, title in columns]]
+    for result in results:
+        if 'error' in result:
+            rows.append([result['name'], 'error: ' + result['error']])
+        else:
+            rows.append([format_value(result.get(key), digits=3 if key == 'rtf' else 2) for key, _ in columns])
+    widths = [max(len(row[i]) for row in rows if i < len(row)) for i in range(len(columns))]
+    for row in rows:
+        print(' | '.join(cell.ljust(width) for cell, width in zip(row, widths)))
+
+
+def main(args):
+    variants = export_variants(args)
+    from deepspeech_training.util.flags import FLAGS  # pylint: disable=import-outside-toplevel
+    results = []
+    for variant in variants:
+        print('Measuring {}...'.format(variant['name']))
+        result = dict(variant)
+        result.update(measure_variant(args, variant, FLAGS.scorer_path))
+        results.append(result)
+    print_table(results)
+    if args.bench_output:
+        with open(args.bench_output, 'w') as json_file:
+            json.dump(results, json_file, indent=2)
+        print('Results written to {}'.format(args.bench_output))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmarking exported models')
+    parser.add_argument('--csv', required=True,
+                        help='Path to the CSV file of the reference audio (WAV files in the model\'s sample rate)')
+    parser.add_argument('--chunk_ms', required=False, default=20, type=int,
+                        help='Duration of the audio chunks fed into the streams')
+    parser.add_argument('--intermediate_every', required=False, default=0, type=int,
+                        help='Number of chunks after which the throughput measurement decodes an intermediate result '
+                             '- 0 for never, as intermediate decoding processes pending audio of batched streams early')
+    parser.add_argument('--bench_n_steps', required=False, default='16',
+                        help='Comma-separated list of n_steps values to export and measure')
+    parser.add_argument('--bench_batch_sizes', required=False, default='1',
+                        help='Comma-separated list of batch sizes to export and measure with as many concurrent streams')
+    parser.add_argument('--bench_runtimes', required=False, default='tf',
+                        help='Comma-separated list of runtimes to export and measure: "tf" and/or "tflite"')
+    parser.add_argument('--bench_dir', required=False, default='benchmark_export',
+                        help='Directory to export the variants to')
+    parser.add_argument('--bench_output', required=False,
+                        help='Path of the JSON file to write the results to')
+    parser.add_argument('--tf_python', required=False, default=sys.executable,
+                        help='Python interpreter with the TensorFlow flavor of the deepspeech package')
+    parser.add_argument('--tflite_python', required=False, default=sys.executable,
+                        help='Python interpreter with the TFLite flavor of the deepspeech package')
+    # Measurement of a single variant (run as sub-process)
+    parser.add_argument('--measure', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--model', help=argparse.SUPPRESS)
+    parser.add_argument('--scorer', help=argparse.SUPPRESS)
+    parser.add_argument('--batch_size', default=1, type=int, help=argparse.SUPPRESS)
+    args, unknown = parser.parse_known_args()
+    # Reconstruct argv for absl.flags
+    sys.argv = [sys.argv[0]] + unknown
+    return args
+
+
+if __name__ == '__main__':
+    ARGS = parse_args()
+    if ARGS.measure:
+        measure(ARGS)
+    else:
+        import absl.app  # pylint: disable=import-outside-toplevel
+        from deepspeech_training.util.flags import create_flags  # pylint: disable=import-outside-toplevel
+        create_flags()
+        absl.app.run(lambda _: main(ARGS))
@@ -0,0 +1,37 @@
+#!/bin/sh
+
+set -xe
+
+ldc93s1_dir="./data/smoke_test"
+ldc93s1_csv="${ldc93s1_dir}/ldc93s1.csv"
+ldc93s1_sharded_csv="${ldc93s1_dir}/ldc93s1_horovod.csv"
+
+epoch_count=$1
+audio_sample_rate=$2
+num_processes=${3:-2}
+
+if [ ! -f "${ldc93s1_dir}/ldc93s1.csv" ]; then
+    echo "Downloading and preprocessing LDC93S1 example data, saving in ${ldc93s1_dir}."
+    python -u bin/import_ldc93s1.py ${ldc93s1_dir}
+fi;
+
+# Every process needs at least one sample of its own shard
+head -n 1 ${ldc93s1_csv} > ${ldc93s1_sharded_csv}
+for i in $(seq ${num_processes}); do
+    tail -n +2 ${ldc93s1_csv} >> ${ldc93s1_sharded_csv}
+done
+
+# Data-parallel training with CPU processes on the local machine
+export CUDA_VISIBLE_DEVICES=
+
+horovodrun -np ${num_processes} -H localhost:${num_processes} \
+  python -u DeepSpeech.py --noshow_progressbar --noearly_stop --horovod \
+  --train_files ${ldc93s1_sharded_csv} --train_batch_size 1 \
+  --feature_cache '/tmp/ldc93s1_cache_horovod' \
+  --dev_files ${ldc93s1_csv} --dev_batch_size 1 \
+  --test_files ${ldc93s1_csv} --test_batch_size 1 \
+  --n_hidden 100 --epochs $epoch_count \
+  --max_to_keep 1 --checkpoint_dir '/tmp/ckpt_horovod' \
+  --learning_rate 0.001 --dropout_rate 0.05 \
+  --scorer_path 'data/smoke_test/pruned_lm.scorer' \
+  --audio_sample_rate ${audio_sample_rate}
@@ -8,13 +8,14 @@ import numpy as np
 import wave
 import csv
 import os
+import queue
 import sys
 
-from deepspeech import Model
-from deepspeech_training.util.evaluate_tools import calculate_and_print_report
+from deepspeech import MAPPED_MODEL_EXTENSIONS, Model
+from deepspeech_training.util.evaluate_tools import process_decode_result, print_samples_report
 from deepspeech_training.util.flags import create_flags
 from functools import partial
-from multiprocessing import JoinableQueue, Process, cpu_count, Manager
+from multiprocessing import Pool, Queue, cpu_count
 from six.moves import zip, range
 
 r'''
@@ -29,93 +30,116 @@ This module should be self-contained:
 Then run with a TF Lite model, a scorer and a CSV test file
 '''
 
-def tflite_worker(model, scorer, queue_in, queue_out, gpu_mask):
-    os.environ['CUDA_VISIBLE_DEVICES'] = str(gpu_mask)
-    ds = Model(model)
-    ds.enableExternalScorer(scorer)
-
-    while True:
+# Model of the worker process, loaded once by init_worker
+worker_model = None
+
+
+def init_worker(model, scorer, gpu_masks):
+    global worker_model  # pylint: disable=global-statement
+    # Every initial worker takes its own GPU, a worker replacing a dead one keeps the default device visibility
+    try:
+        os.environ['CUDA_VISIBLE_DEVICES'] = str(gpu_masks.get(timeout=1))
+    except queue.Empty:
+        pass
+    # Memory-mapping model and scorer lets all workers share them through the page cache
+    shared = model.endswith(MAPPED_MODEL_EXTENSIONS)
+    worker_model = Model(model, shared=shared)
+    worker_model.enableExternalScorer(scorer)
+    if shared:
         try:
-            msg = queue_in.get()
+            worker_model.verifySharedMemory()
+        except (RuntimeError, OSError) as ex:
+            print('Warning: model or scorer not shared between workers: {}'.format(ex))
+
 
-            filename = msg['filename']
-            fin = wave.open(filename, 'rb')
-            audio = np.frombuffer(fin.readframes(fin.getnframes()), np.int16)
-            fin.close()
+def read_audio(filename):
+    fin = wave.open(filename, 'rb')
+    audio = np.frombuffer(fin.readframes(fin.getnframes()), np.int16)
+    fin.close()
+    return audio
 
-            decoded = ds.stt(audio)
 
-            queue_out.put({'wav': filename, 'prediction': decoded, 'ground_truth': msg['transcript']})
+def transcribe_chunk(chunk):
+    r'''
+    Transcribes a chunk of (index, filename) tuples with one batched call into the model.
+    Returns (index, prediction) tuples, with a prediction of None for unreadable files.
+    '''
+    indices, audios, missing = [], [], []
+    for index, filename in chunk:
+        try:
+            audios.append(read_audio(filename))
+            indices.append(index)
         except FileNotFoundError as ex:
             print('FileNotFoundError: ', ex)
+            missing.append((index, None))
+    predictions = worker_model.sttBatch(audios) if len(audios) > 0 else []
+    return list(zip(indices, predictions)) + missing
 
-        print(queue_out.qsize(), end='\r') # Update the current progress
-        queue_in.task_done()
 
-def main(args, _):
-    manager = Manager()
-    work_todo = JoinableQueue()   # this is where we are going to store input data
-    work_done = manager.Queue()  # this where we are gonna push them out
-
-    processes = []
-    for i in range(args.proc):
-        worker_process = Process(target=tflite_worker, args=(args.model, args.scorer, work_todo, work_done, i), daemon=True, name='tflite_process_{}'.format(i))
-        worker_process.start()        # Launch reader() as a separate python process
-        processes.append(worker_process)
-
-    print([x.name for x in processes])
-
-    wavlist = []
-    ground_truths = []
-    predictions = []
-    losses = []
-    wav_filenames = []
-
-    with open(args.csv, 'r') as csvfile:
-        csvreader = csv.DictReader(csvfile)
-        count = 0
-        for row in csvreader:
-            count += 1
+def read_csv(csv_path):
+    with open(csv_path, 'r') as csvfile:
+        for row in csv.DictReader(csvfile):
             # Relative paths are relative to the folder the CSV file is in
             if not os.path.isabs(row['wav_filename']):
-                row['wav_filename'] = os.path.join(os.path.dirname(args.csv), row['wav_filename'])
-            work_todo.put({'filename': row['wav_filename'], 'transcript': row['transcript']})
-            wav_filenames.extend(row['wav_filename'])
+                row['wav_filename'] = os.path.join(os.path.dirname(csv_path), row['wav_filename'])
+            yield row['wav_filename'], row['transcript']
 
-    print('Totally %d wav entries found in csv\n' % count)
-    work_todo.join()
-    print('\nTotally %d wav file transcripted' % work_done.qsize())
 
-    while not work_done.empty():
-        msg = work_done.get()
-        losses.append(0.0)
-        ground_truths.append(msg['ground_truth'])
-        predictions.append(msg['prediction'])
-        wavlist.append(msg['wav'])
+def chunked(items, chunk_size):
+    for i in range(0, len(items), chunk_size):
+        yield [(index, items[index][0]) for index in range(i, min(i + chunk_size, len(items)))]
+
+
+def main(args, _):
+    entries = list(read_csv(args.csv))
+    print('Totally %d wav entries found in csv\n' % len(entries))
+
+    # Idle workers take the next chunk from the shared task queue, results come back per chunk
+    samples = [None] * len(entries)
+    count = 0
+    gpu_masks = Queue()
+    for gpu_mask in range(args.proc):
+        gpu_masks.put(gpu_mask)
+    with Pool(processes=args.proc, initializer=init_worker, initargs=(args.model, args.scorer, gpu_masks)) as pool:
+        for results in pool.imap_unordered(transcribe_chunk, chunked(entries, args.chunk_size)):
+            for index, prediction in results:
+                if prediction is not None:
+                    wav_filename, transcript = entries[index]
+                    # Computing edit distances while the workers keep transcribing
+                    samples[index] = process_decode_result((wav_filename, transcript, prediction, 0.0, None))
+            count += len(results)
+            print(count, end='\r')  # Update the current progress
+
+    samples = [sample for sample in samples if sample is not None]
+    print('\nTotally %d wav file transcripted' % len(samples))
 
     # Print test summary
-    _ = calculate_and_print_report(wav_filenames, ground_truths, predictions, losses, args.csv)
+    losses = [sample.loss for sample in samples]
+    _ = print_samples_report(list(samples), losses, args.csv)
 
     if args.dump:
         with open(args.dump + '.txt', 'w') as ftxt, open(args.dump + '.out', 'w') as fout:
-            for wav, txt, out in zip(wavlist, ground_truths, predictions):
-                ftxt.write('%s %s\n' % (wav, txt))
-                fout.write('%s %s\n' % (wav, out))
+            for sample in samples:
+                ftxt.write('%s %s\n' % (sample.wav_filename, sample.src))
+                fout.write('%s %s\n' % (sample.wav_filename, sample.res))
             print('Reference texts dumped to %s.txt' % args.dump)
             print('Transcription   dumped to %s.out' % args.dump)
 
 def parse_args():
     parser = argparse.ArgumentParser(description='Computing TFLite accuracy')
     parser.add_argument('--model', required=True,
-                        help='Path to the model (protocol buffer binary file)')
+                        help='Path to the model (protocol buffer binary file) - memory-mapped .pbmm and .tflite '
+                             'models get shared between the processes')
     parser.add_argument('--scorer', required=True,
                         help='Path to the external scorer file')
     parser.add_argument('--csv', required=True,
                         help='Path to the CSV source file')
     parser.add_argument('--proc', required=False, default=cpu_count(), type=int,
                         help='Number of processes to spawn, defaulting to number of CPUs')
+    parser.add_argument('--chunk_size', required=False, default=16, type=int,
+                        help='Number of files a worker transcribes per job')
     parser.add_argument('--dump', required=False,
-                        help='Path to dump the results as text file, with one line for each wav: "wav transcription".')
+                        help='Path to dump the results as text file, with one line for each wav: "wav transcription", in CSV order.')
     args, unknown = parser.parse_known_args()
     # Reconstruct argv for absl.flags
     sys.argv = [sys.argv[0]] + unknown
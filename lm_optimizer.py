@@ -3,11 +3,16 @@
 from __future__ import absolute_import, print_function
 
 import absl.app
+import multiprocessing
 import optuna
+import os
+import shutil
 import sys
+import tempfile
 import tensorflow.compat.v1 as tfv1
 
-from deepspeech_training.evaluate import evaluate
+from functools import partial
+from deepspeech_training.evaluate import compute_logits, create_decoder, evaluate_logits
 from deepspeech_training.train import create_model
 from deepspeech_training.util.config import Config, initialize_globals
 from deepspeech_training.util.flags import create_flags, FLAGS
@@ -23,17 +28,19 @@ def character_based():
         is_character_based = scorer.is_utf8_mode()
     return is_character_based
 
-def objective(trial):
+def objective(trial, logits_sets, scorer, decoder):
     FLAGS.lm_alpha = trial.suggest_uniform('lm_alpha', 0, FLAGS.lm_alpha_max)
     FLAGS.lm_beta = trial.suggest_uniform('lm_beta', 0, FLAGS.lm_beta_max)
 
     is_character_based = trial.study.user_attrs['is_character_based']
 
-    samples = []
-    for step, test_file in enumerate(FLAGS.test_files.split(',')):
-        tfv1.reset_default_graph()
+    if scorer:
+        scorer.reset_params(FLAGS.lm_alpha, FLAGS.lm_beta)
 
-        current_samples = evaluate([test_file], create_model)
+    samples = []
+    for step, logits_set in enumerate(logits_sets):
+        # Only the decoder has to run, acoustic model outputs got computed upfront
+        current_samples = evaluate_logits(logits_set, decoder)
         samples += current_samples
 
         # Report intermediate objective value.
@@ -47,6 +54,40 @@ def objective(trial):
     wer, cer = wer_cer_batch(samples)
     return cer if is_character_based else wer
 
+def create_scorer():
+    return Scorer(FLAGS.lm_alpha, FLAGS.lm_beta, FLAGS.scorer_path, Config.alphabet) if FLAGS.scorer_path else None
+
+def run_worker(storage, logits_sets, n_trials, num_processes):
+    # Every worker holds one loaded scorer that just gets its parameters reset per trial
+    scorer = create_scorer()
+    decoder = create_decoder(scorer, num_processes=num_processes)
+    study = optuna.load_study(study_name=FLAGS.study_name, storage=storage)
+    study.optimize(partial(objective, logits_sets=logits_sets, scorer=scorer, decoder=decoder),
+                   n_jobs=1, n_trials=n_trials)
+
+def optimize_parallel(study, storage, logits_sets):
+    n_workers = FLAGS.n_trial_processes
+    try:
+        num_processes = max(1, multiprocessing.cpu_count() // n_workers)
+    except NotImplementedError:
+        num_processes = 1
+    # Forking shares the (memory-mapped) acoustic model outputs with all workers
+    context = multiprocessing.get_context('fork')
+    workers = []
+    for i in range(n_workers):
+        n_trials = FLAGS.n_trials // n_workers + (1 if i < FLAGS.n_trials % n_workers else 0)
+        worker = context.Process(target=run_worker,
+                                 args=(storage, logits_sets, n_trials, num_processes),
+                                 name='lm_optimizer_worker_{}'.format(i))
+        worker.start()
+        workers.append(worker)
+    for worker in workers:
+        worker.join()
+    if any(worker.exitcode != 0 for worker in workers):
+        log_error('At least one hyperparameter optimization worker failed.')
+        sys.exit(1)
+    return optuna.load_study(study_name=study.study_name, storage=storage)
+
 def main(_):
     initialize_globals()
 
@@ -55,15 +96,37 @@ def main(_):
                   'the --test_files flag.')
         sys.exit(1)
 
-    is_character_based = character_based()
+    if FLAGS.n_trial_processes < 1:
+        log_error('--n_trial_processes has to be at least 1.')
+        sys.exit(1)
 
-    study = optuna.create_study()
-    study.set_user_attr("is_character_based", is_character_based)
-    study.optimize(objective, n_jobs=1, n_trials=FLAGS.n_trials)
-    print('Best params: lm_alpha={} and lm_beta={} with WER={}'.format(study.best_params['lm_alpha'],
-                                                                       study.best_params['lm_beta'],
-                                                                       study.best_value))
+    is_character_based = character_based()
 
+    # Acoustic model outputs do not depend on lm_alpha and lm_beta, so we compute them only once
+    tfv1.reset_default_graph()
+    logits_sets = compute_logits(FLAGS.test_files.split(','), create_model, cache_dir=FLAGS.logits_cache_dir)
+
+    storage = FLAGS.study_storage or None
+    tmp_dir = None
+    if storage is None and FLAGS.n_trial_processes > 1:
+        tmp_dir = tempfile.mkdtemp()
+        storage = 'sqlite:///{}'.format(os.path.join(tmp_dir, 'study.db'))
+
+    try:
+        study = optuna.create_study(study_name=FLAGS.study_name, storage=storage, load_if_exists=True)
+        study.set_user_attr("is_character_based", is_character_based)
+        if FLAGS.n_trial_processes > 1:
+            study = optimize_parallel(study, storage, logits_sets)
+        else:
+            scorer = create_scorer()
+            study.optimize(partial(objective, logits_sets=logits_sets, scorer=scorer, decoder=create_decoder(scorer)),
+                           n_jobs=1, n_trials=FLAGS.n_trials)
+        print('Best params: lm_alpha={} and lm_beta={} with WER={}'.format(study.best_params['lm_alpha'],
+                                                                           study.best_params['lm_beta'],
+                                                                           study.best_value))
+    finally:
+        if tmp_dir:
+            shutil.rmtree(tmp_dir)
 
 if __name__ == '__main__':
     create_flags()
@@ -1,5 +1,10 @@
 from __future__ import absolute_import, division, print_function
 
+from collections import namedtuple
+from multiprocessing import cpu_count
+
+import numpy as np
+
 from . import swigwrapper # pylint: disable=import-self
 from .swigwrapper import UTF8Alphabet
 
@@ -148,3 +153,105 @@ def ctc_beam_search_decoder_batch(probs_seq,
         for beam_results in batch_beam_results
     ]
     return batch_beam_results
+
+
+DecodedBatch = namedtuple('DecodedBatch', 'result_offsets confidences texts token_offsets tokens timesteps log_probs')
+DecodedBatch.__doc__ = """Columnar beam search results of a batch.
+
+Results of batch element ``i`` are the indices
+``result_offsets[i]:result_offsets[i + 1]`` into ``confidences`` and ``texts``,
+in descending order of confidence. Tokens of result ``j`` are the indices
+``token_offsets[j]:token_offsets[j + 1]`` into ``tokens``, ``timesteps`` and
+``log_probs`` (the acoustic log probability of each token).
+"""
+
+
+class BatchDecoder(swigwrapper.BatchDecoder):
+    """Batched CTC beam search decoder which owns a long-lived pool of worker
+    threads, so that no thread pool has to be created per decoded batch.
+
+    :param alphabet: Alphabet
+    :param beam_size: Width for beam search.
+    :type beam_size: int
+    :param num_processes: Number of worker threads, defaults to the number
+                          of CPUs.
+    :type num_processes: int
+    :param cutoff_prob: Cutoff probability in alphabet pruning,
+                        default 1.0, no pruning.
+    :type cutoff_prob: float
+    :param cutoff_top_n: Cutoff number in pruning, only top cutoff_top_n
+                         characters with highest probs in alphabet will be
+                         used in beam search, default 40.
+    :type cutoff_top_n: int
+    :param scorer: External scorer for partially decoded sentence, e.g. word
+                   count or language model. Parameter changes through
+                   :func:`Scorer.reset_params` apply to subsequent batches.
+    :type scorer: Scorer
+    """
+    def __init__(self, alphabet, beam_size, num_processes=None, cutoff_prob=1.0, cutoff_top_n=40, scorer=None):
+        if num_processes is None:
+            try:
+                num_processes = cpu_count()
+            except NotImplementedError:
+                num_processes = 1
+        super(BatchDecoder, self).__init__(alphabet, beam_size, num_processes, cutoff_prob, cutoff_top_n, scorer)
+        self.alphabet = alphabet
+        # Keep a reference to prevent premature garbage collection
+        self.scorer = scorer
+
+    def decode(self, probs_seq, seq_lengths):
+        """Decode a batch.
+
+        :param probs_seq: NumPy array of shape [batch_size, time_dim, class_dim]
+                          with probability distributions over alphabet and
+                          blank for each time step of each batch element.
+        :type probs_seq: numpy.ndarray
+        :param seq_lengths: Number of valid time steps per batch element.
+        :type seq_lengths: numpy.ndarray
+        :return: List of lists of tuples of confidence and sentence as decoding
+                 results, in descending order of the confidence.
+        :rtype: list
+        """
+        decoded = self.decode_columns(probs_seq, seq_lengths)
+        confidences = decoded.confidences.tolist()
+        return [
+            list(zip(confidences[start:end], decoded.texts[start:end]))
+            for start, end in zip(decoded.result_offsets[:-1], decoded.result_offsets[1:])
+        ]
+
+    def decode_columns(self, probs_seq, seq_lengths, num_results=1):
+        """Decode a batch into columnar NumPy results.
+
+        :param probs_seq: NumPy array of shape [batch_size, time_dim, class_dim]
+                          with probability distributions over alphabet and
+                          blank for each time step of each batch element.
+                          Contiguous float32 arrays are passed to the decoder
+                          without being copied or widened to double.
+        :type probs_seq: numpy.ndarray
+        :param seq_lengths: Number of valid time steps per batch element.
+        :type seq_lengths: numpy.ndarray
+        :param num_results: Maximum number of results (N-best candidates) per
+                            batch element.
+        :type num_results: int
+        :return: Columnar decoding results with texts decoded natively.
+        :rtype: DecodedBatch
+        """
+        seq_lengths = np.ascontiguousarray(seq_lengths, dtype=np.intc)
+        if isinstance(probs_seq, np.ndarray) and probs_seq.dtype == np.float32:
+            output = super(BatchDecoder, self).decode_columns_f32(probs_seq, seq_lengths, num_results)
+        else:
+            output = super(BatchDecoder, self).decode_columns(probs_seq, seq_lengths, num_results)
+        result_offsets = np.empty(output.batch_size() + 1, dtype=np.intc)
+        output.copy_result_offsets(result_offsets)
+        confidences = np.empty(output.num_results(), dtype=np.float64)
+        output.copy_confidences(confidences)
+        token_offsets = np.empty(output.num_results() + 1, dtype=np.intc)
+        output.copy_token_offsets(token_offsets)
+        tokens = np.empty(output.num_tokens(), dtype=np.uintc)
+        output.copy_tokens(tokens)
+        timesteps = np.empty(output.num_tokens(), dtype=np.uintc)
+        output.copy_timesteps(timesteps)
+        log_probs = np.empty(output.num_tokens(), dtype=np.float32)
+        output.copy_log_probs(log_probs)
+        texts = [text.decode('utf-8') for text in output.texts()]
+        return DecodedBatch(result_offsets, confidences, texts, token_offsets, tokens, timesteps, log_probs)
@@ -52,6 +52,23 @@ void
 DecoderState::next(const double *probs,
                    int time_dim,
                    int class_dim)
+{
+  next_impl(probs, time_dim, class_dim);
+}
+
+void
+DecoderState::next(const float *probs,
+                   int time_dim,
+                   int class_dim)
+{
+  next_impl(probs, time_dim, class_dim);
+}
+
+template<typename T>
+void
+DecoderState::next_impl(const T *probs,
+                        int time_dim,
+                        int class_dim)
 {
   // prefix search over time
   for (size_t rel_time_step = 0; rel_time_step < time_dim; ++rel_time_step, ++abs_time_step_) {
@@ -207,7 +224,7 @@ DecoderState::decode(size_t num_results) const
 
   for (size_t i = 0; i < num_returned; ++i) {
     Output output;
-    prefixes_copy[i]->get_path_vec(output.tokens, output.timesteps);
+    prefixes_copy[i]->get_path_vec(output.tokens, output.timesteps, output.log_probs);
     output.confidence = scores[prefixes_copy[i]];
     outputs.push_back(output);
   }
@@ -215,46 +232,59 @@ DecoderState::decode(size_t num_results) const
   return outputs;
 }
 
-std::vector<Output> ctc_beam_search_decoder(
-    const double *probs,
+template<typename T>
+static std::vector<Output>
+decode_sequence(
+    const T *probs,
     int time_dim,
     int class_dim,
     const Alphabet &alphabet,
     size_t beam_size,
     double cutoff_prob,
     size_t cutoff_top_n,
-    std::shared_ptr<Scorer> ext_scorer)
+    std::shared_ptr<Scorer> ext_scorer,
+    size_t num_results)
 {
   DecoderState state;
   state.init(alphabet, beam_size, cutoff_prob, cutoff_top_n, ext_scorer);
   state.next(probs, time_dim, class_dim);
-  return state.decode();
+  return state.decode(num_results);
 }
 
-std::vector<std::vector<Output>>
-ctc_beam_search_decoder_batch(
+std::vector<Output> ctc_beam_search_decoder(
     const double *probs,
-    int batch_size,
     int time_dim,
     int class_dim,
-    const int* seq_lengths,
-    int seq_lengths_size,
     const Alphabet &alphabet,
     size_t beam_size,
-    size_t num_processes,
     double cutoff_prob,
     size_t cutoff_top_n,
     std::shared_ptr<Scorer> ext_scorer)
 {
-  VALID_CHECK_GT(num_processes, 0, "num_processes must be nonnegative!");
-  VALID_CHECK_EQ(batch_size, seq_lengths_size, "must have one sequence length per batch element");
-  // thread pool
-  ThreadPool pool(num_processes);
+  return decode_sequence(probs, time_dim, class_dim, alphabet, beam_size,
+                         cutoff_prob, cutoff_top_n, ext_scorer, 1);
+}
 
+template<typename T>
+static std::vector<std::vector<Output>>
+decode_batch(
+    ThreadPool &pool,
+    const T *probs,
+    int batch_size,
+    int time_dim,
+    int class_dim,
+    const int* seq_lengths,
+    const Alphabet &alphabet,
+    size_t beam_size,
+    double cutoff_prob,
+    size_t cutoff_top_n,
+    std::shared_ptr<Scorer> ext_scorer,
+    size_t num_results)
+{
   // enqueue the tasks of decoding
   std::vector<std::future<std::vector<Output>>> res;
   for (size_t i = 0; i < batch_size; ++i) {
-    res.emplace_back(pool.enqueue(ctc_beam_search_decoder,
+    res.emplace_back(pool.enqueue(decode_sequence<T>,
                                   &probs[i*time_dim*class_dim],
                                   seq_lengths[i],
                                   class_dim,
@@ -262,7 +292,8 @@ ctc_beam_search_decoder_batch(
                                   beam_size,
                                   cutoff_prob,
                                   cutoff_top_n,
-                                  ext_scorer));
+                                  ext_scorer,
+                                  num_results));
   }
 
   // get decoding results
@@ -272,3 +303,221 @@ ctc_beam_search_decoder_batch(
   }
   return batch_results;
 }
+
+std::vector<std::vector<Output>>
+ctc_beam_search_decoder_batch(
+    const double *probs,
+    int batch_size,
+    int time_dim,
+    int class_dim,
+    const int* seq_lengths,
+    int seq_lengths_size,
+    const Alphabet &alphabet,
+    size_t beam_size,
+    size_t num_processes,
+    double cutoff_prob,
+    size_t cutoff_top_n,
+    std::shared_ptr<Scorer> ext_scorer)
+{
+  VALID_CHECK_GT(num_processes, 0, "num_processes must be nonnegative!");
+  VALID_CHECK_EQ(batch_size, seq_lengths_size, "must have one sequence length per batch element");
+  // thread pool
+  ThreadPool pool(num_processes);
+
+  return decode_batch(pool, probs, batch_size, time_dim, class_dim, seq_lengths,
+                      alphabet, beam_size, cutoff_prob, cutoff_top_n, ext_scorer, 1);
+}
+
+BatchDecoder::BatchDecoder(const Alphabet& alphabet,
+                           size_t beam_size,
+                           size_t num_processes,
+                           double cutoff_prob,
+                           size_t cutoff_top_n,
+                           std::shared_ptr<Scorer> ext_scorer)
+  : alphabet_(alphabet)
+  , beam_size_(beam_size)
+  , cutoff_prob_(cutoff_prob)
+  , cutoff_top_n_(cutoff_top_n)
+  , ext_scorer_(ext_scorer)
+{
+  VALID_CHECK_GT(num_processes, 0, "num_processes must be nonnegative!");
+  pool_.reset(new ThreadPool(num_processes));
+}
+
+// Defined here as ThreadPool is an incomplete type in the header
+BatchDecoder::~BatchDecoder() = default;
+
+std::vector<std::vector<Output>>
+BatchDecoder::decode(
+    const double *probs,
+    int batch_size,
+    int time_dim,
+    int class_dim,
+    const int* seq_lengths,
+    int seq_lengths_size)
+{
+  VALID_CHECK_EQ(batch_size, seq_lengths_size, "must have one sequence length per batch element");
+  return decode_batch(*pool_, probs, batch_size, time_dim, class_dim, seq_lengths,
+                      alphabet_, beam_size_, cutoff_prob_, cutoff_top_n_, ext_scorer_, 1);
+}
+
+std::vector<std::vector<Output>>
+BatchDecoder::decode_f32(
+    const float *probs,
+    int batch_size,
+    int time_dim,
+    int class_dim,
+    const int* seq_lengths,
+    int seq_lengths_size,
+    size_t num_results)
+{
+  VALID_CHECK_EQ(batch_size, seq_lengths_size, "must have one sequence length per batch element");
+  VALID_CHECK_GT(num_results, 0, "num_results must be positive!");
+  return decode_batch(*pool_, probs, batch_size, time_dim, class_dim, seq_lengths,
+                      alphabet_, beam_size_, cutoff_prob_, cutoff_top_n_, ext_scorer_, num_results);
+}
+
+template<typename T>
+static BatchOutput
+decode_batch_columns(
+    ThreadPool &pool,
+    const T *probs,
+    int batch_size,
+    int time_dim,
+    int class_dim,
+    const int* seq_lengths,
+    int seq_lengths_size,
+    const Alphabet &alphabet,
+    size_t beam_size,
+    double cutoff_prob,
+    size_t cutoff_top_n,
+    std::shared_ptr<Scorer> ext_scorer,
+    size_t num_results)
+{
+  VALID_CHECK_EQ(batch_size, seq_lengths_size, "must have one sequence length per batch element");
+  VALID_CHECK_GT(num_results, 0, "num_results must be positive!");
+  std::vector<std::vector<Output>> batch_results =
+    decode_batch(pool, probs, batch_size, time_dim, class_dim, seq_lengths,
+                 alphabet, beam_size, cutoff_prob, cutoff_top_n, ext_scorer, num_results);
+  BatchOutput output;
+  for (const auto& results : batch_results) {
+    output.append(results, alphabet);
+  }
+  return output;
+}
+
+BatchOutput
+BatchDecoder::decode_columns(
+    const double *probs,
+    int batch_size,
+    int time_dim,
+    int class_dim,
+    const int* seq_lengths,
+    int seq_lengths_size,
+    size_t num_results)
+{
+  return decode_batch_columns(*pool_, probs, batch_size, time_dim, class_dim, seq_lengths, seq_lengths_size,
+                              alphabet_, beam_size_, cutoff_prob_, cutoff_top_n_, ext_scorer_, num_results);
+}
+
+BatchOutput
+BatchDecoder::decode_columns_f32(
+    const float *probs,
+    int batch_size,
+    int time_dim,
+    int class_dim,
+    const int* seq_lengths,
+    int seq_lengths_size,
+    size_t num_results)
+{
+  return decode_batch_columns(*pool_, probs, batch_size, time_dim, class_dim, seq_lengths, seq_lengths_size,
+                              alphabet_, beam_size_, cutoff_prob_, cutoff_top_n_, ext_scorer_, num_results);
+}
+
+BatchOutput::BatchOutput()
+  : result_offsets_(1, 0)
+  , token_offsets_(1, 0)
+{
+}
+
+void
+BatchOutput::append(const std::vector<Output>& results, const Alphabet& alphabet)
+{
+  for (const Output& result : results) {
+    confidences_.push_back(result.confidence);
+    tokens_.insert(tokens_.end(), result.tokens.begin(), result.tokens.end());
+    timesteps_.insert(timesteps_.end(), result.timesteps.begin(), result.timesteps.end());
+    log_probs_.insert(log_probs_.end(), result.log_probs.begin(), result.log_probs.end());
+    token_offsets_.push_back(tokens_.size());
+    texts_.push_back(alphabet.Decode(result.tokens));
+  }
+  result_offsets_.push_back(confidences_.size());
+}
+
+int
+BatchOutput::batch_size() const
+{
+  return result_offsets_.size() - 1;
+}
+
+int
+BatchOutput::num_results() const
+{
+  return confidences_.size();
+}
+
+int
+BatchOutput::num_tokens() const
+{
+  return tokens_.size();
+}
+
+std::vector<std::string>
+BatchOutput::texts() const
+{
+  return texts_;
+}
+
+template<typename T>
+static void
+copy_column(const std::vector<T>& column, T* dest, int dest_size)
+{
+  VALID_CHECK_EQ(column.size(), dest_size, "destination buffer has wrong size");
+  std::copy(column.begin(), column.end(), dest);
+}
+
+void
+BatchOutput::copy_result_offsets(int* result_offsets, int result_offsets_size) const
+{
+  copy_column(result_offsets_, result_offsets, result_offsets_size);
+}
+
+void
+BatchOutput::copy_token_offsets(int* token_offsets, int token_offsets_size) const
+{
+  copy_column(token_offsets_, token_offsets, token_offsets_size);
+}
+
+void
+BatchOutput::copy_confidences(double* confidences, int confidences_size) const
+{
+  copy_column(confidences_, confidences, confidences_size);
+}
+
+void
+BatchOutput::copy_tokens(unsigned int* tokens, int tokens_size) const
+{
+  copy_column(tokens_, tokens, tokens_size);
+}
+
+void
+BatchOutput::copy_timesteps(unsigned int* timesteps, int timesteps_size) const
+{
+  copy_column(timesteps_, timesteps, timesteps_size);
+}
+
+void
+BatchOutput::copy_log_probs(float* log_probs, int log_probs_size) const
+{
+  copy_column(log_probs_, log_probs, log_probs_size);
+}
@@ -9,6 +9,8 @@
 #include "output.h"
 #include "alphabet.h"
 
+class ThreadPool;
+
 class DecoderState {
   int abs_time_step_;
   int space_id_;
@@ -22,6 +24,11 @@ class DecoderState {
   std::vector<PathTrie*> prefixes_;
   std::unique_ptr<PathTrie> prefix_root_;
 
+  template<typename T>
+  void next_impl(const T *probs,
+                 int time_dim,
+                 int class_dim);
+
 public:
   DecoderState() = default;
   ~DecoderState() = default;
@@ -61,6 +68,11 @@ public:
             int time_dim,
             int class_dim);
 
+  // Single precision overload, avoids widening float logits to double
+  void next(const float *probs,
+            int time_dim,
+            int class_dim);
+
   /* Get up to num_results transcriptions from current decoder state.
    *
    * Parameters:
@@ -133,4 +145,145 @@ ctc_beam_search_decoder_batch(
     size_t cutoff_top_n,
     std::shared_ptr<Scorer> ext_scorer);
 
+/* Columnar representation of the beam search results of a whole batch.
+ * Results of all batch elements and tokens of all results are stored
+ * back-to-back in flat arrays, which can be copied into NumPy arrays without
+ * creating a Python object per token.
+ */
+class BatchOutput {
+  std::vector<int> result_offsets_;
+  std::vector<int> token_offsets_;
+  std::vector<double> confidences_;
+  std::vector<unsigned int> tokens_;
+  std::vector<unsigned int> timesteps_;
+  std::vector<float> log_probs_;
+  std::vector<std::string> texts_;
+
+public:
+  BatchOutput();
+
+  // Append the results of one batch element, decoding their texts with alphabet
+  void append(const std::vector<Output>& results, const Alphabet& alphabet);
+
+  int batch_size() const;
+  int num_results() const;
+  int num_tokens() const;
+
+  // Texts of all results
+  std::vector<std::string> texts() const;
+
+  // Copy columns into caller-provided buffers of the sizes given above:
+  //     result_offsets: batch_size()+1 offsets of each batch element's results
+  //     token_offsets: num_results()+1 offsets of each result's tokens
+  //     confidences: num_results() confidence values
+  //     tokens, timesteps, log_probs: num_tokens() token ids, their timesteps
+  //                                   and acoustic log probabilities
+  void copy_result_offsets(int* result_offsets, int result_offsets_size) const;
+  void copy_token_offsets(int* token_offsets, int token_offsets_size) const;
+  void copy_confidences(double* confidences, int confidences_size) const;
+  void copy_tokens(unsigned int* tokens, int tokens_size) const;
+  void copy_timesteps(unsigned int* timesteps, int timesteps_size) const;
+  void copy_log_probs(float* log_probs, int log_probs_size) const;
+};
+
+/* CTC Beam Search Decoder for batch data that keeps its worker threads alive
+ * between calls, avoiding the creation of a new thread pool per batch.
+ */
+class BatchDecoder {
+  std::unique_ptr<ThreadPool> pool_;
+  Alphabet alphabet_;
+  size_t beam_size_;
+  double cutoff_prob_;
+  size_t cutoff_top_n_;
+  std::shared_ptr<Scorer> ext_scorer_;
+
+public:
+  /* Initialize batch decoder
+   *
+   * Parameters:
+   *     alphabet: The alphabet.
+   *     beam_size: The width of beam search.
+   *     num_processes: Number of threads for beam search.
+   *     cutoff_prob: Cutoff probability for pruning.
+   *     cutoff_top_n: Cutoff number for pruning.
+   *     ext_scorer: External scorer to evaluate a prefix, which consists of
+   *                 n-gram language model scoring and word insertion term.
+   *                 Default null, decoding the input sample without scorer.
+   *                 Changes to its parameters (e.g. via reset_params) apply
+   *                 to subsequent calls of decode().
+  */
+  BatchDecoder(const Alphabet& alphabet,
+               size_t beam_size,
+               size_t num_processes,
+               double cutoff_prob,
+               size_t cutoff_top_n,
+               std::shared_ptr<Scorer> ext_scorer);
+  ~BatchDecoder();
+
+  // Disallow copying
+  BatchDecoder(const BatchDecoder&) = delete;
+  BatchDecoder& operator=(BatchDecoder&) = delete;
+
+  /* Decode a batch of data
+   *
+   * Parameters:
+   *     probs: 3-D vector where each element is a 2-D vector that can be used
+   *                by ctc_beam_search_decoder().
+   *     batch_size: Number of batch elements.
+   *     time_dim: Number of timesteps.
+   *     class_dim: Alphabet length (plus 1 for space character).
+   *     seq_lengths: Number of valid timesteps per batch element.
+   *     seq_lengths_size: Number of sequence lengths.
+   * Return:
+   *     A 2-D vector where each element is a vector of beam search decoding
+   *     result for one audio sample.
+  */
+  std::vector<std::vector<Output>> decode(const double* probs,
+                                          int batch_size,
+                                          int time_dim,
+                                          int class_dim,
+                                          const int* seq_lengths,
+                                          int seq_lengths_size);
+
+  // Single precision variant of decode(), returning up to num_results beams
+  // per batch element
+  std::vector<std::vector<Output>> decode_f32(const float* probs,
+                                              int batch_size,
+                                              int time_dim,
+                                              int class_dim,
+                                              const int* seq_lengths,
+                                              int seq_lengths_size,
+                                              size_t num_results=1);
+
+  /* Decode a batch of data into columnar results
+   *
+   * Parameters:
+   *     probs: Batch-major probabilities, see decode().
+   *     batch_size: Number of batch elements.
+   *     time_dim: Number of timesteps.
+   *     class_dim: Alphabet length (plus 1 for space character).
+   *     seq_lengths: Number of valid timesteps per batch element.
+   *     seq_lengths_size: Number of sequence lengths.
+   *     num_results: Number of beams to return per batch element.
+   * Return:
+   *     Columnar results with texts decoded by the alphabet.
+  */
+  BatchOutput decode_columns(const double* probs,
+                             int batch_size,
+                             int time_dim,
+                             int class_dim,
+                             const int* seq_lengths,
+                             int seq_lengths_size,
+                             size_t num_results=1);
+
+  // Single precision variant of decode_columns()
+  BatchOutput decode_columns_f32(const float* probs,
+                                 int batch_size,
+                                 int time_dim,
+                                 int class_dim,
+                                 const int* seq_lengths,
+                                 int seq_lengths_size,
+                                 size_t num_results=1);
+};
+
 #endif  // CTC_BEAM_SEARCH_DECODER_H_
@@ -4,8 +4,9 @@
 #include <cmath>
 #include <limits>
 
-std::vector<std::pair<size_t, float>> get_pruned_log_probs(
-    const double *prob_step,
+template<typename T>
+static std::vector<std::pair<size_t, float>> get_pruned_log_probs_impl(
+    const T *prob_step,
     size_t class_dim,
     double cutoff_prob,
     size_t cutoff_top_n) {
@@ -38,6 +39,22 @@ std::vector<std::pair<size_t, float>> get_pruned_log_probs(
   return log_prob_idx;
 }
 
+std::vector<std::pair<size_t, float>> get_pruned_log_probs(
+    const double *prob_step,
+    size_t class_dim,
+    double cutoff_prob,
+    size_t cutoff_top_n) {
+  return get_pruned_log_probs_impl(prob_step, class_dim, cutoff_prob, cutoff_top_n);
+}
+
+std::vector<std::pair<size_t, float>> get_pruned_log_probs(
+    const float *prob_step,
+    size_t class_dim,
+    double cutoff_prob,
+    size_t cutoff_top_n) {
+  return get_pruned_log_probs_impl(prob_step, class_dim, cutoff_prob, cutoff_top_n);
+}
+
 size_t get_utf8_str_len(const std::string &str) {
   size_t str_len = 0;
   for (char c : str) {
@@ -59,6 +59,12 @@ std::vector<std::pair<size_t, float>> get_pruned_log_probs(
     double cutoff_prob,
     size_t cutoff_top_n);
 
+std::vector<std::pair<size_t, float>> get_pruned_log_probs(
+    const float *prob_step,
+    size_t class_dim,
+    double cutoff_prob,
+    size_t cutoff_top_n);
+
 // Functor for prefix comparsion
 bool prefix_compare(const PathTrie *x, const PathTrie *y);
 
@@ -4,12 +4,13 @@
 #include <vector>
 
 /* Struct for the beam search output, containing the tokens based on the vocabulary indices, and the timesteps
- * for each token in the beam search output
+ * and acoustic log probabilities for each token in the beam search output
  */
 struct Output {
     double confidence;
     std::vector<unsigned int> tokens;
     std::vector<unsigned int> timesteps;
+    std::vector<float> log_probs;
 };
 
 #endif  // OUTPUT_H_
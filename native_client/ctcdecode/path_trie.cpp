@@ -114,6 +114,19 @@ void PathTrie::get_path_vec(std::vector<unsigned int>& output, std::vector<unsig
   }
 }
 
+void PathTrie::get_path_vec(std::vector<unsigned int>& output,
+                            std::vector<unsigned int>& timesteps,
+                            std::vector<float>& log_probs) {
+  if (parent != nullptr) {
+    parent->get_path_vec(output, timesteps, log_probs);
+  }
+  if (character != ROOT_) {
+    output.push_back(character);
+    timesteps.push_back(timestep);
+    log_probs.push_back(log_prob_c);
+  }
+}
+
 PathTrie* PathTrie::get_prev_grapheme(std::vector<unsigned int>& output,
                                       std::vector<unsigned int>& timesteps,
                                       const Alphabet& alphabet)
@@ -26,6 +26,11 @@ public:
   // get the prefix data in correct time order from root to current node
   void get_path_vec(std::vector<unsigned int>& output, std::vector<unsigned int>& timesteps);
 
+  // same as above, additionally collecting the acoustic log probability of each token
+  void get_path_vec(std::vector<unsigned int>& output,
+                    std::vector<unsigned int>& timesteps,
+                    std::vector<float>& log_probs);
+
   // get the prefix data in correct time order from beginning of last grapheme to current node
   PathTrie* get_prev_grapheme(std::vector<unsigned int>& output,
                               std::vector<unsigned int>& timesteps,
@@ -20,6 +20,7 @@ import_array();
 namespace std {
     %template(StringVector) vector<string>;
     %template(UnsignedIntVector) vector<unsigned int>;
+    %template(FloatVector) vector<float>;
     %template(OutputVector) vector<Output>;
     %template(OutputVectorVector) vector<vector<Output>>;
 }
@@ -32,7 +33,20 @@ namespace std {
 %apply (int* IN_ARRAY1, int DIM1) {(const int *seq_lengths, int seq_lengths_size)};
 %apply (unsigned int* IN_ARRAY1, int DIM1) {(const unsigned int *input, int length)};
 
+// Single precision input, passed through without copies for contiguous float32 arrays
+%apply (float* IN_ARRAY3, int DIM1, int DIM2, int DIM3) {(const float *probs, int batch_size, int time_dim, int class_dim)};
+
+// Columnar batch results are copied into preallocated NumPy arrays
+%apply (int* INPLACE_ARRAY1, int DIM1) {(int* result_offsets, int result_offsets_size)};
+%apply (int* INPLACE_ARRAY1, int DIM1) {(int* token_offsets, int token_offsets_size)};
+%apply (double* INPLACE_ARRAY1, int DIM1) {(double* confidences, int confidences_size)};
+%apply (unsigned int* INPLACE_ARRAY1, int DIM1) {(unsigned int* tokens, int tokens_size)};
+%apply (unsigned int* INPLACE_ARRAY1, int DIM1) {(unsigned int* timesteps, int timesteps_size)};
+%apply (float* INPLACE_ARRAY1, int DIM1) {(float* log_probs, int log_probs_size)};
+
 %ignore Scorer::dictionary;
+%ignore DecoderState::next(const float*, int, int);
+%ignore BatchOutput::append;
 
 %include "../alphabet.h"
 %include "output.h"
@@ -1,4 +1,5 @@
 #include <algorithm>
+#include <deque>
 #ifdef _MSC_VER
   #define _USE_MATH_DEFINES
 #endif
@@ -62,6 +63,21 @@ using std::vector;
 
    When finishStream() is called, we return the corresponding transcript from
    the current decoder state.
+
+   Models exported with a dynamic time dimension (n_steps of zero) have no
+   fixed batch of timesteps, batch_buffer then collects timesteps until the
+   end of a call to feedAudioContent() finds at least min_steps of them, which
+   then all run through the acoustic model in one step. A stream that falls
+   behind thus catches up in a single step instead of many fixed-size ones.
+   With a min_steps of zero the acoustic model runs once when the stream gets
+   finished.
+
+   A stream can also defer its acoustic model steps: full batches are then
+   queued in pending_batches instead, so that DS_ProcessStreamsBatched() can
+   run the queued batches of several streams in shared model invocations.
+   Deferred streams of models with a dynamic time dimension keep their
+   timesteps in batch_buffer, DS_ProcessStreamsBatched() then runs as many
+   timesteps as all streams with at least min_steps of them have buffered.
 */
 struct StreamingState {
   vector<float> audio_buffer_;
@@ -69,6 +85,8 @@ struct StreamingState {
   vector<float> batch_buffer_;
   vector<float> previous_state_c_;
   vector<float> previous_state_h_;
+  std::deque<vector<float>> pending_batches_;
+  bool defer_inference_;
 
   ModelState* model_;
   DecoderState decoder_state_;
@@ -80,6 +98,7 @@ struct StreamingState {
   char* intermediateDecode() const;
   Metadata* intermediateDecodeWithMetadata(unsigned int num_results) const;
   void finalizeStream();
+  void flushFeatures();
   char* finishStream();
   Metadata* finishStreamWithMetadata(unsigned int num_results);
 
@@ -88,9 +107,15 @@ struct StreamingState {
   void pushMfccBuffer(const vector<float>& buf);
   void addZeroMfccWindow();
   void processBatch(const vector<float>& buf, unsigned int n_steps);
+  void processBufferedSteps();
+  unsigned int bufferedSteps() const;
+  unsigned int pendingBatches() const;
+  void processPendingBatches();
+  void decodeLogits(const float* logits, unsigned int n_frames);
 };
 
 StreamingState::StreamingState()
+  : defer_inference_(false)
 {
 }
 
@@ -129,6 +154,10 @@ StreamingState::feedAudioContent(const short* buffer,
 
     // Repeat until buffer empty
   }
+
+  if (!defer_inference_) {
+    processBufferedSteps();
+  }
 }
 
 char*
@@ -169,6 +198,20 @@ StreamingState::processAudioWindow(const vector<float>& buf)
 
 void
 StreamingState::finalizeStream()
+{
+  // Run deferred batches before the final partial one
+  processPendingBatches();
+
+  flushFeatures();
+
+  // Process final batch
+  if (batch_buffer_.size() > 0) {
+    processBatch(batch_buffer_, batch_buffer_.size()/model_->mfcc_feats_per_timestep_);
+  }
+}
+
+void
+StreamingState::flushFeatures()
 {
   // Flush audio buffer
   processAudioWindow(audio_buffer_);
@@ -177,11 +220,6 @@ StreamingState::finalizeStream()
   for (int i = 0; i < model_->n_context_; ++i) {
     addZeroMfccWindow();
   }
-
-  // Process final batch
-  if (batch_buffer_.size() > 0) {
-    processBatch(batch_buffer_, batch_buffer_.size()/model_->mfcc_feats_per_timestep_);
-  }
 }
 
 void
@@ -223,6 +261,11 @@ StreamingState::pushMfccBuffer(const vector<float>& buf)
 void
 StreamingState::processMfccWindow(const vector<float>& buf)
 {
+  if (model_->n_steps_ == 0) {
+    batch_buffer_.insert(batch_buffer_.end(), buf.begin(), buf.end());
+    return;
+  }
+
   auto start = buf.begin();
   auto end = buf.end();
   while (start != end) {
@@ -233,7 +276,11 @@ StreamingState::processMfccWindow(const vector<float>& buf)
 
     // If we have a full batch
     if (batch_buffer_.size() == model_->n_steps_ * model_->mfcc_feats_per_timestep_) {
-      processBatch(batch_buffer_, model_->n_steps_);
+      if (defer_inference_) {
+        pending_batches_.push_back(batch_buffer_);
+      } else {
+        processBatch(batch_buffer_, model_->n_steps_);
+      }
       batch_buffer_.resize(0);
     }
   }
@@ -254,10 +301,48 @@ StreamingState::processBatch(const vector<float>& buf, unsigned int n_steps)
   const size_t num_classes = model_->alphabet_.GetSize() + 1; // +1 for blank
   const int n_frames = logits.size() / (ModelState::BATCH_SIZE * num_classes);
 
-  // Convert logits to double
-  vector<double> inputs(logits.begin(), logits.end());
+  decodeLogits(logits.data(), n_frames);
+}
 
-  decoder_state_.next(inputs.data(),
+void
+StreamingState::processBufferedSteps()
+{
+  if (pendingBatches() > 0) {
+    processBatch(batch_buffer_, bufferedSteps());
+    batch_buffer_.resize(0);
+  }
+}
+
+unsigned int
+StreamingState::bufferedSteps() const
+{
+  return batch_buffer_.size() / model_->mfcc_feats_per_timestep_;
+}
+
+unsigned int
+StreamingState::pendingBatches() const
+{
+  if (model_->n_steps_ > 0) {
+    return pending_batches_.size();
+  }
+  // All buffered timesteps of models with a dynamic time dimension form one batch
+  return model_->min_steps_ > 0 && bufferedSteps() >= model_->min_steps_ ? 1 : 0;
+}
+
+void
+StreamingState::processPendingBatches()
+{
+  while (!pending_batches_.empty()) {
+    processBatch(pending_batches_.front(), model_->n_steps_);
+    pending_batches_.pop_front();
+  }
+}
+
+void
+StreamingState::decodeLogits(const float* logits, unsigned int n_frames)
+{
+  const size_t num_classes = model_->alphabet_.GetSize() + 1; // +1 for blank
+  decoder_state_.next(logits,
                       n_frames,
                       num_classes);
 }
@@ -378,7 +463,7 @@ DS_CreateStream(ModelState* aCtx,
   ctx->audio_buffer_.reserve(aCtx->audio_win_len_);
   ctx->mfcc_buffer_.reserve(aCtx->mfcc_feats_per_timestep_);
   ctx->mfcc_buffer_.resize(aCtx->n_features_*aCtx->n_context_, 0.f);
-  ctx->batch_buffer_.reserve(aCtx->n_steps_ * aCtx->mfcc_feats_per_timestep_);
+  ctx->batch_buffer_.reserve(std::max(aCtx->n_steps_, aCtx->min_steps_) * aCtx->mfcc_feats_per_timestep_);
   ctx->previous_state_c_.resize(aCtx->state_size_, 0.f);
   ctx->previous_state_h_.resize(aCtx->state_size_, 0.f);
   ctx->model_ = aCtx;
@@ -404,6 +489,128 @@ DS_FeedAudioContent(StreamingState* aSctx,
   aSctx->feedAudioContent(aBuffer, aBufferSize);
 }
 
+void
+DS_SetStreamDeferInference(StreamingState* aSctx,
+                           int aDefer)
+{
+  aSctx->defer_inference_ = aDefer != 0;
+  if (!aDefer) {
+    aSctx->processPendingBatches();
+    aSctx->processBufferedSteps();
+  }
+}
+
+unsigned int
+DS_GetStreamPendingBatches(const StreamingState* aSctx)
+{
+  return aSctx->pendingBatches();
+}
+
+unsigned int
+DS_GetModelBatchSize(const ModelState* aCtx)
+{
+  return aCtx->batch_size_;
+}
+
+// Runs n_steps timesteps of every stream through the acoustic model, in as few
+// invocations as the batch size of the model allows. The timesteps are the
+// first queued batch of a stream, or the front of its batch buffer for models
+// with a dynamic time dimension. Returns the number of invocations, or -1 on
+// failure (leaving the timesteps of the failed invocation in place).
+static int
+infer_streams_batched(ModelState* aCtx,
+                      const vector<StreamingState*>& streams,
+                      unsigned int n_steps)
+{
+  const size_t num_classes = aCtx->alphabet_.GetSize() + 1; // +1 for blank
+  const size_t state_size = aCtx->state_size_;
+  const size_t window_size = n_steps * aCtx->mfcc_feats_per_timestep_;
+  int invocations = 0;
+
+  // Models with a dynamic batch size process all streams at once
+  const size_t batch_size = aCtx->batch_size_ > 0 ? aCtx->batch_size_ : streams.size();
+  vector<float> mfcc, state_c, state_h, logits, new_state_c, new_state_h;
+  for (size_t offset = 0; offset < streams.size(); offset += batch_size) {
+    const unsigned int n_streams = std::min<size_t>(batch_size, streams.size() - offset);
+    mfcc.clear();
+    state_c.clear();
+    state_h.clear();
+    for (unsigned int i = 0; i < n_streams; ++i) {
+      StreamingState* stream = streams[offset + i];
+      const vector<float>& batch = aCtx->n_steps_ > 0 ? stream->pending_batches_.front() : stream->batch_buffer_;
+      mfcc.insert(mfcc.end(), batch.begin(), batch.begin() + window_size);
+      state_c.insert(state_c.end(), stream->previous_state_c_.begin(), stream->previous_state_c_.end());
+      state_h.insert(state_h.end(), stream->previous_state_h_.begin(), stream->previous_state_h_.end());
+    }
+
+    logits.clear();
+    aCtx->infer_batch(mfcc, n_steps, n_streams, state_c, state_h,
+                      logits, new_state_c, new_state_h);
+    if (new_state_c.size() != n_streams * state_size) {
+      return -1;
+    }
+    ++invocations;
+
+    const size_t stream_logits_size = logits.size() / n_streams;
+    for (unsigned int i = 0; i < n_streams; ++i) {
+      StreamingState* stream = streams[offset + i];
+      stream->previous_state_c_.assign(new_state_c.begin() + i * state_size,
+                                       new_state_c.begin() + (i + 1) * state_size);
+      stream->previous_state_h_.assign(new_state_h.begin() + i * state_size,
+                                       new_state_h.begin() + (i + 1) * state_size);
+      stream->decodeLogits(logits.data() + i * stream_logits_size,
+                           stream_logits_size / num_classes);
+      if (aCtx->n_steps_ > 0) {
+        stream->pending_batches_.pop_front();
+      } else {
+        shift_buffer_left(stream->batch_buffer_, window_size);
+      }
+    }
+  }
+  return invocations;
+}
+
+int
+DS_ProcessStreamsBatched(ModelState* aCtx,
+                         StreamingState** aStreams,
+                         unsigned int aNumStreams)
+{
+  int invocations = 0;
+
+  vector<StreamingState*> ready;
+  while (true) {
+    // Every stream contributes at most one batch per model invocation, as
+    // its next batch depends on the LSTM state resulting from this one
+    ready.clear();
+    unsigned int n_steps = aCtx->n_steps_;
+    for (unsigned int i = 0; i < aNumStreams; ++i) {
+      if (aStreams[i]->model_ != aCtx) {
+        return -1;
+      }
+      if (aStreams[i]->pendingBatches() > 0) {
+        ready.push_back(aStreams[i]);
+        // Streams of models with a dynamic time dimension share the number
+        // of timesteps they all have buffered
+        if (aCtx->n_steps_ == 0) {
+          n_steps = ready.size() == 1 ? ready.back()->bufferedSteps()
+                                      : std::min(n_steps, ready.back()->bufferedSteps());
+        }
+      }
+    }
+    if (ready.empty()) {
+      break;
+    }
+
+    int status = infer_streams_batched(aCtx, ready, n_steps);
+    if (status < 0) {
+      // Inference failed, keep the timesteps queued
+      return -1;
+    }
+    invocations += status;
+  }
+  return invocations;
+}
+
 char*
 DS_IntermediateDecode(const StreamingState* aSctx)
 {
@@ -467,6 +674,79 @@ DS_SpeechToTextWithMetadata(ModelState* aCtx,
   return DS_FinishStreamWithMetadata(ctx, aNumResults);
 }
 
+int
+DS_SpeechToTextBatchWithMetadata(ModelState* aCtx,
+                                 const short** aBuffers,
+                                 const unsigned int* aBufferSizes,
+                                 unsigned int aNumBuffers,
+                                 unsigned int aNumResults,
+                                 Metadata** aResults)
+{
+  if (aNumBuffers == 0) {
+    return DS_ERR_OK;
+  }
+
+  // Streams compute the input features of every utterance
+  vector<std::unique_ptr<StreamingState>> streams;
+  for (unsigned int i = 0; i < aNumBuffers; ++i) {
+    StreamingState* ctx;
+    int status = DS_CreateStream(aCtx, &ctx);
+    if (status != DS_ERR_OK) {
+      return status;
+    }
+    streams.emplace_back(ctx);
+    ctx->defer_inference_ = true;
+    ctx->feedAudioContent(aBuffers[i], aBufferSizes[i]);
+  }
+
+  if (aCtx->batch_size_ > 0 || aCtx->n_steps_ > 0) {
+    // Models with static shapes batch the steps of the utterances' streams
+    vector<StreamingState*> stream_ptrs;
+    for (auto& stream : streams) {
+      stream_ptrs.push_back(stream.get());
+    }
+    if (DS_ProcessStreamsBatched(aCtx, stream_ptrs.data(), stream_ptrs.size()) < 0) {
+      return DS_ERR_FAIL_RUN_SESS;
+    }
+    for (unsigned int i = 0; i < aNumBuffers; ++i) {
+      aResults[i] = streams[i]->finishStreamWithMetadata(aNumResults);
+    }
+    return DS_ERR_OK;
+  }
+
+  // Whole utterances get padded to the longest one and run in one invocation
+  const size_t feats = aCtx->mfcc_feats_per_timestep_;
+  vector<int> n_frames;
+  unsigned int max_frames = 0;
+  for (auto& stream : streams) {
+    stream->flushFeatures();
+    n_frames.push_back(stream->batch_buffer_.size() / feats);
+    max_frames = std::max<unsigned int>(max_frames, n_frames.back());
+  }
+
+  vector<float> mfcc;
+  mfcc.reserve(aNumBuffers * max_frames * feats);
+  for (auto& stream : streams) {
+    mfcc.insert(mfcc.end(), stream->batch_buffer_.begin(), stream->batch_buffer_.end());
+    mfcc.resize(mfcc.size() + (max_frames * feats - stream->batch_buffer_.size()), 0.f);
+    vector<float>().swap(stream->batch_buffer_);
+  }
+  streams.clear();
+
+  vector<float> logits;
+  int status = aCtx->infer_padded(mfcc, n_frames, max_frames, logits);
+  if (status != DS_ERR_OK) {
+    return status;
+  }
+  vector<float>().swap(mfcc);
+
+  vector<vector<Output>> outputs = aCtx->decode_batch(logits, n_frames, max_frames, aNumResults);
+  for (unsigned int i = 0; i < aNumBuffers; ++i) {
+    aResults[i] = aCtx->outputs_to_metadata(outputs[i]);
+  }
+  return DS_ERR_OK;
+}
+
 void
 DS_FreeStream(StreamingState* aSctx)
 {
@@ -218,6 +218,35 @@ Metadata* DS_SpeechToTextWithMetadata(ModelState* aCtx,
                                       unsigned int aBufferSize,
                                       unsigned int aNumResults);
 
+/**
+ * @brief Use the DeepSpeech model to convert several utterances to text at once
+ *        and output results including metadata. Models exported with a dynamic
+ *        batch size and time dimension (--export_batch_size 0 --n_steps -1)
+ *        pad all utterances to the longest one, run the acoustic model once
+ *        and decode the utterances in parallel. Other models batch the
+ *        acoustic model steps of the utterances, see {@link DS_ProcessStreamsBatched()}.
+ *
+ * @param aCtx The ModelState pointer for the model to use.
+ * @param aBuffers Array of 16-bit, mono raw audio signals at the appropriate
+ *                 sample rate (matching what the model was trained on).
+ * @param aBufferSizes The number of samples in each audio signal.
+ * @param aNumBuffers The number of audio signals.
+ * @param aNumResults The maximum number of CandidateTranscript structs to return per audio signal.
+ * @param[out] aResults Array of @p aNumBuffers Metadata pointers that receive
+ *                      the results of the audio signals. The user is
+ *                      responsible for freeing each Metadata by calling
+ *                      {@link DS_FreeMetadata()}.
+ *
+ * @return Zero for success, non-zero on failure.
+ */
+DEEPSPEECH_EXPORT
+int DS_SpeechToTextBatchWithMetadata(ModelState* aCtx,
+                                     const short** aBuffers,
+                                     const unsigned int* aBufferSizes,
+                                     unsigned int aNumBuffers,
+                                     unsigned int aNumResults,
+                                     Metadata** aResults);
+
 /**
  * @brief Create a new streaming inference state. The streaming state returned
  *        by this function can then be passed to {@link DS_FeedAudioContent()}
@@ -246,6 +275,61 @@ void DS_FeedAudioContent(StreamingState* aSctx,
                          const short* aBuffer,
                          unsigned int aBufferSize);
 
+/**
+ * @brief Make a stream queue its acoustic model steps instead of running them
+ *        while audio is fed. Queued steps get run by {@link DS_ProcessStreamsBatched()},
+ *        which batches the steps of concurrent streams into shared model
+ *        invocations. Finishing a stream runs its remaining queued steps.
+ *
+ * @param aSctx A streaming state pointer returned by {@link DS_CreateStream()}.
+ * @param aDefer Whether to queue acoustic model steps. Disabling it runs all
+ *               queued steps of the stream.
+ */
+DEEPSPEECH_EXPORT
+void DS_SetStreamDeferInference(StreamingState* aSctx,
+                                int aDefer);
+
+/**
+ * @brief Get the number of queued acoustic model steps of a stream.
+ *
+ * @param aSctx A streaming state pointer returned by {@link DS_CreateStream()}.
+ *
+ * @return Number of windows of n_steps timesteps awaiting inference. Streams
+ *         of models with a dynamic time dimension have one window of all their
+ *         buffered timesteps, if these are at least as many as the model's
+ *         minimum number of steps (--export_min_steps).
+ */
+DEEPSPEECH_EXPORT
+unsigned int DS_GetStreamPendingBatches(const StreamingState* aSctx);
+
+/**
+ * @brief Get the number of streams the model processes in one invocation.
+ *        This is the batch size the model was exported with (--export_batch_size).
+ *
+ * @param aCtx A ModelState pointer created with {@link DS_CreateModel}.
+ *
+ * @return Batch size of the acoustic model, zero if it is dynamic.
+ */
+DEEPSPEECH_EXPORT
+unsigned int DS_GetModelBatchSize(const ModelState* aCtx);
+
+/**
+ * @brief Run the queued acoustic model steps of several streams, gathering the
+ *        steps of up to {@link DS_GetModelBatchSize()} streams into one model
+ *        invocation. Every stream keeps its own LSTM state. The streams must not
+ *        be used concurrently while this function runs.
+ *
+ * @param aCtx The ModelState pointer the streams were created with.
+ * @param aStreams Array of streaming state pointers.
+ * @param aNumStreams The number of streams in @p aStreams.
+ *
+ * @return Number of model invocations, or -1 on failure.
+ */
+DEEPSPEECH_EXPORT
+int DS_ProcessStreamsBatched(ModelState* aCtx,
+                             StreamingState** aStreams,
+                             unsigned int aNumStreams);
+
 /**
  * @brief Compute the intermediate decoding of an ongoing streaming inference.
  *
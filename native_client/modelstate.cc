@@ -1,3 +1,5 @@
+#include <algorithm>
+#include <thread>
 #include <vector>
 
 #include "ctcdecode/ctc_beam_search_decoder.h"
@@ -9,6 +11,7 @@ using std::vector;
 ModelState::ModelState()
   : beam_width_(-1)
   , n_steps_(-1)
+  , min_steps_(0)
   , n_context_(-1)
   , n_features_(-1)
   , mfcc_feats_per_timestep_(-1)
@@ -16,6 +19,8 @@ ModelState::ModelState()
   , audio_win_len_(-1)
   , audio_win_step_(-1)
   , state_size_(-1)
+  , batch_size_(1)
+  , batch_decoder_beam_width_(0)
 {
 }
 
@@ -29,6 +34,80 @@ ModelState::init(const char* model_path)
   return DS_ERR_OK;
 }
 
+void
+ModelState::infer_batch(const vector<float>& mfcc,
+                        unsigned int n_frames,
+                        unsigned int n_streams,
+                        const vector<float>& previous_state_c,
+                        const vector<float>& previous_state_h,
+                        vector<float>& logits_output,
+                        vector<float>& state_c_output,
+                        vector<float>& state_h_output)
+{
+  const size_t window_size = n_frames * mfcc_feats_per_timestep_;
+  state_c_output.clear();
+  state_h_output.clear();
+  for (unsigned int i = 0; i < n_streams; ++i) {
+    vector<float> stream_mfcc(mfcc.begin() + i * window_size,
+                              mfcc.begin() + (i + 1) * window_size);
+    vector<float> stream_c(previous_state_c.begin() + i * state_size_,
+                           previous_state_c.begin() + (i + 1) * state_size_);
+    vector<float> stream_h(previous_state_h.begin() + i * state_size_,
+                           previous_state_h.begin() + (i + 1) * state_size_);
+    infer(stream_mfcc, n_frames, stream_c, stream_h, logits_output, stream_c, stream_h);
+    state_c_output.insert(state_c_output.end(), stream_c.begin(), stream_c.end());
+    state_h_output.insert(state_h_output.end(), stream_h.begin(), stream_h.end());
+  }
+}
+
+int
+ModelState::infer_padded(const vector<float>& mfcc,
+                         const vector<int>& n_frames,
+                         unsigned int max_frames,
+                         vector<float>& logits_output)
+{
+  return DS_ERR_INVALID_SHAPE;
+}
+
+vector<vector<Output>>
+ModelState::decode_batch(const vector<float>& logits,
+                         const vector<int>& n_frames,
+                         unsigned int max_frames,
+                         size_t num_results)
+{
+  std::shared_ptr<BatchDecoder> decoder;
+  {
+    // The decoder keeps its thread pool alive between calls and gets
+    // re-created whenever beam width or scorer changed
+    std::lock_guard<std::mutex> lock(batch_decoder_mutex_);
+    if (!batch_decoder_ ||
+        batch_decoder_beam_width_ != beam_width_ ||
+        batch_decoder_scorer_ != scorer_) {
+      const size_t num_processes = std::max(1u, std::thread::hardware_concurrency());
+      const int cutoff_top_n = 40;
+      const double cutoff_prob = 1.0;
+      batch_decoder_.reset(new BatchDecoder(alphabet_,
+                                            beam_width_,
+                                            num_processes,
+                                            cutoff_prob,
+                                            cutoff_top_n,
+                                            scorer_));
+      batch_decoder_beam_width_ = beam_width_;
+      batch_decoder_scorer_ = scorer_;
+    }
+    decoder = batch_decoder_;
+  }
+
+  const int num_classes = alphabet_.GetSize() + 1; // +1 for blank
+  return decoder->decode_f32(logits.data(),
+                             n_frames.size(),
+                             max_frames,
+                             num_classes,
+                             n_frames.data(),
+                             n_frames.size(),
+                             num_results);
+}
+
 char*
 ModelState::decode(const DecoderState& state) const
 {
@@ -40,7 +119,12 @@ Metadata*
 ModelState::decode_metadata(const DecoderState& state, 
                             size_t num_results)
 {
-  vector<Output> out = state.decode(num_results);
+  return outputs_to_metadata(state.decode(num_results));
+}
+
+Metadata*
+ModelState::outputs_to_metadata(const vector<Output>& out) const
+{
   unsigned int num_returned = out.size();
 
   CandidateTranscript* transcripts = (CandidateTranscript*)malloc(sizeof(CandidateTranscript)*num_returned);
@@ -1,6 +1,8 @@
 #ifndef MODELSTATE_H
 #define MODELSTATE_H
 
+#include <memory>
+#include <mutex>
 #include <vector>
 
 #include "deepspeech.h"
@@ -9,16 +11,22 @@
 #include "ctcdecode/scorer.h"
 #include "ctcdecode/output.h"
 
+class BatchDecoder;
 class DecoderState;
 
 struct ModelState {
-  //TODO: infer batch size from model/use dynamic batch size
+  // Number of streams whose logits get returned by a call to infer()
   static constexpr unsigned int BATCH_SIZE = 1;
 
   Alphabet alphabet_;
   std::shared_ptr<Scorer> scorer_;
   unsigned int beam_width_;
+  // Zero if the time dimension of the exported acoustic model is dynamic
   unsigned int n_steps_;
+  // With a dynamic time dimension, the number of buffered timesteps from which
+  // on streams run all their buffered timesteps at once, zero if streams run
+  // whole utterances when they get finished
+  unsigned int min_steps_;
   unsigned int n_context_;
   unsigned int n_features_;
   unsigned int mfcc_feats_per_timestep_;
@@ -26,6 +34,14 @@ struct ModelState {
   unsigned int audio_win_len_;
   unsigned int audio_win_step_;
   unsigned int state_size_;
+  // Number of streams the exported acoustic model processes in one invocation,
+  // zero if the batch dimension is dynamic
+  unsigned int batch_size_;
+
+  std::mutex batch_decoder_mutex_;
+  std::shared_ptr<BatchDecoder> batch_decoder_;
+  unsigned int batch_decoder_beam_width_;
+  std::shared_ptr<Scorer> batch_decoder_scorer_;
 
   ModelState();
   virtual ~ModelState();
@@ -52,6 +68,69 @@ struct ModelState {
                      std::vector<float>& state_c_output,
                      std::vector<float>& state_h_output) = 0;
 
+  /**
+   * @brief Do a single inference step in the acoustic model for several
+   *        streams at once. Models exported with a batch size of 1 process
+   *        the streams one after another.
+   *
+   * @param mfcc input data of n_streams windows of n_steps timesteps each,
+   *             stored one stream after the other
+   * @param n_frames number of timesteps in the data of each stream
+   * @param n_streams number of streams, at most batch_size_
+   * @param previous_state_c LSTM cell states of all streams
+   * @param previous_state_h LSTM hidden states of all streams
+   *
+   * @param[out] logits_output Where to store computed logits, stored one
+   *                           stream after the other.
+   * @param[out] state_c_output Where to store the new cell states.
+   * @param[out] state_h_output Where to store the new hidden states.
+   */
+  virtual void infer_batch(const std::vector<float>& mfcc,
+                           unsigned int n_frames,
+                           unsigned int n_streams,
+                           const std::vector<float>& previous_state_c,
+                           const std::vector<float>& previous_state_h,
+                           std::vector<float>& logits_output,
+                           std::vector<float>& state_c_output,
+                           std::vector<float>& state_h_output);
+
+  /**
+   * @brief Run the acoustic model over several whole utterances at once,
+   *        starting from zero LSTM states. Requires a model exported with
+   *        dynamic batch and time dimensions.
+   *
+   * @param mfcc input data of all utterances, each zero padded to max_frames
+   *             timesteps, stored one utterance after the other
+   * @param n_frames number of valid timesteps of each utterance
+   * @param max_frames number of timesteps per utterance in the data
+   *
+   * @param[out] logits_output Where to store computed logits, stored one
+   *                           utterance after the other with max_frames
+   *                           timesteps each.
+   *
+   * @return Zero on success, non-zero on failure.
+   */
+  virtual int infer_padded(const std::vector<float>& mfcc,
+                           const std::vector<int>& n_frames,
+                           unsigned int max_frames,
+                           std::vector<float>& logits_output);
+
+  /**
+   * @brief Decode the logits of several utterances in parallel, using the
+   *        current beam width and external scorer.
+   *
+   * @param logits logits of all utterances as returned by infer_padded()
+   * @param n_frames number of valid timesteps of each utterance
+   * @param max_frames number of timesteps per utterance in logits
+   * @param num_results Maximum number of candidate results per utterance.
+   *
+   * @return Decoding results of each utterance.
+   */
+  std::vector<std::vector<Output>> decode_batch(const std::vector<float>& logits,
+                                                const std::vector<int>& n_frames,
+                                                unsigned int max_frames,
+                                                size_t num_results);
+
   /**
    * @brief Perform decoding of the logits, using basic CTC decoder or
    *        CTC decoder with KenLM enabled
@@ -74,6 +153,12 @@ struct ModelState {
    */
   virtual Metadata* decode_metadata(const DecoderState& state,
                                     size_t num_results);
+
+  /**
+   * @brief Convert decoding results into a Metadata struct. The user is
+   *        responsible for freeing it by calling DS_FreeMetadata().
+   */
+  Metadata* outputs_to_metadata(const std::vector<Output>& out) const;
 };
 
 #endif // MODELSTATE_H
@@ -1,5 +1,7 @@
 import os
 import platform
+import re
+import threading
 
 #The API is not snake case which triggers linter errors
 #pylint: disable=invalid-name
@@ -22,16 +24,91 @@ import deepspeech
 # rename for backwards compatibility
 from deepspeech.impl import Version as version
 
+# Model formats that the native client memory-maps instead of reading them into process memory
+MAPPED_MODEL_EXTENSIONS = ('.pbmm', '.tflite')
+
+SMAPS_MAPPING_PATTERN = re.compile(r'^([0-9a-f]+)-([0-9a-f]+) \S+ ([0-9a-f]+) ([0-9a-f]+):([0-9a-f]+) (\d+)')
+SMAPS_FIELD_PATTERN = re.compile(r'^(\w+):\s+(\d+) kB$')
+
+
+def mappedMemoryReport(paths, pid='self'):
+    """
+    Report how a process maps files into its memory, read from ``/proc/<pid>/smaps`` (Linux only).
+
+    :param paths: Paths of the files to report on
+    :type paths: list of str
+
+    :param pid: Process to inspect, defaulting to the current one
+    :type pid: int or str
+
+    :return: Per path a dict with the file size, the number of file bytes covered by mappings ('mapped'),
+             their resident set size ('rss'), its proportional share ('pss'), the resident bytes shared with other
+             processes ('shared'), the ones only this process maps so far ('private') and the per-process copies
+             of mapped pages that were written to ('anonymous').
+    :type: dict
+    """
+    inodes = {}
+    for path in paths:
+        stat = os.stat(path)
+        inodes[(os.major(stat.st_dev), os.minor(stat.st_dev), stat.st_ino)] = path
+    report = {path: dict(file_size=os.path.getsize(path), mapped=0, rss=0, pss=0, shared=0, private=0, anonymous=0)
+              for path in paths}
+    ranges = {path: [] for path in paths}
+    current = None
+    with open('/proc/{}/smaps'.format(pid), 'r') as smaps:
+        for line in smaps:
+            mapping = SMAPS_MAPPING_PATTERN.match(line)
+            if mapping:
+                start, end, offset, major, minor, inode = mapping.groups()
+                current = inodes.get((int(major, 16), int(minor, 16), int(inode)))
+                if current is not None:
+                    offset = int(offset, 16)
+                    ranges[current].append((offset, offset + int(end, 16) - int(start, 16)))
+                continue
+            field = SMAPS_FIELD_PATTERN.match(line)
+            if current is None or not field:
+                continue
+            name, size = field.group(1).lower(), int(field.group(2)) * 1024
+            if name in ('rss', 'pss', 'anonymous'):
+                report[current][name] += size
+            elif name in ('shared_clean', 'shared_dirty'):
+                report[current]['shared'] += size
+            elif name in ('private_clean', 'private_dirty'):
+                report[current]['private'] += size
+    for path, file_ranges in ranges.items():
+        # Several mappings might cover the same region of a file
+        covered_end = 0
+        for start, end in sorted(file_ranges):
+            start, end = max(start, covered_end), min(end, report[path]['file_size'])
+            if end > start:
+                report[path]['mapped'] += end - start
+                covered_end = end
+    return report
+
+
 class Model(object):
     """
     Class holding a DeepSpeech model
 
     :param aModelPath: Path to model file to load
     :type aModelPath: str
+
+    :param shared: Require the model file to be memory-mapped read-only, so that all
+                   processes loading it share its pages through the page cache.
+                   Memory-mapped model formats are .pbmm and .tflite, see :func:`verifySharedMemory()`.
+    :type shared: bool
+
+    :throws: RuntimeError on error
     """
-    def __init__(self, model_path):
+    def __init__(self, model_path, shared=False):
         # make sure the attribute is there if CreateModel fails
         self._impl = None
+        self._model_path = model_path
+        self._scorer_path = None
+
+        if shared and not model_path.endswith(MAPPED_MODEL_EXTENSIONS):
+            raise RuntimeError("Sharing a model between processes requires a memory-mapped model file ({}), "
+                               "got '{}'".format(', '.join(MAPPED_MODEL_EXTENSIONS), model_path))
 
         status, impl = deepspeech.impl.CreateModel(model_path)
         if status != 0:
@@ -86,6 +163,7 @@ class Model(object):
         status = deepspeech.impl.EnableExternalScorer(self._impl, scorer_path)
         if status != 0:
             raise RuntimeError("EnableExternalScorer failed with '{}' (0x{:X})".format(deepspeech.impl.ErrorCodeToErrorMessage(status),status))
+        self._scorer_path = scorer_path
 
     def disableExternalScorer(self):
         """
@@ -93,6 +171,7 @@ class Model(object):
 
         :return: Zero on success, non-zero on failure.
         """
+        self._scorer_path = None
         return deepspeech.impl.DisableExternalScorer(self._impl)
 
     def setScorerAlphaBeta(self, alpha, beta):
@@ -110,6 +189,32 @@ class Model(object):
         """
         return deepspeech.impl.SetScorerAlphaBeta(self._impl, alpha, beta)
 
+    def verifySharedMemory(self, max_unmapped_bytes=1024*1024):
+        """
+        Verify that the model file and the external scorer file are memory-mapped
+        instead of being copied into the memory of this process (Linux only).
+        Language model and vocabulary trie of scorer files get mapped, only the
+        headers are read. Copies that the runtime derives from mapped data
+        (like repacked weights) are not detected.
+
+        :param max_unmapped_bytes: Maximum number of bytes per file that may be read instead of mapped
+        :type max_unmapped_bytes: int
+
+        :return: Report of :func:`mappedMemoryReport()` on the files
+        :type: dict
+
+        :throws: RuntimeError if a file is not shared
+        """
+        paths = [path for path in [self._model_path, self._scorer_path] if path is not None]
+        report = mappedMemoryReport(paths)
+        for path, usage in report.items():
+            unmapped = usage['file_size'] - usage['mapped']
+            if unmapped > max_unmapped_bytes:
+                raise RuntimeError("{} of {} bytes of '{}' are not memory-mapped".format(unmapped, usage['file_size'], path))
+            if usage['anonymous'] > 0:
+                raise RuntimeError("{} bytes of the mapping of '{}' were copied on write".format(usage['anonymous'], path))
+        return report
+
     def stt(self, audio_buffer):
         """
         Use the DeepSpeech model to perform Speech-To-Text.
@@ -137,6 +242,48 @@ class Model(object):
         """
         return deepspeech.impl.SpeechToTextWithMetadata(self._impl, audio_buffer, num_results)
 
+    def sttBatch(self, audio_buffers):
+        """
+        Use the DeepSpeech model to perform Speech-To-Text on several audio signals at once.
+        Models exported with a dynamic batch size and time dimension
+        (``--export_batch_size 0 --n_steps -1``) run the acoustic model once
+        for all signals and decode them in parallel.
+
+        :param audio_buffers: 16-bit, mono raw audio signals at the appropriate sample rate (matching what the model was trained on).
+        :type audio_buffers: list of numpy.int16 arrays
+
+        :return: The STT results, one per audio signal.
+        :type: list of str
+
+        :throws: RuntimeError on error
+        """
+        results = []
+        for metadata in self.sttBatchWithMetadata(audio_buffers):
+            transcripts = metadata.transcripts
+            results.append(''.join(token.text for token in transcripts[0].tokens) if len(transcripts) > 0 else '')
+        return results
+
+    def sttBatchWithMetadata(self, audio_buffers, num_results=1):
+        """
+        Use the DeepSpeech model to perform Speech-To-Text on several audio signals at once
+        and return results including metadata. See :func:`sttBatch()`.
+
+        :param audio_buffers: 16-bit, mono raw audio signals at the appropriate sample rate (matching what the model was trained on).
+        :type audio_buffers: list of numpy.int16 arrays
+
+        :param num_results: Maximum number of candidate transcripts to return per audio signal. Returned lists might be smaller than this.
+        :type num_results: int
+
+        :return: Metadata objects, one per audio signal, containing multiple candidate transcripts.
+        :type: list of :func:`Metadata`
+
+        :throws: RuntimeError on error
+        """
+        status, results = deepspeech.impl.SpeechToTextBatchWithMetadata(self._impl, audio_buffers, num_results)
+        if status != 0:
+            raise RuntimeError("SpeechToTextBatchWithMetadata failed with '{}' (0x{:X})".format(deepspeech.impl.ErrorCodeToErrorMessage(status),status))
+        return results
+
     def createStream(self):
         """
         Create a new streaming inference state. The streaming state returned by
@@ -152,6 +299,29 @@ class Model(object):
             raise RuntimeError("CreateStream failed with '{}' (0x{:X})".format(deepspeech.impl.ErrorCodeToErrorMessage(status),status))
         return Stream(ctx)
 
+    def batchSize(self):
+        """
+        Return the number of streams the acoustic model processes in one
+        invocation (the batch size the model was exported with), zero if it is dynamic.
+
+        :return: Batch size.
+        :type: int
+        """
+        return deepspeech.impl.GetModelBatchSize(self._impl)
+
+    def createBatchScheduler(self, max_delay_ms=20):
+        """
+        Create a scheduler that runs the acoustic model steps of concurrent
+        streams in shared batched model invocations.
+
+        :param max_delay_ms: Maximum time to wait for more streams to fill up a batch.
+        :type max_delay_ms: int
+
+        :return: Scheduler to create batched streams with
+        :type: :func:`BatchScheduler`
+        """
+        return BatchScheduler(self, max_delay_ms=max_delay_ms)
+
 
 class Stream(object):
     """
@@ -258,6 +428,199 @@ class Stream(object):
         self._impl = None
 
 
+class BatchScheduler(object):
+    """
+    Gathers the acoustic model steps of concurrent streams into batched model
+    invocations. Streams created by the scheduler queue their windows of n_steps
+    timesteps instead of running the model while audio is fed, and a background
+    thread runs the queued windows of up to :func:`Model.batchSize()` streams per
+    model invocation, each stream keeping its own LSTM state. With models
+    exported with a dynamic time dimension (``--n_steps -1``), a window consists
+    of the timesteps all ready streams have buffered. Models exported
+    with a batch size of 1 still work, but gain nothing from batching.
+    The constructor cannot be called directly. Use :func:`Model.createBatchScheduler()`
+
+    :param model: Model to create streams with
+    :type model: :func:`Model`
+
+    :param max_delay_ms: Maximum time to wait for more streams to fill up a batch.
+    :type max_delay_ms: int
+    """
+    def __init__(self, model, max_delay_ms=20):
+        self._model = model
+        self._batch_size = model.batchSize()
+        self._max_delay = max_delay_ms / 1000
+        self._streams = []
+        # Streams with queued steps
+        self._ready = set()
+        # Guards the stream lists, native calls on a stream are guarded by the lock of the stream.
+        # Lock order: _process_lock, then locks of streams, then _lock.
+        self._lock = threading.RLock()
+        self._pending = threading.Condition(self._lock)
+        # Serializes the batched model invocations
+        self._process_lock = threading.Lock()
+        self._closed = False
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def __del__(self):
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def createStream(self):
+        """
+        Create a new streaming inference state whose acoustic model steps get
+        batched with the ones of the other streams of this scheduler.
+
+        :return: Stream object representing the newly created stream
+        :type: :func:`ScheduledStream`
+
+        :throws: RuntimeError on error
+        """
+        self._raise_error()
+        if self._closed:
+            raise RuntimeError("BatchScheduler is closed")
+        stream = self._model.createStream()
+        deepspeech.impl.SetStreamDeferInference(stream._impl, 1)
+        scheduled_stream = ScheduledStream(stream._impl, self)
+        stream._impl = None
+        with self._lock:
+            self._streams.append(scheduled_stream)
+        return scheduled_stream
+
+    def close(self):
+        """
+        Stop the scheduling thread. Streams of the scheduler remain usable,
+        their queued steps run when they get decoded.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._pending.notify()
+        if threading.current_thread() is not self._thread:
+            self._thread.join()
+
+    def _raise_error(self):
+        # Failures of the scheduling thread surface on the next call of a stream
+        if self._error is not None:
+            raise self._error
+
+    def _process(self):
+        # Runs the queued steps of all ready streams, feeding the other streams can go on meanwhile
+        with self._process_lock:
+            with self._lock:
+                streams = list(self._streams)
+            batch = []
+            try:
+                for stream in streams:
+                    stream._lock.acquire()
+                    if stream._impl and deepspeech.impl.GetStreamPendingBatches(stream._impl) > 0:
+                        batch.append(stream)
+                        continue
+                    with self._lock:
+                        self._ready.discard(stream)
+                    stream._lock.release()
+                if len(batch) > 0:
+                    status = deepspeech.impl.ProcessStreamsBatched(self._model._impl, [stream._impl for stream in batch])
+                    if status < 0:
+                        raise RuntimeError("ProcessStreamsBatched failed")
+                    with self._lock:
+                        self._ready.difference_update(batch)
+            finally:
+                for stream in batch:
+                    stream._lock.release()
+
+    def _notify(self, stream):
+        # Expects the lock of the stream to be held
+        if deepspeech.impl.GetStreamPendingBatches(stream._impl) > 0:
+            with self._lock:
+                self._ready.add(stream)
+                self._pending.notify()
+
+    def _remove(self, stream):
+        with self._lock:
+            if stream in self._streams:
+                self._streams.remove(stream)
+            self._ready.discard(stream)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if self._closed:
+                    return
+                num_ready = len(self._ready)
+                if num_ready == 0:
+                    self._pending.wait()
+                    continue
+                # Models with a dynamic batch size take all streams at once
+                batch_size = self._batch_size or len(self._streams)
+                if num_ready < min(batch_size, len(self._streams)):
+                    # Giving the other streams the chance to complete their windows
+                    self._pending.wait(self._max_delay)
+            try:
+                self._process()
+            except Exception as ex:  # pylint: disable=broad-except
+                self._error = ex
+                return
+
+
+class ScheduledStream(Stream):
+    """
+    Stream whose acoustic model steps get run by a :func:`BatchScheduler`.
+    The constructor cannot be called directly. Use :func:`BatchScheduler.createStream()`
+
+    :throws: The exception the scheduling thread failed with, on every call but :func:`freeStream()`
+    """
+    def __init__(self, native_stream, scheduler):
+        super(ScheduledStream, self).__init__(native_stream)
+        self._scheduler = scheduler
+        self._lock = threading.RLock()
+
+    def feedAudioContent(self, audio_buffer):
+        self._scheduler._raise_error()
+        with self._lock:
+            super(ScheduledStream, self).feedAudioContent(audio_buffer)
+            self._scheduler._notify(self)
+
+    def intermediateDecode(self):
+        self._scheduler._raise_error()
+        self._scheduler._process()
+        with self._lock:
+            return super(ScheduledStream, self).intermediateDecode()
+
+    def intermediateDecodeWithMetadata(self, num_results=1):
+        self._scheduler._raise_error()
+        self._scheduler._process()
+        with self._lock:
+            return super(ScheduledStream, self).intermediateDecodeWithMetadata(num_results)
+
+    def finishStream(self):
+        self._scheduler._raise_error()
+        self._scheduler._process()
+        self._scheduler._remove(self)
+        with self._lock:
+            return super(ScheduledStream, self).finishStream()
+
+    def finishStreamWithMetadata(self, num_results=1):
+        self._scheduler._raise_error()
+        self._scheduler._process()
+        self._scheduler._remove(self)
+        with self._lock:
+            return super(ScheduledStream, self).finishStreamWithMetadata(num_results)
+
+    def freeStream(self):
+        self._scheduler._remove(self)
+        with self._lock:
+            super(ScheduledStream, self).freeStream()
+
+
 # This is only for documentation purpose
 # Metadata, CandidateTranscript and TokenMetadata should be in sync with native_client/deepspeech.h
 class TokenMetadata(object):
@@ -19,7 +19,22 @@ except ImportError:
     from pipes import quote
 
 
+def resample(audio, sample_rate, desired_sample_rate):
+    # late binding librosa, so that the client also works without it
+    from librosa.core import resample as librosa_resample
+    audio = librosa_resample(audio.astype(np.float32) / np.iinfo(np.int16).max, sample_rate, desired_sample_rate)
+    return (np.clip(audio, -1.0, 1.0) * np.iinfo(np.int16).max).astype(np.int16)
+
+
 def convert_samplerate(audio_path, desired_sample_rate):
+    try:
+        # In-process decoding and resampling, if the required modules are available
+        import soundfile
+        audio, sample_rate = soundfile.read(audio_path, dtype='int16', always_2d=True)
+        audio = audio.mean(axis=1).astype(np.int16) if audio.shape[1] > 1 else audio[:, 0]
+        return desired_sample_rate, resample(audio, sample_rate, desired_sample_rate)
+    except (ImportError, RuntimeError):
+        pass
     sox_cmd = 'sox {} --type raw --bits 16 --channels 1 --rate {} --encoding signed-integer --endian little --compression 0.0 --no-dither - '.format(quote(audio_path), desired_sample_rate)
     try:
         output = subprocess.check_output(shlex.split(sox_cmd), stderr=subprocess.PIPE)
@@ -33,6 +33,79 @@ import_array();
   %append_output(SWIG_NewPointerObj(%as_voidptr(*$1), $*1_descriptor, 0));
 }
 
+%typemap(in) (StreamingState** aStreams, unsigned int aNumStreams) {
+  // sequence of StreamingState pointers, used by DS_ProcessStreamsBatched
+  if (!PySequence_Check($input)) {
+    SWIG_exception_fail(SWIG_TypeError, "Expected a sequence of streams");
+  }
+  $2 = (unsigned int)PySequence_Size($input);
+  $1 = (StreamingState**)malloc($2 * sizeof(StreamingState*));
+  for (unsigned int i = 0; i < $2; ++i) {
+    PyObject* o = PySequence_GetItem($input, i);
+    int res = SWIG_ConvertPtr(o, (void**)&$1[i], $*1_descriptor, 0);
+    Py_DECREF(o);
+    if (!SWIG_IsOK(res)) {
+      SWIG_exception_fail(SWIG_ArgError(res), "Expected a sequence of streams");
+    }
+  }
+}
+
+%typemap(freearg) (StreamingState** aStreams, unsigned int aNumStreams) {
+  free($1);
+}
+
+%typemap(in) (const short** aBuffers, const unsigned int* aBufferSizes, unsigned int aNumBuffers) (PyObject* arrays = NULL, unsigned int* sizes = NULL) {
+  // sequence of NumPy int16 buffers, used by DS_SpeechToTextBatchWithMetadata
+  if (!PySequence_Check($input)) {
+    SWIG_exception_fail(SWIG_TypeError, "Expected a sequence of audio buffers");
+  }
+  $3 = (unsigned int)PySequence_Size($input);
+  $1 = ($1_ltype)malloc($3 * sizeof(short*));
+  sizes = (unsigned int*)malloc($3 * sizeof(unsigned int));
+  $2 = sizes;
+  // keeps the converted NumPy objects alive during the call
+  arrays = PyList_New($3);
+  for (unsigned int i = 0; i < $3; ++i) {
+    PyObject* o = PySequence_GetItem($input, i);
+    PyObject* array = PyArray_FROMANY(o, NPY_SHORT, 1, 1, NPY_ARRAY_IN_ARRAY);
+    Py_DECREF(o);
+    if (!array) {
+      SWIG_fail;
+    }
+    PyList_SET_ITEM(arrays, i, array);
+    $1[i] = ($*1_ltype)PyArray_DATA((PyArrayObject*)array);
+    sizes[i] = (unsigned int)PyArray_SIZE((PyArrayObject*)array);
+  }
+}
+
+%typemap(freearg) (const short** aBuffers, const unsigned int* aBufferSizes, unsigned int aNumBuffers) {
+  free((void*)$1);
+  free(sizes$argnum);
+  Py_XDECREF(arrays$argnum);
+}
+
+%typemap(in, numinputs=0) Metadata** aResults {
+  // one result per audio buffer, arg4 is aNumBuffers
+  $1 = (Metadata**)calloc(arg4, sizeof(Metadata*));
+}
+
+%typemap(argout) Metadata** aResults {
+  // owned, extended destructor needs to be called by SWIG
+  PyObject* results = PyList_New(arg4);
+  for (unsigned int i = 0; i < arg4; ++i) {
+    PyObject* o = $1[i] ? SWIG_NewPointerObj(%as_voidptr($1[i]), $*1_descriptor, SWIG_POINTER_OWN) : Py_None;
+    if (o == Py_None) {
+      Py_INCREF(o);
+    }
+    PyList_SET_ITEM(results, i, o);
+  }
+  %append_output(results);
+}
+
+%typemap(freearg) Metadata** aResults {
+  free($1);
+}
+
 %typemap(out) Metadata* {
   // owned, extended destructor needs to be called by SWIG
   %append_output(SWIG_NewPointerObj(%as_voidptr($1), $1_descriptor, SWIG_POINTER_OWN));
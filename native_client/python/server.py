@@ -0,0 +1,408 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import io
+import json
+import os
+import struct
+import sys
+import wave
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+WEBSOCKET_GUID = b'258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+OPCODE_CONTINUATION = 0x0
+OPCODE_TEXT = 0x1
+OPCODE_BINARY = 0x2
+OPCODE_CLOSE = 0x8
+OPCODE_PING = 0x9
+OPCODE_PONG = 0xA
+
+COMMAND_INTERMEDIATE = 'intermediate'
+COMMAND_FINISH = 'finish'
+
+HTTP_STATUS = {
+    200: 'OK',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    413: 'Payload Too Large',
+    503: 'Service Unavailable',
+}
+
+
+class WebSocket(object):
+    """
+    Minimal server side of a WebSocket connection (RFC 6455) on top of asyncio streams
+
+    :param reader: Stream reader of the upgraded HTTP connection
+    :param writer: Stream writer of the upgraded HTTP connection
+    :param max_message_size: Maximum size of a (reassembled) message in bytes
+    """
+    def __init__(self, reader, writer, max_message_size):
+        self.reader = reader
+        self.writer = writer
+        self.max_message_size = max_message_size
+        self.closed = False
+
+    async def _read_frame(self):
+        head = await self.reader.readexactly(2)
+        fin = head[0] & 0x80 != 0
+        opcode = head[0] & 0x0F
+        masked = head[1] & 0x80 != 0
+        length = head[1] & 0x7F
+        if length == 126:
+            length = struct.unpack('!H', await self.reader.readexactly(2))[0]
+        elif length == 127:
+            length = struct.unpack('!Q', await self.reader.readexactly(8))[0]
+        if length > self.max_message_size:
+            raise ValueError('WebSocket frame exceeds maximum message size')
+        mask = await self.reader.readexactly(4) if masked else None
+        payload = await self.reader.readexactly(length)
+        if mask is not None:
+            payload = np.bitwise_xor(np.frombuffer(payload, dtype=np.uint8),
+                                     np.resize(np.frombuffer(mask, dtype=np.uint8), length)).tobytes()
+        return fin, opcode, payload
+
+    async def receive(self):
+        """
+        Receives the next text or binary message. Control frames are handled internally.
+
+        :return: Tuple of opcode (OPCODE_TEXT or OPCODE_BINARY) and payload, or None if the connection got closed.
+        :type: tuple
+        """
+        message_opcode = None
+        fragments = []
+        size = 0
+        while True:
+            try:
+                fin, opcode, payload = await self._read_frame()
+            except (asyncio.IncompleteReadError, ConnectionError):
+                self.closed = True
+                return None
+            if opcode == OPCODE_CLOSE:
+                await self.close()
+                return None
+            if opcode == OPCODE_PING:
+                await self.send(OPCODE_PONG, payload)
+                continue
+            if opcode == OPCODE_PONG:
+                continue
+            if opcode != OPCODE_CONTINUATION:
+                message_opcode = opcode
+            size += len(payload)
+            if size > self.max_message_size:
+                raise ValueError('WebSocket message exceeds maximum message size')
+            fragments.append(payload)
+            if fin:
+                return message_opcode, b''.join(fragments)
+
+    async def send(self, opcode, payload):
+        if self.closed:
+            return
+        length = len(payload)
+        if length < 126:
+            head = struct.pack('!BB', 0x80 | opcode, length)
+        elif length < (1 << 16):
+            head = struct.pack('!BBH', 0x80 | opcode, 126, length)
+        else:
+            head = struct.pack('!BBQ', 0x80 | opcode, 127, length)
+        self.writer.write(head + payload)
+        await self.writer.drain()
+
+    async def send_json(self, value):
+        await self.send(OPCODE_TEXT, json.dumps(value).encode('utf-8'))
+
+    async def close(self, code=1000):
+        if self.closed:
+            return
+        try:
+            await self.send(OPCODE_CLOSE, struct.pack('!H', code))
+        except ConnectionError:
+            pass
+        self.closed = True
+
+
+class Server(object):
+    """
+    Asyncio based inference server that owns one model and multiplexes many concurrent audio streams on it.
+    All calls into the model run in one bounded thread pool, while every connection has a bounded queue
+    of pending audio chunks. If a connection sends audio faster than it can be processed, the server stops
+    reading from it, so that TCP flow control slows the client down.
+
+    Endpoints:
+
+    - ``GET /`` returns the server status as JSON.
+    - ``POST /stt`` transcribes a request body of 16 bit mono PCM data (raw or WAV) at the model's sample rate.
+    - ``GET /stream`` (WebSocket) accepts binary messages of 16 bit mono PCM data at the model's sample rate.
+      Text messages ``intermediate`` and ``finish`` request an intermediate or the final transcript.
+      The server sends JSON messages of the form ``{"type": "intermediate" | "final", "transcript": ...}``.
+      If processing the stream fails, it sends ``{"type": "error", "error": ...}`` and closes the connection.
+
+    :param model: The model to serve
+    :type model: deepspeech.Model
+    :param max_workers: Size of the thread pool for model calls - defaults to the number of CPUs
+    :type max_workers: int
+    :param max_streams: Maximum number of concurrent streams - additional ones get rejected - no limit if None
+    :type max_streams: int
+    :param max_pending_chunks: Maximum number of received but not yet processed audio chunks per stream
+    :type max_pending_chunks: int
+    :param intermediate_interval_ms: Audio duration after which an intermediate transcript is sent automatically - 0 for never
+    :type intermediate_interval_ms: int
+    :param max_message_size: Maximum size of request bodies and WebSocket messages in bytes
+    :type max_message_size: int
+    """
+    def __init__(self,
+                 model,
+                 max_workers=None,
+                 max_streams=None,
+                 max_pending_chunks=8,
+                 intermediate_interval_ms=1000,
+                 max_message_size=16 * 1024 * 1024):
+        self.model = model
+        self.sample_rate = model.sampleRate()
+        self.max_workers = max_workers or os.cpu_count()
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        self.max_streams = max_streams
+        self.max_pending_chunks = max_pending_chunks
+        self.intermediate_interval = self.sample_rate * intermediate_interval_ms // 1000
+        self.max_message_size = max_message_size
+        self.active_streams = 0
+        self.total_streams = 0
+
+    async def run_in_pool(self, fun, *args):
+        return await asyncio.get_event_loop().run_in_executor(self.executor, fun, *args)
+
+    async def start(self, host='127.0.0.1', port=8080):
+        """
+        Starts listening on host and port
+
+        :return: The asyncio server object
+        """
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+    async def handle_connection(self, reader, writer):
+        try:
+            request_line = (await reader.readline()).decode('latin-1').strip()
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode('latin-1').strip()
+                if not line:
+                    break
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+            parts = request_line.split(' ')
+            if len(parts) != 3:
+                await self.respond(writer, 400, {'error': 'Malformed request'})
+                return
+            method, path, _ = parts
+            if path == '/stream' and headers.get('upgrade', '').lower() == 'websocket':
+                await self.handle_stream(reader, writer, headers)
+            elif path == '/stt':
+                if method != 'POST':
+                    await self.respond(writer, 405, {'error': 'Use POST'})
+                else:
+                    await self.handle_stt(reader, writer, headers)
+            elif path == '/':
+                await self.respond(writer, 200, {'sample_rate': self.sample_rate,
+                                                 'active_streams': self.active_streams,
+                                                 'total_streams': self.total_streams,
+                                                 'workers': self.max_workers})
+            else:
+                await self.respond(writer, 404, {'error': 'Not found'})
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, value):
+        body = json.dumps(value).encode('utf-8')
+        writer.write('HTTP/1.1 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\n'
+                     'Connection: close\r\n\r\n'.format(status, HTTP_STATUS[status], len(body)).encode('latin-1'))
+        writer.write(body)
+        await writer.drain()
+
+    def to_samples(self, data):
+        if data[:4] == b'RIFF':
+            with wave.open(io.BytesIO(data), 'rb') as wav_file:
+                if wav_file.getframerate() != self.sample_rate or wav_file.getnchannels() != 1 \
+                        or wav_file.getsampwidth() != 2:
+                    raise ValueError('Audio has to be 16 bit mono at {} Hz'.format(self.sample_rate))
+                data = wav_file.readframes(wav_file.getnframes())
+        return np.frombuffer(data[:len(data) - len(data) % 2], dtype=np.int16)
+
+    async def handle_stt(self, reader, writer, headers):
+        length = int(headers.get('content-length', '0'))
+        if length > self.max_message_size:
+            await self.respond(writer, 413, {'error': 'Request body too large'})
+            return
+        try:
+            audio = self.to_samples(await reader.readexactly(length))
+        except (ValueError, wave.Error) as ex:
+            await self.respond(writer, 400, {'error': str(ex)})
+            return
+        transcript = await self.run_in_pool(self.model.stt, audio)
+        await self.respond(writer, 200, {'transcript': transcript})
+
+    async def handle_stream(self, reader, writer, headers):
+        if self.max_streams is not None and self.active_streams >= self.max_streams:
+            await self.respond(writer, 503, {'error': 'Too many concurrent streams'})
+            return
+        key = headers.get('sec-websocket-key', '').encode('latin-1')
+        accept = base64.b64encode(hashlib.sha1(key + WEBSOCKET_GUID).digest()).decode('latin-1')
+        writer.write('HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                     'Sec-WebSocket-Accept: {}\r\n\r\n'.format(accept).encode('latin-1'))
+        await writer.drain()
+        websocket = WebSocket(reader, writer, self.max_message_size)
+        self.active_streams += 1
+        self.total_streams += 1
+        try:
+            await self.run_stream(websocket)
+        finally:
+            self.active_streams -= 1
+
+    async def run_stream(self, websocket):
+        stream = await self.run_in_pool(self.model.createStream)
+        # None marks the end of the stream, the value tells if a final transcript is expected
+        queue = asyncio.Queue(maxsize=self.max_pending_chunks)
+
+        async def process():
+            fed = 0
+            last_intermediate = 0
+            stream_open = True
+            try:
+                while True:
+                    item = await queue.get()
+                    if isinstance(item, bool):
+                        if item:
+                            stream_open = False
+                            transcript = await self.run_in_pool(stream.finishStream)
+                            await websocket.send_json({'type': 'final', 'transcript': transcript})
+                        return
+                    if isinstance(item, str):
+                        transcript = await self.run_in_pool(stream.intermediateDecode)
+                        await websocket.send_json({'type': 'intermediate', 'transcript': transcript})
+                        continue
+                    await self.run_in_pool(stream.feedAudioContent, item)
+                    fed += len(item)
+                    if 0 < self.intermediate_interval <= fed - last_intermediate:
+                        last_intermediate = fed
+                        transcript = await self.run_in_pool(stream.intermediateDecode)
+                        await websocket.send_json({'type': 'intermediate', 'transcript': transcript})
+            finally:
+                if stream_open:
+                    await self.run_in_pool(stream.freeStream)
+
+        async def receive():
+            # Returns whether a final transcript is expected
+            remainder = b''
+            try:
+                while True:
+                    message = await websocket.receive()
+                    if message is None:
+                        return False
+                    opcode, payload = message
+                    if opcode == OPCODE_BINARY:
+                        payload = remainder + payload
+                        remainder = payload[len(payload) - len(payload) % 2:]
+                        # Blocks while the queue is full - reading from the connection pauses until audio got processed
+                        await queue.put(np.frombuffer(payload[:len(payload) - len(remainder)], dtype=np.int16))
+                    elif opcode == OPCODE_TEXT:
+                        command = payload.decode('utf-8', errors='replace').strip()
+                        if command == COMMAND_FINISH:
+                            return True
+                        if command == COMMAND_INTERMEDIATE:
+                            await queue.put(command)
+            except ValueError:
+                await websocket.close(code=1009)
+                return False
+
+        processor = asyncio.ensure_future(process())
+        receiver = asyncio.ensure_future(receive())
+        try:
+            try:
+                # The processor only ends by itself if processing failed
+                await asyncio.wait([processor, receiver], return_when=asyncio.FIRST_COMPLETED)
+                if not processor.done():
+                    # Queued chunks get processed before the end of the stream - unless processing fails meanwhile
+                    end = asyncio.ensure_future(queue.put(receiver.result()))
+                    await asyncio.wait([end, processor], return_when=asyncio.FIRST_COMPLETED)
+                    end.cancel()
+                await processor
+            finally:
+                receiver.cancel()
+                processor.cancel()
+                # Lets the processor free the stream
+                await asyncio.wait([receiver, processor])
+        except ConnectionError:
+            pass
+        except Exception as ex:  # pylint: disable=broad-except
+            try:
+                await websocket.send_json({'type': 'error', 'error': str(ex)})
+                await websocket.close(code=1011)
+            except ConnectionError:
+                pass
+        finally:
+            await websocket.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serving DeepSpeech inference over HTTP and WebSocket.')
+    parser.add_argument('--model', required=True,
+                        help='Path to the model (protocol buffer binary file)')
+    parser.add_argument('--scorer', required=False,
+                        help='Path to the external scorer file')
+    parser.add_argument('--beam_width', type=int,
+                        help='Beam width for the CTC decoder')
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='Host to listen on')
+    parser.add_argument('--port', type=int, default=8080,
+                        help='Port to listen on')
+    parser.add_argument('--workers', type=int,
+                        help='Number of threads for running model calls - defaults to the number of CPUs')
+    parser.add_argument('--max_streams', type=int,
+                        help='Maximum number of concurrent streams')
+    parser.add_argument('--max_pending_chunks', type=int, default=8,
+                        help='Maximum number of unprocessed audio chunks per stream before reading from it pauses')
+    parser.add_argument('--intermediate_interval_ms', type=int, default=1000,
+                        help='Audio duration after which intermediate transcripts are sent - 0 for only on request')
+    args = parser.parse_args()
+
+    from deepspeech import Model
+    model = Model(args.model)
+    if args.beam_width:
+        model.setBeamWidth(args.beam_width)
+    if args.scorer:
+        model.enableExternalScorer(args.scorer)
+
+    server = Server(model,
+                    max_workers=args.workers,
+                    max_streams=args.max_streams,
+                    max_pending_chunks=args.max_pending_chunks,
+                    intermediate_interval_ms=args.intermediate_interval_ms)
+    loop = asyncio.get_event_loop()
+    listener = loop.run_until_complete(server.start(host=args.host, port=args.port))
+    print('Listening on {}:{}'.format(args.host, args.port), file=sys.stderr)
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listener.close()
+        loop.run_until_complete(listener.wait_closed())
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
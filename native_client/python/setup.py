@@ -83,8 +83,9 @@ def main():
               'Discussions': 'https://discourse.mozilla.org/c/deep-speech',
           },
           ext_modules=[ds_ext],
-          py_modules=['deepspeech', 'deepspeech.client', 'deepspeech.impl'],
-          entry_points={'console_scripts':['deepspeech=deepspeech.client:main']},
+          py_modules=['deepspeech', 'deepspeech.client', 'deepspeech.server', 'deepspeech.impl'],
+          entry_points={'console_scripts':['deepspeech=deepspeech.client:main',
+                                           'deepspeech-server=deepspeech.server:main']},
           install_requires=['numpy%s' % numpy_min_ver],
           include_package_data=True,
           classifiers=[
@@ -19,6 +19,8 @@ def main():
                         help='First audio file to use in interleaved streams')
     parser.add_argument('--audio2', required=True,
                         help='Second audio file to use in interleaved streams')
+    parser.add_argument('--batched', action='store_true',
+                        help='Run the acoustic model steps of both streams in shared batched invocations')
     args = parser.parse_args()
 
     ds = Model(args.model)
@@ -36,8 +38,9 @@ def main():
     audio2 = np.frombuffer(fin.readframes(fin.getnframes()), np.int16)
     fin.close()
 
-    stream1 = ds.createStream()
-    stream2 = ds.createStream()
+    scheduler = ds.createBatchScheduler() if args.batched else None
+    stream1 = scheduler.createStream() if scheduler else ds.createStream()
+    stream2 = scheduler.createStream() if scheduler else ds.createStream()
 
     splits1 = np.array_split(audio1, 10)
     splits2 = np.array_split(audio2, 10)
@@ -45,9 +48,15 @@ def main():
     for part1, part2 in zip(splits1, splits2):
         stream1.feedAudioContent(part1)
         stream2.feedAudioContent(part2)
+        if scheduler:
+            # Runs the queued steps of both streams
+            stream1.intermediateDecode()
 
     print(stream1.finishStream())
     print(stream2.finishStream())
 
+    if scheduler:
+        scheduler.close()
+
 if __name__ == '__main__':
     main()
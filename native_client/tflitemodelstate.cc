@@ -361,6 +361,7 @@ TFLiteModelState::infer(const vector<float>& mfcc,
                         vector<float>& state_h_output)
 {
   const size_t num_classes = alphabet_.GetSize() + 1; // +1 for blank
+  std::lock_guard<std::mutex> lock(interpreter_mutex_);
 
   // Feeding input_node
   copy_vector_to_tensor(mfcc, input_node_idx_, n_frames*mfcc_feats_per_timestep_);
@@ -393,6 +394,8 @@ void
 TFLiteModelState::compute_mfcc(const vector<float>& samples,
                                vector<float>& mfcc_output)
 {
+  std::lock_guard<std::mutex> lock(interpreter_mutex_);
+
   // Feeding input_node
   copy_vector_to_tensor(samples, input_samples_idx_, samples.size());
 
@@ -2,6 +2,7 @@
 #define TFLITEMODELSTATE_H
 
 #include <memory>
+#include <mutex>
 #include <vector>
 
 #include "tensorflow/lite/model.h"
@@ -28,6 +29,10 @@ struct TFLiteModelState : public ModelState
   std::vector<int> acoustic_exec_plan_;
   std::vector<int> mfcc_exec_plan_;
 
+  // The interpreter is shared by all streams of the model, but it is not
+  // thread-safe: feeding its tensors and invoking it has to be serialized
+  std::mutex interpreter_mutex_;
+
   TFLiteModelState();
   virtual ~TFLiteModelState();
 
@@ -1,3 +1,5 @@
+#include <algorithm>
+
 #include "tfmodelstate.h"
 
 #include "workspace_status.h"
@@ -134,7 +136,9 @@ TFModelState::init(const char* model_path)
     NodeDef node = graph_def_.node(i);
     if (node.name() == "input_node") {
       const auto& shape = node.attr().at("shape").shape();
-      n_steps_ = shape.dim(1).size();
+      // Dynamic dimensions have size -1
+      batch_size_ = std::max<long long>(shape.dim(0).size(), 0);
+      n_steps_ = std::max<long long>(shape.dim(1).size(), 0);
       n_context_ = (shape.dim(2).size()-1)/2;
       n_features_ = shape.dim(3).size();
       mfcc_feats_per_timestep_ = shape.dim(2).size() * shape.dim(3).size();
@@ -160,10 +164,19 @@ TFModelState::init(const char* model_path)
     }
   }
 
+  if (n_steps_ == 0) {
+    std::vector<tensorflow::Tensor> min_steps_output;
+    status = session_->Run({}, {
+      "metadata_min_steps"
+    }, {}, &min_steps_output);
+    // Models exported without it get run on whole utterances
+    min_steps_ = status.ok() ? std::max(min_steps_output[0].scalar<int>()(), 0) : 0;
+  }
+
   if (n_context_ == -1 || n_features_ == -1) {
     std::cerr << "Error: Could not infer input shape from model file. "
               << "Make sure input_node is a 4D tensor with shape "
-              << "[batch_size=1, time, window_size, n_features]."
+              << "[batch_size, time, window_size, n_features]."
               << std::endl;
     return DS_ERR_INVALID_SHAPE;
   }
@@ -207,14 +220,35 @@ TFModelState::infer(const std::vector<float>& mfcc,
                     vector<float>& state_c_output,
                     vector<float>& state_h_output)
 {
-  const size_t num_classes = alphabet_.GetSize() + 1; // +1 for blank
-
-  Tensor input = tensor_from_vector(mfcc, TensorShape({BATCH_SIZE, n_steps_, 2*n_context_+1, n_features_}));
-  Tensor previous_state_c_t = tensor_from_vector(previous_state_c, TensorShape({BATCH_SIZE, (long long)state_size_}));
-  Tensor previous_state_h_t = tensor_from_vector(previous_state_h, TensorShape({BATCH_SIZE, (long long)state_size_}));
+  infer_batch(mfcc, n_frames, BATCH_SIZE, previous_state_c, previous_state_h,
+              logits_output, state_c_output, state_h_output);
+}
 
-  Tensor input_lengths(DT_INT32, TensorShape({1}));
-  input_lengths.scalar<int>()() = n_frames;
+void
+TFModelState::infer_batch(const std::vector<float>& mfcc,
+                          unsigned int n_frames,
+                          unsigned int n_streams,
+                          const std::vector<float>& previous_state_c,
+                          const std::vector<float>& previous_state_h,
+                          vector<float>& logits_output,
+                          vector<float>& state_c_output,
+                          vector<float>& state_h_output)
+{
+  assert(batch_size_ == 0 || n_streams <= batch_size_);
+  const size_t num_classes = alphabet_.GetSize() + 1; // +1 for blank
+  const long long batch_size = batch_size_ > 0 ? batch_size_ : n_streams;
+  const long long n_steps = n_steps_ > 0 ? n_steps_ : n_frames;
+
+  // Unused batch entries get zero padded
+  Tensor input = tensor_from_vector(mfcc, TensorShape({batch_size, n_steps, 2*n_context_+1, n_features_}));
+  Tensor previous_state_c_t = tensor_from_vector(previous_state_c, TensorShape({batch_size, (long long)state_size_}));
+  Tensor previous_state_h_t = tensor_from_vector(previous_state_h, TensorShape({batch_size, (long long)state_size_}));
+
+  Tensor input_lengths(DT_INT32, TensorShape({batch_size}));
+  auto input_lengths_mapped = input_lengths.flat<int>();
+  for (int i = 0; i < batch_size; ++i) {
+    input_lengths_mapped(i) = n_frames;
+  }
 
   vector<Tensor> outputs;
   Status status = session_->Run(
@@ -233,15 +267,84 @@ TFModelState::infer(const std::vector<float>& mfcc,
     return;
   }
 
-  copy_tensor_to_vector(outputs[0], logits_output, n_frames * BATCH_SIZE * num_classes);
+  // Logits are time major ([n_steps, batch_size, num_classes]), re-arrange
+  // them so that the logits of each stream are contiguous
+  auto logits_mapped = outputs[0].flat<float>();
+  logits_output.reserve(logits_output.size() + n_streams * n_frames * num_classes);
+  for (unsigned int stream = 0; stream < n_streams; ++stream) {
+    for (unsigned int t = 0; t < n_frames; ++t) {
+      const size_t offset = (t * batch_size + stream) * num_classes;
+      for (size_t c = 0; c < num_classes; ++c) {
+        logits_output.push_back(logits_mapped(offset + c));
+      }
+    }
+  }
 
   state_c_output.clear();
-  state_c_output.reserve(state_size_);
-  copy_tensor_to_vector(outputs[1], state_c_output);
+  state_c_output.reserve(n_streams * state_size_);
+  copy_tensor_to_vector(outputs[1], state_c_output, n_streams * state_size_);
 
   state_h_output.clear();
-  state_h_output.reserve(state_size_);
-  copy_tensor_to_vector(outputs[2], state_h_output);
+  state_h_output.reserve(n_streams * state_size_);
+  copy_tensor_to_vector(outputs[2], state_h_output, n_streams * state_size_);
+}
+
+int
+TFModelState::infer_padded(const std::vector<float>& mfcc,
+                           const std::vector<int>& n_frames,
+                           unsigned int max_frames,
+                           vector<float>& logits_output)
+{
+  if (batch_size_ > 0 || n_steps_ > 0) {
+    std::cerr << "Error: Transcribing a batch of utterances at once requires a model "
+              << "exported with --export_batch_size 0 and --n_steps -1." << std::endl;
+    return DS_ERR_INVALID_SHAPE;
+  }
+
+  const size_t num_classes = alphabet_.GetSize() + 1; // +1 for blank
+  const long long batch_size = n_frames.size();
+
+  Tensor input = tensor_from_vector(mfcc, TensorShape({batch_size, max_frames, 2*n_context_+1, n_features_}));
+  // Every utterance starts from zero states
+  Tensor previous_state_c_t = tensor_from_vector({}, TensorShape({batch_size, (long long)state_size_}));
+  Tensor previous_state_h_t = tensor_from_vector({}, TensorShape({batch_size, (long long)state_size_}));
+
+  Tensor input_lengths(DT_INT32, TensorShape({batch_size}));
+  auto input_lengths_mapped = input_lengths.flat<int>();
+  for (int i = 0; i < batch_size; ++i) {
+    input_lengths_mapped(i) = n_frames[i];
+  }
+
+  vector<Tensor> outputs;
+  Status status = session_->Run(
+    {
+     {"input_node", input},
+     {"input_lengths", input_lengths},
+     {"previous_state_c", previous_state_c_t},
+     {"previous_state_h", previous_state_h_t}
+    },
+    {"logits"},
+    {},
+    &outputs);
+
+  if (!status.ok()) {
+    std::cerr << "Error running session: " << status << "\n";
+    return DS_ERR_FAIL_RUN_SESS;
+  }
+
+  // Logits are time major ([max_frames, batch_size, num_classes]), the batch
+  // decoder expects them batch major
+  auto logits_mapped = outputs[0].flat<float>();
+  logits_output.resize(batch_size * max_frames * num_classes);
+  for (long long b = 0; b < batch_size; ++b) {
+    for (unsigned int t = 0; t < max_frames; ++t) {
+      std::copy_n(&logits_mapped((t * batch_size + b) * num_classes),
+                  num_classes,
+                  &logits_output[(b * max_frames + t) * num_classes]);
+    }
+  }
+
+  return DS_ERR_OK;
 }
 
 void
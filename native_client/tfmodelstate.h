@@ -28,6 +28,20 @@ struct TFModelState : public ModelState
                      std::vector<float>& state_c_output,
                      std::vector<float>& state_h_output) override;
 
+  virtual void infer_batch(const std::vector<float>& mfcc,
+                           unsigned int n_frames,
+                           unsigned int n_streams,
+                           const std::vector<float>& previous_state_c,
+                           const std::vector<float>& previous_state_h,
+                           std::vector<float>& logits_output,
+                           std::vector<float>& state_c_output,
+                           std::vector<float>& state_h_output) override;
+
+  virtual int infer_padded(const std::vector<float>& mfcc,
+                           const std::vector<int>& n_frames,
+                           unsigned int max_frames,
+                           std::vector<float>& logits_output) override;
+
   virtual void compute_mfcc(const std::vector<float>& audio_buffer,
                             std::vector<float>& mfcc_output) override;
 };
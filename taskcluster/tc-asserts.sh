@@ -445,6 +445,23 @@ run_prod_concurrent_stream_tests()
 
   assert_correct_ldc93s1_prodmodel "${output1}" "${status}" "16k"
   assert_correct_inference "${output2}" "we must find a new home in the stars" "${status}"
+
+  # Same streams with deferred acoustic model steps, run by DS_ProcessStreamsBatched()
+  set +e
+  output=$(python ${TASKCLUSTER_TMP_DIR}/test_sources/concurrent_streams.py \
+             --model ${TASKCLUSTER_TMP_DIR}/${model_name_mmap} \
+             --scorer ${TASKCLUSTER_TMP_DIR}/kenlm.scorer \
+             --audio1 ${TASKCLUSTER_TMP_DIR}/LDC93S1_pcms16le_1_16000.wav \
+             --audio2 ${TASKCLUSTER_TMP_DIR}/new-home-in-the-stars-16k.wav \
+             --batched 2>${TASKCLUSTER_TMP_DIR}/stderr)
+  status=$?
+  set -e
+
+  output1=$(echo "${output}" | head -n 1)
+  output2=$(echo "${output}" | tail -n 1)
+
+  assert_correct_ldc93s1_prodmodel "${output1}" "${status}" "16k"
+  assert_correct_inference "${output2}" "we must find a new home in the stars" "${status}"
 }
 
 run_prod_inference_tests()
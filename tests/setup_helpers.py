@@ -0,0 +1,22 @@
+import os
+
+from deepspeech_training.util.config import Config, initialize_globals
+from deepspeech_training.util.flags import FLAGS, create_flags
+
+
+def create_test_flags():
+    """Defines the training flags with their defaults - once per process, as flags cannot be defined twice"""
+    if 'feature_win_step' not in FLAGS:
+        create_flags()
+    FLAGS.mark_as_parsed()
+
+
+def initialize_test_config():
+    """Initializes the global configuration with the default flags and the English alphabet - once per process,
+    as initialize_globals cannot run twice"""
+    create_test_flags()
+    try:
+        Config.alphabet
+    except RuntimeError:
+        FLAGS.alphabet_config_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'alphabet.txt')
+        initialize_globals()
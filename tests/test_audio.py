@@ -0,0 +1,88 @@
+import os
+import shutil
+import tempfile
+import unittest
+import wave
+
+import numpy as np
+from deepspeech_training.util.audio import (
+    AudioFile,
+    DEFAULT_FORMAT,
+    MAX_IN_MEMORY_DURATION,
+    get_dtype,
+    load_audio_file,
+    read_frames_from_file,
+    vad_split,
+)
+
+FRAME_MS = 30
+FRAME_SAMPLES = DEFAULT_FORMAT.rate * FRAME_MS // 1000
+
+
+class TestLongNonWavFiles(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        import soundfile  # pylint: disable=import-outside-toplevel
+        cls.tmp_dir = tempfile.mkdtemp()
+        cls.flac_path = os.path.join(cls.tmp_dir, 'long.flac')
+        cls.num_samples = (MAX_IN_MEMORY_DURATION + 1) * DEFAULT_FORMAT.rate
+        samples = np.zeros(cls.num_samples, dtype=np.int16)
+        samples[::1000] = 1000
+        soundfile.write(cls.flac_path, samples, DEFAULT_FORMAT.rate)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp_dir)
+
+    def test_load_keeps_path_only_for_streaming(self):
+        self.assertEqual(load_audio_file(self.flac_path, stream_long=True), self.flac_path)
+        self.assertNotIsInstance(load_audio_file(self.flac_path), str)
+
+    def test_audio_file_converts(self):
+        with AudioFile(self.flac_path) as wav_file:
+            self.assertEqual(wav_file.getnframes(), self.num_samples)
+            self.assertEqual(wav_file.getframerate(), DEFAULT_FORMAT.rate)
+
+    def test_audio_file_as_path(self):
+        with AudioFile(self.flac_path, as_path=True) as wav_path:
+            self.assertTrue(wav_path.endswith('.wav'))
+            with wave.open(wav_path, 'r') as wav_file:
+                self.assertEqual(wav_file.getnframes(), self.num_samples)
+        self.assertFalse(os.path.exists(wav_path))
+
+    def test_frames_get_streamed(self):
+        num_frames = sum(1 for _ in read_frames_from_file(self.flac_path, frame_duration_ms=FRAME_MS))
+        self.assertEqual(num_frames, self.num_samples // FRAME_SAMPLES)
+
+
+class TestVadSplitMaxDuration(unittest.TestCase):
+
+    def test_split_at_quietest_frame(self):
+        rng = np.random.RandomState(0)
+        amplitudes = np.full(300, 3000.0)
+        quiet_frames = [70, 160, 250]
+        amplitudes[quiet_frames] = 300.0
+        frames = [(rng.normal(0, amplitude, FRAME_SAMPLES)).astype(get_dtype(DEFAULT_FORMAT)).tobytes()
+                  for amplitude in amplitudes]
+        max_duration_ms = 100 * FRAME_MS
+        segments = list(vad_split(frames, aggressiveness=0, max_segment_duration_ms=max_duration_ms))
+
+        self.assertEqual(b''.join(segment for segment, _, _ in segments), b''.join(frames))
+        for (_, _, end), (_, next_start, _) in zip(segments, segments[1:]):
+            self.assertEqual(end, next_start)
+        frame_bytes = FRAME_SAMPLES * DEFAULT_FORMAT.width
+        for segment, start, end in segments:
+            self.assertLessEqual(len(segment) // frame_bytes * FRAME_MS, max_duration_ms)
+            self.assertEqual(end - start, len(segment) // frame_bytes * FRAME_MS)
+        # Forced splits happen right after the quiet frames
+        split_frames = np.cumsum([len(segment) // frame_bytes for segment, _, _ in segments])[:-1]
+        self.assertEqual(list(split_frames), [quiet_frame + 1 for quiet_frame in quiet_frames])
+
+    def test_no_limit(self):
+        frames = [np.random.RandomState(0).normal(0, 3000, FRAME_SAMPLES).astype(np.int16).tobytes()] * 300
+        self.assertEqual(len(list(vad_split(frames, aggressiveness=0))), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import tensorflow as tf
+import tensorflow.compat.v1 as tfv1
+from tensorflow.python.training.saving.saveable_object import SaveableObject, SaveSpec
+from deepspeech_training.util.checkpoints import AsyncCheckpointSaver, _load_checkpoint, close_checkpoint_savers
+
+from .setup_helpers import create_test_flags
+
+
+def setUpModule():
+    create_test_flags()
+
+
+class CanonicalWeightsSaveable(SaveableObject):
+    """Saves a tensor derived from a variable, like CudnnLSTM saves its canonical weights"""
+    def __init__(self, variable, name):
+        tensor = 2 * variable
+        super(CanonicalWeightsSaveable, self).__init__(variable, [SaveSpec(tensor, '', name)], name)
+
+    def restore(self, restored_tensors, restored_shapes):
+        return tfv1.assign(self.op, restored_tensors[0] / 2)
+
+
+class TestAsyncCheckpointSaver(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.graph = tf.Graph()
+        with self.graph.as_default():
+            self.weights = tfv1.get_variable('weights', initializer=np.zeros((2, 3), dtype=np.float32))
+            self.global_step = tfv1.train.get_or_create_global_step()
+            self.update = tfv1.group(tfv1.assign_add(self.weights, tf.ones_like(self.weights)),
+                                     tfv1.assign_add(self.global_step, 1))
+            self.session = tfv1.Session(graph=self.graph)
+            self.session.run(tfv1.global_variables_initializer())
+
+    def tearDown(self):
+        self.session.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def create_saver(self, **kwargs):
+        with self.graph.as_default():
+            saver = AsyncCheckpointSaver(**kwargs)
+        self.addCleanup(close_checkpoint_savers, [saver], raise_errors=False)
+        return saver
+
+    def load(self, checkpoint_path):
+        with self.graph.as_default():
+            self.session.run(tfv1.global_variables_initializer())
+            _load_checkpoint(self.session, checkpoint_path, allow_drop_layers=False)
+        return self.session.run([self.weights, self.global_step])
+
+    def test_save_and_load(self):
+        saver = self.create_saver(max_to_keep=2)
+        save_path = os.path.join(self.tmp_dir, 'train')
+        paths = []
+        for _ in range(3):
+            self.session.run(self.update)
+            paths.append(saver.save(self.session, save_path, global_step=self.global_step))
+        best_path = saver.save(self.session, os.path.join(self.tmp_dir, 'best_dev'), global_step=self.global_step,
+                               latest_filename='best_dev_checkpoint')
+        saver.flush()
+        self.assertEqual(paths, [save_path + '-1', save_path + '-2', save_path + '-3'])
+
+        state = tfv1.train.get_checkpoint_state(self.tmp_dir)
+        self.assertEqual(state.model_checkpoint_path, paths[-1])
+        self.assertEqual(list(state.all_model_checkpoint_paths), paths[1:])
+        best_state = tfv1.train.get_checkpoint_state(self.tmp_dir, 'best_dev_checkpoint')
+        self.assertEqual(best_state.model_checkpoint_path, best_path)
+        # Pruned to max_to_keep per checkpoint state file
+        self.assertFalse(tfv1.train.checkpoint_exists(paths[0]))
+        self.assertTrue(all(tfv1.train.checkpoint_exists(path) for path in paths[1:] + [best_path]))
+        self.assertEqual([f for f in os.listdir(self.tmp_dir) if '.tmp' in f], [])
+
+        weights, global_step = self.load(paths[1])
+        np.testing.assert_array_equal(weights, np.full((2, 3), 2, dtype=np.float32))
+        self.assertEqual(global_step, 2)
+
+    def test_saveable_objects(self):
+        with self.graph.as_default():
+            tfv1.add_to_collection(tfv1.GraphKeys.SAVEABLE_OBJECTS,
+                                   CanonicalWeightsSaveable(self.weights, 'canonical/kernel'))
+            sync_saver = tfv1.train.Saver()
+        saver = self.create_saver()
+        self.session.run(self.update)
+        async_path = saver.save(self.session, os.path.join(self.tmp_dir, 'async'))
+        sync_path = sync_saver.save(self.session, os.path.join(self.tmp_dir, 'sync'))
+        saver.flush()
+        async_reader = tfv1.train.load_checkpoint(async_path)
+        sync_reader = tfv1.train.load_checkpoint(sync_path)
+        # Same tensors as written by tfv1.train.Saver
+        self.assertEqual(async_reader.get_variable_to_shape_map(), sync_reader.get_variable_to_shape_map())
+        np.testing.assert_array_equal(async_reader.get_tensor('canonical/kernel'), np.full((2, 3), 2, dtype=np.float32))
+
+    def test_failing_write_raises_on_next_save(self):
+        saver = self.create_saver(max_to_keep=2, max_pending=1)
+        save_path = os.path.join(self.tmp_dir, 'train')
+        with mock.patch.object(saver, '_write', side_effect=IOError('disk full')):
+            saver.save(self.session, save_path, global_step=1)
+            with self.assertRaisesRegex(IOError, 'disk full'):
+                saver.save(self.session, save_path, global_step=2)
+        # Raised once, later saves get written again
+        saver.save(self.session, save_path, global_step=3)
+        saver.close()
+        self.assertEqual(tfv1.train.get_checkpoint_state(self.tmp_dir).model_checkpoint_path, save_path + '-3')
+
+    def test_close_all_savers_before_raising(self):
+        savers = [self.create_saver(), self.create_saver()]
+        with mock.patch.object(savers[0], '_write', side_effect=IOError('disk full')):
+            savers[0].save(self.session, os.path.join(self.tmp_dir, 'train'))
+            savers[1].save(self.session, os.path.join(self.tmp_dir, 'best_dev'), latest_filename='best_dev_checkpoint')
+            with self.assertRaisesRegex(IOError, 'disk full'):
+                close_checkpoint_savers(savers)
+        self.assertIsNotNone(tfv1.train.get_checkpoint_state(self.tmp_dir, 'best_dev_checkpoint'))
+        self.assertFalse(savers[1].thread.is_alive())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import os
+import shutil
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import tensorflow as tf
+import tensorflow.compat.v1 as tfv1
+from deepspeech_training.util.config import Config
+from deepspeech_training.util.flags import FLAGS
+
+from .setup_helpers import initialize_test_config
+
+try:
+    from deepspeech_training import evaluate
+except ImportError:
+    # Requires the ds_ctcdecoder package built from this tree (BatchDecoder)
+    evaluate = None
+
+SMOKE_TEST_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', 'smoke_test')
+
+
+def setUpModule():
+    initialize_test_config()
+
+
+class FakeDecoder:
+    def __init__(self, alphabet, beam_width, num_processes=None, scorer=None, cutoff_prob=1.0, cutoff_top_n=40):
+        self.beam_width = beam_width
+        self.scorer = scorer
+        self.cutoff_prob = cutoff_prob
+        self.cutoff_top_n = cutoff_top_n
+
+    def decode_columns(self, probs, lengths, num_results=1):
+        return SimpleNamespace(texts=['she had'] * len(lengths), result_offsets=list(range(len(lengths) + 1)))
+
+
+class FakeScorer:
+    def __init__(self, alpha, beta, scorer_path, alphabet):
+        self.params = [(alpha, beta)]
+
+    def reset_params(self, alpha, beta):
+        self.params.append((alpha, beta))
+
+
+@unittest.skipIf(evaluate is None, 'ds_ctcdecoder lacks BatchDecoder')
+class TestEvaluationEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.csvs = []
+        for name, wav_filename in (('a.csv', 'LDC93S1.wav'), ('b.csv', 'LDC93S1_pcms16le_1_16000.wav')):
+            wav_path = os.path.abspath(os.path.join(SMOKE_TEST_DIR, wav_filename))
+            csv_path = os.path.join(self.tmp_dir, name)
+            with open(csv_path, 'w') as csv_file:
+                csv_file.write('wav_filename,wav_filesize,transcript\n')
+                csv_file.write('{},{},she had your dark suit\n'.format(wav_path, os.path.getsize(wav_path)))
+            self.csvs.append(csv_path)
+        self.num_models = 0
+        self.num_restores = 0
+        patches = [mock.patch.object(evaluate, 'load_graph_for_evaluation', self.load_graph),
+                   mock.patch.object(evaluate, 'BatchDecoder', FakeDecoder),
+                   mock.patch.object(evaluate, 'Scorer', FakeScorer)]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def create_model(self, batch_x, seq_length, dropout):
+        self.num_models += 1
+        weights = tfv1.get_variable('weights', [Config.n_input, Config.n_hidden_6])
+        logits = tf.tensordot(batch_x, weights, axes=1)
+        # Time major like the acoustic model
+        return tf.transpose(a=logits, perm=[1, 0, 2]), {}
+
+    def load_graph(self, session):
+        self.num_restores += 1
+        session.run(tfv1.global_variables_initializer())
+
+    def test_warm_engine(self):
+        with evaluate.EvaluationEngine(self.create_model) as engine:
+            samples = engine.evaluate(self.csvs[:1])
+            samples += engine.evaluate(self.csvs, batch_size=2)
+            self.assertEqual(engine.transcribe_file(os.path.join(SMOKE_TEST_DIR, 'LDC93S1.wav')), 'she had')
+        self.assertEqual(len(samples), 3)
+        self.assertEqual(samples[0]['res'], 'she had')
+        self.assertEqual(self.num_models, 1)
+        self.assertEqual(self.num_restores, 1)
+
+    def test_decoder_params(self):
+        scorer_path = FLAGS.scorer_path
+        flags = (FLAGS.lm_alpha, FLAGS.lm_beta, FLAGS.beam_width, FLAGS.cutoff_top_n)
+        FLAGS.scorer_path = 'kenlm.scorer'
+        try:
+            with evaluate.EvaluationEngine(self.create_model) as engine:
+                decoder = engine._get_decoder()
+                self.assertEqual(decoder.beam_width, FLAGS.beam_width)
+                engine.set_decoder_params(lm_alpha=0.5, lm_beta=1.5)
+                self.assertIs(engine._get_decoder(), decoder)
+                self.assertEqual(decoder.scorer.params, [(FLAGS.lm_alpha, FLAGS.lm_beta), (0.5, 1.5)])
+                engine.set_decoder_params(beam_width=FLAGS.beam_width + 1, cutoff_top_n=FLAGS.cutoff_top_n + 1)
+                decoder = engine._get_decoder()
+                self.assertEqual(decoder.beam_width, FLAGS.beam_width + 1)
+                self.assertEqual(decoder.cutoff_top_n, FLAGS.cutoff_top_n + 1)
+                self.assertEqual(decoder.scorer.params, [(FLAGS.lm_alpha, FLAGS.lm_beta), (0.5, 1.5)])
+                engine.evaluate(self.csvs[:1])
+        finally:
+            FLAGS.scorer_path = scorer_path
+        # The flags do not change
+        self.assertEqual((FLAGS.lm_alpha, FLAGS.lm_beta, FLAGS.beam_width, FLAGS.cutoff_top_n), flags)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+import numpy as np
+from deepspeech_training.util.evaluate_tools import decoded_candidates, process_decode_result, save_samples_json
+from deepspeech_training.util.flags import FLAGS
+
+from .setup_helpers import create_test_flags
+
+
+def setUpModule():
+    create_test_flags()
+
+
+class CharAlphabet:
+    """Alphabet of space (label 0) and lower case letters"""
+    def GetSpaceLabel(self):
+        return 0
+
+    def Decode(self, labels):
+        return ''.join(' ' if label == 0 else chr(ord('a') + label - 1) for label in labels)
+
+
+def encode(text):
+    return [0 if c == ' ' else ord(c) - ord('a') + 1 for c in text]
+
+
+def decoded_batch(results):
+    """Builds the columnar N-best results of a batch from (text, confidence, timesteps, log_probs) tuples per element"""
+    texts, confidences, tokens, timesteps, log_probs = [], [], [], [], []
+    result_offsets, token_offsets = [0], [0]
+    for element_results in results:
+        for text, confidence, text_timesteps, text_log_probs in element_results:
+            texts.append(text)
+            confidences.append(confidence)
+            tokens.extend(encode(text))
+            timesteps.extend(text_timesteps)
+            log_probs.extend(text_log_probs)
+            token_offsets.append(len(tokens))
+        result_offsets.append(len(texts))
+    return SimpleNamespace(texts=texts,
+                           confidences=np.array(confidences, dtype=np.float32),
+                           tokens=np.array(tokens, dtype=np.int32),
+                           timesteps=np.array(timesteps, dtype=np.int32),
+                           log_probs=np.array(log_probs, dtype=np.float32),
+                           result_offsets=np.array(result_offsets, dtype=np.int32),
+                           token_offsets=np.array(token_offsets, dtype=np.int32))
+
+
+class TestDecodedCandidates(unittest.TestCase):
+
+    def setUp(self):
+        self.decoded = decoded_batch([
+            [('ab c', -1.5, [0, 1, 3, 5], [-0.25, -0.25, -0.5, -0.5]),
+             ('abc', -2.5, [0, 1, 5], [-0.5, -1.0, -1.0])],
+            [('b', -0.5, [2], [-0.5])],
+        ])
+
+    def test_n_best_with_word_timings(self):
+        step = FLAGS.feature_win_step
+        candidates = decoded_candidates(self.decoded, 0, CharAlphabet(), offset_ms=1000)
+        self.assertEqual([c['transcript'] for c in candidates], ['ab c', 'abc'])
+        self.assertEqual([c['confidence'] for c in candidates], [-1.5, -2.5])
+        self.assertEqual(candidates[0]['words'], [
+            {'word': 'ab', 'start': 1000, 'end': 1000 + 2 * step, 'confidence': -0.5},
+            {'word': 'c', 'start': 1000 + 5 * step, 'end': 1000 + 6 * step, 'confidence': -0.5},
+        ])
+        self.assertEqual(candidates[1]['words'], [
+            {'word': 'abc', 'start': 1000, 'end': 1000 + 6 * step, 'confidence': -2.5},
+        ])
+
+    def test_batch_element_offsets(self):
+        candidates = decoded_candidates(self.decoded, 1, CharAlphabet())
+        self.assertEqual(len(candidates), 1)
+        self.assertEqual(candidates[0]['words'][0]['word'], 'b')
+        self.assertEqual(candidates[0]['words'][0]['start'], 2 * FLAGS.feature_win_step)
+
+    def test_candidates_in_test_output(self):
+        candidates = decoded_candidates(self.decoded, 0, CharAlphabet())
+        sample = process_decode_result(('a.wav', 'ab c', 'ab c', 1.0, candidates))
+        self.assertEqual(sample.wer, 0.0)
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            output_path = os.path.join(tmp_dir, 'samples.json')
+            save_samples_json([sample], output_path)
+            with open(output_path) as output_file:
+                written = json.load(output_file)
+        finally:
+            shutil.rmtree(tmp_dir)
+        self.assertEqual(written[0]['candidates'], candidates)
+        self.assertNotIn('candidates', process_decode_result(('b.wav', 'b', 'b', 1.0, None)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import queue
+import threading
+import unittest
+
+from deepspeech_training.util.feeding import FileSegmentCounter, sorted_segment_pools
+
+
+def fake_segments(file_lengths, on_file_split):
+    """Yields (file_index, time_start, time_end, segment_buffer) tuples for lists of segment lengths per file"""
+    for file_index, lengths in enumerate(file_lengths):
+        for segment_index, length in enumerate(lengths):
+            yield file_index, segment_index, segment_index + 1, b'\0' * length
+        on_file_split(file_index, len(lengths))
+
+
+class TestSortedSegmentPools(unittest.TestCase):
+
+    def test_pools_get_sorted_across_files(self):
+        segments = list(fake_segments([[5, 1], [4], [3, 2, 6]], lambda *_: None))
+        pooled = list(sorted_segment_pools(segments, pool_size=3))
+        self.assertEqual([len(s[3]) for s in pooled], [1, 4, 5, 2, 3, 6])
+        self.assertEqual(sorted(pooled), sorted(segments))
+
+    def test_no_pooling(self):
+        segments = list(fake_segments([[5, 1], [4]], lambda *_: None))
+        self.assertEqual(list(sorted_segment_pools(segments)), segments)
+
+
+class TestFileSegmentCounter(unittest.TestCase):
+
+    def transcribe(self, file_lengths, already_done, pool_size, batch_size):
+        """Mimics transcribe_files: segments get produced by another thread, pooled, batched and counted as done"""
+        counter = FileSegmentCounter()
+        for file_index, count in already_done.items():
+            counter.add_done(file_index, count=count)
+        batches = queue.Queue(maxsize=2)
+
+        def produce():
+            batch = []
+            for segment in sorted_segment_pools(fake_segments(file_lengths, counter.set_num_segments), pool_size):
+                batch.append(segment)
+                if len(batch) == batch_size:
+                    batches.put(batch)
+                    batch = []
+            batches.put(batch)
+            batches.put(None)
+
+        producer = threading.Thread(target=produce)
+        producer.start()
+        done = {file_index: already_done.get(file_index, 0) for file_index in range(len(file_lengths))}
+        finished = []
+
+        def finish(file_indices):
+            for file_index in file_indices:
+                self.assertEqual(done[file_index], already_done.get(file_index, 0) + len(file_lengths[file_index]))
+                finished.append(file_index)
+
+        while True:
+            batch = batches.get()
+            if batch is None:
+                break
+            for file_index, _, _, _ in batch:
+                done[file_index] += 1
+                counter.add_done(file_index)
+            finish(counter.pop_finished())
+        producer.join()
+        finish(counter.pop_finished())
+        return finished
+
+    def test_every_file_finished_once(self):
+        file_lengths = [[3, 9, 1], [2], [], [7, 7, 4, 1], [5, 8]]
+        finished = self.transcribe(file_lengths, {}, pool_size=4, batch_size=3)
+        self.assertEqual(sorted(finished), list(range(len(file_lengths))))
+
+    def test_finished_in_file_order(self):
+        # Without pooling all files finish in the order of their segments
+        file_lengths = [[1, 2], [3], [4, 5, 6], [7]]
+        self.assertEqual(self.transcribe(file_lengths, {}, pool_size=None, batch_size=1), [0, 1, 2, 3])
+        # With one pool of all segments, everything finishes with the last batch - in ascending file order
+        self.assertEqual(self.transcribe(file_lengths, {}, pool_size=100, batch_size=100), [0, 1, 2, 3])
+
+    def test_already_done_segments(self):
+        # Segments recorded by a journal count as done, skipped segments still get announced
+        counter = FileSegmentCounter()
+        counter.add_done(0, count=2)
+        counter.set_num_segments(0, 3)
+        counter.set_num_segments(1, 0)
+        self.assertEqual(counter.pop_finished(), [1])
+        counter.add_done(0)
+        self.assertEqual(counter.pop_finished(), [0])
+        self.assertEqual(counter.pop_finished(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import unittest
+
+import numpy as np
+import tensorflow.compat.v1 as tfv1
+
+from .setup_helpers import initialize_test_config
+
+try:
+    from deepspeech_training.train import accumulate_gradients
+except ImportError:
+    # Requires the ds_ctcdecoder package built from this tree (BatchDecoder)
+    accumulate_gradients = None
+
+
+def setUpModule():
+    initialize_test_config()
+
+
+@unittest.skipIf(accumulate_gradients is None, 'ds_ctcdecoder lacks BatchDecoder')
+class TestAccumulateGradients(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.initial_weights = rng.normal(size=3).astype(np.float32)
+        self.x = rng.normal(size=(8, 3)).astype(np.float32)
+        self.y = rng.normal(size=8).astype(np.float32)
+
+    def build(self, optimizer=None):
+        graph = tfv1.Graph()
+        with graph.as_default():
+            x = tfv1.placeholder(tfv1.float32, [None, 3])
+            y = tfv1.placeholder(tfv1.float32, [None])
+            weights = tfv1.get_variable('weights', initializer=self.initial_weights)
+            loss = tfv1.reduce_mean(tfv1.square(tfv1.tensordot(x, weights, axes=1) - y))
+            optimizer = optimizer or tfv1.train.GradientDescentOptimizer(0.1)
+            global_step = tfv1.train.get_or_create_global_step()
+            grads_and_vars = optimizer.compute_gradients(loss)
+        return graph, x, y, weights, loss, optimizer, global_step, grads_and_vars
+
+    def single_batch_update(self, x_values, y_values):
+        graph, x, y, weights, _, optimizer, global_step, grads_and_vars = self.build()
+        with graph.as_default():
+            apply_op = optimizer.apply_gradients(grads_and_vars, global_step=global_step)
+            with tfv1.Session() as session:
+                session.run(tfv1.global_variables_initializer())
+                session.run(apply_op, feed_dict={x: x_values, y: y_values})
+                return session.run(weights)
+
+    def accumulated_update(self, micro_batches):
+        graph, x, y, weights, loss, optimizer, global_step, grads_and_vars = self.build()
+        with graph.as_default():
+            init_op, accumulate_op, apply_op = accumulate_gradients(optimizer, grads_and_vars, loss, global_step)
+            with tfv1.Session() as session:
+                session.run(tfv1.global_variables_initializer())
+                session.run(init_op)
+                for x_values, y_values in micro_batches:
+                    session.run(accumulate_op, feed_dict={x: x_values, y: y_values})
+                    # Weights only change when the accumulated gradients get applied
+                    np.testing.assert_array_equal(session.run(weights), self.initial_weights)
+                session.run(apply_op)
+                self.assertEqual(session.run(global_step), 1)
+                return session.run(weights)
+
+    def test_same_update_as_one_batch(self):
+        micro_batches = [(self.x[i:i + 2], self.y[i:i + 2]) for i in range(0, 8, 2)]
+        expected = self.single_batch_update(self.x, self.y)
+        np.testing.assert_allclose(self.accumulated_update(micro_batches), expected, rtol=1e-5)
+
+    def test_non_finite_loss_is_skipped(self):
+        micro_batches = [(self.x[i:i + 2], self.y[i:i + 2]) for i in range(0, 8, 2)]
+        nan_batch = (np.full((2, 3), np.nan, dtype=np.float32), self.y[:2])
+        expected = self.single_batch_update(self.x, self.y)
+        updated = self.accumulated_update(micro_batches[:2] + [nan_batch] + micro_batches[2:])
+        self.assertTrue(np.all(np.isfinite(updated)))
+        np.testing.assert_allclose(updated, expected, rtol=1e-5)
+
+    def test_non_finite_window_is_skipped(self):
+        nan_batch = (np.full((2, 3), np.nan, dtype=np.float32), self.y[:2])
+        for reduce_batch_count, expected_steps in [(None, 0), (lambda count: count + 1, 1)]:
+            graph, x, y, weights, loss, optimizer, global_step, grads_and_vars = \
+                self.build(optimizer=tfv1.train.AdamOptimizer(0.1))
+            with graph.as_default():
+                init_op, accumulate_op, apply_op = accumulate_gradients(optimizer, grads_and_vars, loss, global_step,
+                                                                        reduce_batch_count=reduce_batch_count)
+                with tfv1.Session() as session:
+                    session.run(tfv1.global_variables_initializer())
+                    session.run(init_op)
+                    for _ in range(2):
+                        session.run(accumulate_op, feed_dict={x: nan_batch[0], y: nan_batch[1]})
+                    session.run(apply_op)
+                    # Only updated if another process (simulated by reduce_batch_count) had a finite loss
+                    self.assertEqual(session.run(global_step), expected_steps)
+                    slots = session.run([optimizer.get_slot(weights, 'm'), optimizer.get_slot(weights, 'v')])
+                    self.assertTrue(all(np.all(slot == 0) for slot in slots))
+                    np.testing.assert_array_equal(session.run(weights), self.initial_weights)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import unittest
+
+import numpy as np
+import tensorflow as tf
+import tensorflow.compat.v1 as tfv1
+from deepspeech_training.util.graph_optimization import cast_weights_to_float16, fuse_clipped_relu_layers
+
+CLIP = 20.0
+
+
+def dense_relu_clipped(x, weights, bias, name):
+    """Dense layer as created by the acoustic model: MatMul, BiasAdd, Relu, Minimum"""
+    with tfv1.name_scope(name):
+        return tf.minimum(tf.nn.relu(tf.nn.bias_add(tf.matmul(x, tf.constant(weights)), tf.constant(bias))), CLIP)
+
+
+def build_graph(rng):
+    with tf.Graph().as_default() as graph:
+        x = tfv1.placeholder(tf.float32, [None, 8], name='input')
+        layer_weights = [rng.normal(0, 8, (8, 8)).astype(np.float32) for _ in range(3)]
+        layer_bias = [rng.normal(0, 8, 8).astype(np.float32) for _ in range(3)]
+        # Folded into the weights of the following dense layer
+        hidden = dense_relu_clipped(x, layer_weights[0], layer_bias[0], 'layer_1')
+        hidden = dense_relu_clipped(hidden, layer_weights[1], layer_bias[1], 'layer_2')
+        # Scaled back by a multiplication before a non-MatMul consumer
+        tf.identity(tf.tanh(hidden / 10), name='output_1')
+        # The output of this layer is protected
+        dense_relu_clipped(x, layer_weights[2], layer_bias[2], 'layer_3')
+    return graph.as_graph_def(), graph.get_tensor_by_name('layer_3/Minimum:0').op.name
+
+
+def run(graph_def, output_names, feed):
+    with tf.Graph().as_default() as graph:
+        tfv1.import_graph_def(graph_def, name='')
+        with tfv1.Session(graph=graph) as session:
+            return session.run([name + ':0' for name in output_names], feed_dict={'input:0': feed})
+
+
+def ops(graph_def):
+    return {node.name: node.op for node in graph_def.node}
+
+
+class TestFuseClippedReluLayers(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.graph_def, self.protected_output = build_graph(rng)
+        self.output_names = ['output_1', self.protected_output]
+        self.feed = rng.normal(0, 4, (16, 8)).astype(np.float32)
+
+    def test_fused_outputs_match(self):
+        expected = run(self.graph_def, self.output_names, self.feed)
+        # Inputs of the clipped activations do get clipped
+        self.assertTrue(np.any(expected[1] == CLIP))
+        optimized = tfv1.GraphDef()
+        optimized.CopyFrom(self.graph_def)
+        self.assertEqual(fuse_clipped_relu_layers(optimized, ['input'] + self.output_names), 2)
+        for optimized_output, expected_output in zip(run(optimized, self.output_names, self.feed), expected):
+            np.testing.assert_allclose(optimized_output, expected_output, rtol=1e-4, atol=1e-4)
+
+        after = ops(optimized)
+        self.assertEqual(after['layer_1/Relu'], 'Relu6')
+        self.assertEqual(after['layer_2/Relu'], 'Relu6')
+        # Folded into the following MatMul, which now reads from the Relu6
+        self.assertNotIn('layer_1/Minimum', after)
+        self.assertIn('layer_1/Relu', [node.input[0] for node in optimized.node if node.name == 'layer_2/MatMul'])
+        # Replaced by a multiplication with the inverse scale for the non-MatMul consumer
+        self.assertEqual(after['layer_2/Minimum'], 'Mul')
+
+    def test_protected_nodes_untouched(self):
+        optimized = tfv1.GraphDef()
+        optimized.CopyFrom(self.graph_def)
+        fuse_clipped_relu_layers(optimized, ['input'] + self.output_names)
+        original_nodes = {node.name: node for node in self.graph_def.node}
+        for node in optimized.node:
+            if node.name.startswith('layer_3/'):
+                self.assertEqual(node, original_nodes[node.name])
+        # Protecting the intermediate activation prevents the fusion of its layer
+        optimized = tfv1.GraphDef()
+        optimized.CopyFrom(self.graph_def)
+        self.assertEqual(fuse_clipped_relu_layers(optimized, ['input', 'layer_1/Relu'] + self.output_names), 1)
+        self.assertEqual(ops(optimized)['layer_1/Relu'], 'Relu')
+
+
+class TestCastWeightsToFloat16(unittest.TestCase):
+
+    def test_small_constants_stay(self):
+        rng = np.random.RandomState(0)
+        with tf.Graph().as_default() as graph:
+            x = tfv1.placeholder(tf.float32, [None, 64], name='input')
+            weights = tf.constant(rng.normal(0, 0.1, (64, 32)).astype(np.float32), name='weights')
+            bias = tf.constant(rng.normal(0, 0.1, 32).astype(np.float32), name='bias')
+            tf.identity(tf.nn.bias_add(tf.matmul(x, weights), bias), name='output')
+        graph_def = graph.as_graph_def()
+        feed = rng.normal(0, 1, (4, 64)).astype(np.float32)
+        expected = run(graph_def, ['output'], feed)[0]
+
+        converted = tfv1.GraphDef()
+        converted.CopyFrom(graph_def)
+        self.assertEqual(cast_weights_to_float16(converted, min_elements=1024), 1)
+        nodes = {node.name: node for node in converted.node}
+        self.assertEqual(nodes['weights'].op, 'Cast')
+        self.assertEqual(nodes['weights/float16'].attr['dtype'].type, tf.float16.as_datatype_enum)
+        self.assertEqual(nodes['bias'], {node.name: node for node in graph_def.node}['bias'])
+        np.testing.assert_allclose(run(converted, ['output'], feed)[0], expected, rtol=1e-2, atol=1e-2)
+
+
+if __name__ == '__main__':
+    unittest.main()
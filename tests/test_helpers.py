@@ -0,0 +1,46 @@
+import unittest
+
+from deepspeech_training.util.helpers import Interleaved, Sharded, parse_trace_steps
+
+
+class TestSharded(unittest.TestCase):
+
+    def test_equal_shards(self):
+        collection = list(range(11))
+        shards = [Sharded(collection, index, 3) for index in range(3)]
+        self.assertEqual([list(shard) for shard in shards], [[0, 3, 6], [1, 4, 7], [2, 5, 8]])
+        self.assertEqual([len(shard) for shard in shards], [3, 3, 3])
+        self.assertEqual(shards[1][2], 7)
+        with self.assertRaises(IndexError):
+            _ = shards[2][3]
+
+    def test_complete_shards(self):
+        collection = list(range(11))
+        shards = [Sharded(collection, index, 3, drop_remainder=False) for index in range(3)]
+        self.assertEqual([list(shard) for shard in shards], [[0, 3, 6, 9], [1, 4, 7, 10], [2, 5, 8]])
+        self.assertEqual([len(shard) for shard in shards], [4, 4, 3])
+        self.assertEqual([len(Sharded([0], index, 3, drop_remainder=False)) for index in range(3)], [1, 0, 0])
+
+    def test_interleaved_shards(self):
+        shard = Interleaved(Sharded([1, 4, 7, 10], 1, 2), Sharded([2, 3, 8], 1, 2))
+        self.assertEqual(len(shard), 3)
+        self.assertEqual(list(shard), [3, 4, 10])
+
+
+class TestParseTraceSteps(unittest.TestCase):
+
+    def test_window(self):
+        self.assertEqual(parse_trace_steps('2:500-520'), (2, 500, 520))
+        self.assertEqual(parse_trace_steps('0:3-3'), (0, 3, 3))
+
+    def test_none(self):
+        self.assertIsNone(parse_trace_steps(''))
+
+    def test_invalid(self):
+        for spec in ['2:20-5', '2:500', '500-520', 'a:1-2', '-1:1-2', '2:500-520 ']:
+            with self.assertRaises(ValueError):
+                parse_trace_steps(spec)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from multiprocessing import get_context
+
+from deepspeech_training.util.journal import TranscriptionJournal
+
+
+def try_claim(journal_path, src_path):
+    with TranscriptionJournal(journal_path) as journal:
+        return journal.claim(src_path)
+
+
+class TestTranscriptionJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'journal.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_resume(self):
+        with TranscriptionJournal(self.path) as journal:
+            self.assertTrue(journal.claim('a.wav'))
+            self.assertTrue(journal.claim('b.wav'))
+            journal.add_segments([('a.wav', {'start': 0, 'end': 100, 'transcript': 'foo'}),
+                                  ('b.wav', {'start': 50, 'end': 90, 'transcript': 'bar'})])
+            journal.finish('a.wav')
+        with open(self.path, 'ab') as journal_file:
+            journal_file.write(b'{"type": "segment", "file": "b.wav", "segm')  # interrupted write
+        with TranscriptionJournal(self.path) as journal:
+            self.assertEqual(journal.finished, {'a.wav'})
+            self.assertFalse(journal.claim('a.wav'))
+            self.assertTrue(journal.claim('b.wav'))
+            self.assertTrue(journal.is_known_segment('b.wav', 50, 90))
+            self.assertFalse(journal.is_known_segment('b.wav', 90, 150))
+            self.assertEqual(journal.segments['b.wav'], [{'start': 50, 'end': 90, 'transcript': 'bar'}])
+            journal.add_segments([('b.wav', {'start': 90, 'end': 150, 'transcript': 'baz'})])
+            self.assertEqual(len(journal.segments['b.wav']), 2)
+        with TranscriptionJournal(self.path) as journal:
+            self.assertEqual([s['transcript'] for s in journal.segments['b.wav']], ['bar', 'baz'])
+
+    def test_claims_between_processes(self):
+        pool = get_context('spawn').Pool(1)
+        try:
+            with TranscriptionJournal(self.path) as journal:
+                self.assertTrue(journal.claim('a.wav'))
+                self.assertFalse(pool.apply(try_claim, (self.path, 'a.wav')))
+                self.assertTrue(pool.apply(try_claim, (self.path, 'b.wav')))
+                journal.finish('a.wav')
+                self.assertFalse(pool.apply(try_claim, (self.path, 'a.wav')))
+            self.assertTrue(pool.apply(try_claim, (self.path, 'b.wav')))
+        finally:
+            pool.close()
+            pool.join()
+
+
+if __name__ == '__main__':
+    unittest.main()
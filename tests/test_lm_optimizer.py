@@ -0,0 +1,100 @@
+import importlib.util
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import optuna
+from deepspeech_training.util.flags import FLAGS
+from deepspeech_training.util.logits_cache import LogitsSet
+
+from .setup_helpers import initialize_test_config
+
+LM_OPTIMIZER_PATH = os.path.join(os.path.dirname(__file__), '..', 'lm_optimizer.py')
+try:
+    SPEC = importlib.util.spec_from_file_location('lm_optimizer', LM_OPTIMIZER_PATH)
+    lm_optimizer = importlib.util.module_from_spec(SPEC)
+    SPEC.loader.exec_module(lm_optimizer)
+except ImportError:
+    # Requires the ds_ctcdecoder package built from this tree (BatchDecoder)
+    lm_optimizer = None
+RUN_WORKER = lm_optimizer.run_worker if lm_optimizer else None
+
+
+def setUpModule():
+    initialize_test_config()
+
+
+class FakeDecoder:
+    """Decodes every sample to the same transcript"""
+    def decode(self, probs, lengths):
+        return [[(1.0, 'she had')] for _ in lengths]
+
+
+def create_fake_decoder(scorer, num_processes=None):
+    return FakeDecoder()
+
+
+def failing_create_decoder(scorer, num_processes=None):
+    raise RuntimeError('decoder failed')
+
+
+def run_recording_worker(storage, logits_sets, n_trials, num_processes):
+    # Runs in the forked worker process
+    study = optuna.load_study(study_name=FLAGS.study_name, storage=storage)
+    study.set_user_attr('worker_{}'.format(os.getpid()), n_trials)
+    RUN_WORKER(storage, logits_sets, n_trials, num_processes)
+
+
+@unittest.skipIf(lm_optimizer is None, 'ds_ctcdecoder lacks BatchDecoder')
+class TestParallelOptimization(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.storage = 'sqlite:///{}'.format(os.path.join(self.tmp_dir, 'study.db'))
+        self.logits_sets = [LogitsSet('test.csv', np.zeros((5, 3), dtype=np.float16), [2, 3],
+                                      ['a.wav', 'b.wav'], ['she had', 'she had your'], [1.0, 2.0])]
+        for name in ['lm_alpha', 'lm_beta', 'scorer_path', 'study_name', 'n_trials', 'n_trial_processes']:
+            self.addCleanup(setattr, FLAGS, name, getattr(FLAGS, name))
+        FLAGS.scorer_path = ''
+        FLAGS.study_name = 'test_study'
+        self.study = optuna.create_study(study_name=FLAGS.study_name, storage=self.storage)
+        self.study.set_user_attr('is_character_based', False)
+        patch = mock.patch.object(lm_optimizer, 'create_decoder', create_fake_decoder)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_run_worker(self):
+        lm_optimizer.run_worker(self.storage, self.logits_sets, 3, 1)
+        trials = optuna.load_study(study_name=FLAGS.study_name, storage=self.storage).trials
+        self.assertEqual(len(trials), 3)
+        for trial in trials:
+            self.assertEqual(trial.state, optuna.trial.TrialState.COMPLETE)
+            # One of three words missing
+            self.assertAlmostEqual(trial.value, 1 / 5)
+
+    def test_trials_split_across_workers(self):
+        FLAGS.n_trials = 5
+        FLAGS.n_trial_processes = 2
+        with mock.patch.object(lm_optimizer, 'run_worker', run_recording_worker):
+            study = lm_optimizer.optimize_parallel(self.study, self.storage, self.logits_sets)
+        self.assertEqual(len(study.trials), 5)
+        self.assertEqual(sorted(value for name, value in study.user_attrs.items() if name.startswith('worker_')),
+                         [2, 3])
+
+    def test_failing_worker(self):
+        FLAGS.n_trials = 2
+        FLAGS.n_trial_processes = 2
+        with mock.patch.object(lm_optimizer, 'create_decoder', failing_create_decoder):
+            with self.assertRaises(SystemExit) as context:
+                lm_optimizer.optimize_parallel(self.study, self.storage, self.logits_sets)
+        self.assertEqual(context.exception.code, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
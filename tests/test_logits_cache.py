@@ -0,0 +1,55 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from deepspeech_training.util.logits_cache import LogitsSetWriter, load_logits_set
+
+
+class TestLogitsCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        rng = np.random.RandomState(0)
+        self.probs = rng.uniform(size=(3, 5, 4)).astype(np.float32)
+        self.lengths = [5, 2, 3]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _write(self, path):
+        with LogitsSetWriter('test.csv', path=path) as writer:
+            writer.add_batch(['a.wav', 'b.wav'], self.probs[:2], self.lengths[:2], ['a', 'b'], [1.0, 2.0])
+            writer.add_batch(['c.wav'], self.probs[2:], self.lengths[2:], ['c'], [3.0])
+            return writer.finish()
+
+    def _check(self, logits_set):
+        self.assertEqual(len(logits_set), 3)
+        self.assertEqual(logits_set.num_classes, 4)
+        self.assertEqual(logits_set.wav_filenames, ['a.wav', 'b.wav', 'c.wav'])
+        self.assertEqual(logits_set.transcripts, ['a', 'b', 'c'])
+        batches = list(logits_set.batches(2))
+        self.assertEqual(len(batches), 2)
+        batch_probs, batch_lengths = batches[0]
+        self.assertEqual(batch_probs.shape, (2, 5, 4))
+        self.assertEqual(batch_probs.dtype, np.float32)
+        self.assertEqual(list(batch_lengths), [5, 2])
+        np.testing.assert_allclose(batch_probs[1, :2], self.probs[1, :2], atol=1e-3)
+        np.testing.assert_array_equal(batch_probs[1, 2:], 0.0)
+        batch_probs, batch_lengths = batches[1]
+        self.assertEqual(batch_probs.shape, (1, 3, 4))
+        np.testing.assert_allclose(batch_probs[0], self.probs[2, :3], atol=1e-3)
+
+    def test_in_memory(self):
+        self._check(self._write(None))
+
+    def test_memory_mapped(self):
+        path = os.path.join(self.tmp_dir, '0_test')
+        self._check(self._write(path))
+        self._check(load_logits_set(path))
+        self.assertEqual(os.path.getsize(path + '.probs'), sum(self.lengths) * 4 * 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,318 @@
+import importlib.util
+import io
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import types
+import unittest
+from unittest import mock
+
+BINDINGS_PATH = os.path.join(os.path.dirname(__file__), '..', 'native_client', 'python', '__init__.py')
+# Samples per queued window of acoustic model steps
+WINDOW = 4
+
+deepspeech = None
+saved_modules = {}
+
+
+class FakeStream:
+    def __init__(self):
+        self.buffered = 0
+        self.pending = 0
+        self.processed = 0
+        self.defer = False
+
+
+class FakeModel:
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+
+
+class FakeNative:
+    """Mimics the native streaming state: deferred streams queue a window per WINDOW fed samples"""
+    def __init__(self):
+        self.batch_size = 2
+        self.invocations = []
+        self.fail = False
+        self.inference_started = threading.Event()
+        self.inference_gate = threading.Event()
+        self.inference_gate.set()
+
+    def module(self):
+        impl = types.ModuleType('deepspeech.impl')
+        impl.Version = lambda: 'fake'
+        impl.ErrorCodeToErrorMessage = lambda status: 'error {}'.format(status)
+        impl.CreateModel = lambda path: (0, FakeModel(self.batch_size))
+        impl.FreeModel = lambda model: None
+        impl.EnableExternalScorer = lambda model, path: 0
+        impl.DisableExternalScorer = lambda model: 0
+        impl.GetModelBatchSize = lambda model: model.batch_size
+        impl.CreateStream = lambda model: (0, FakeStream())
+        impl.FreeStream = lambda stream: None
+        impl.SetStreamDeferInference = self.set_defer
+        impl.FeedAudioContent = self.feed
+        impl.GetStreamPendingBatches = lambda stream: stream.pending
+        impl.ProcessStreamsBatched = self.process
+        impl.IntermediateDecode = lambda stream: str(stream.processed)
+        impl.FinishStream = self.finish
+        return impl
+
+    def set_defer(self, stream, defer):
+        stream.defer = defer != 0
+
+    def feed(self, stream, audio):
+        stream.buffered += len(audio)
+        while stream.buffered >= WINDOW:
+            stream.buffered -= WINDOW
+            if stream.defer:
+                stream.pending += 1
+            else:
+                stream.processed += 1
+
+    def process(self, model, streams):
+        self.inference_started.set()
+        self.inference_gate.wait()
+        if self.fail:
+            return -1
+        invocations = 0
+        while True:
+            ready = [stream for stream in streams if stream.pending > 0]
+            if len(ready) == 0:
+                return invocations
+            for offset in range(0, len(ready), model.batch_size):
+                batch = ready[offset:offset + model.batch_size]
+                self.invocations.append(len(batch))
+                invocations += 1
+                for stream in batch:
+                    stream.pending -= 1
+                    stream.processed += 1
+
+    def finish(self, stream):
+        stream.processed += stream.pending
+        stream.pending = 0
+        return str(stream.processed)
+
+
+def setUpModule():
+    global deepspeech  # pylint: disable=global-statement
+    for name in ('deepspeech', 'deepspeech.impl'):
+        saved_modules[name] = sys.modules.get(name)
+    spec = importlib.util.spec_from_file_location('deepspeech', BINDINGS_PATH, submodule_search_locations=[])
+    deepspeech = importlib.util.module_from_spec(spec)
+    deepspeech.impl = FakeNative().module()
+    sys.modules['deepspeech'] = deepspeech
+    sys.modules['deepspeech.impl'] = deepspeech.impl
+    spec.loader.exec_module(deepspeech)
+
+
+def tearDownModule():
+    for name, module in saved_modules.items():
+        if module is None:
+            sys.modules.pop(name, None)
+        else:
+            sys.modules[name] = module
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+class TestBatchScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.native = FakeNative()
+        deepspeech.impl = self.native.module()
+        self.model = deepspeech.Model('model.pbmm')
+
+    def run_in_thread(self, fun, *args):
+        thread = threading.Thread(target=fun, args=args, daemon=True)
+        thread.start()
+        return thread
+
+    def test_queued_steps_get_batched(self):
+        scheduler = self.model.createBatchScheduler()
+        streams = [scheduler.createStream() for _ in range(3)]
+        # Queued steps of a closed scheduler run when streams get decoded
+        scheduler.close()
+        streams[0].feedAudioContent([0] * 2 * WINDOW)
+        streams[1].feedAudioContent([0] * 2 * WINDOW)
+        streams[2].feedAudioContent([0] * (WINDOW - 1))
+        self.assertEqual(streams[0].intermediateDecode(), '2')
+        # Every stream contributes one window per invocation
+        self.assertEqual(self.native.invocations, [2, 2])
+        self.assertEqual(streams[1].intermediateDecode(), '2')
+        self.assertEqual(self.native.invocations, [2, 2])
+        streams[2].feedAudioContent([0])
+        self.assertEqual(streams[2].finishStream(), '1')
+        self.assertEqual(self.native.invocations, [2, 2, 1])
+        self.assertEqual(scheduler._streams, streams[:2])
+        streams[0].freeStream()
+        self.assertEqual(scheduler._streams, streams[1:2])
+
+    def test_background_processing(self):
+        with self.model.createBatchScheduler(max_delay_ms=1000) as scheduler:
+            streams = [scheduler.createStream() for _ in range(2)]
+            streams[0].feedAudioContent([0] * WINDOW)
+            # The scheduler waits for the second stream to complete its window
+            time.sleep(0.1)
+            self.assertEqual(self.native.invocations, [])
+            streams[1].feedAudioContent([0] * WINDOW)
+            self.assertTrue(wait_for(lambda: self.native.invocations == [2]))
+            self.assertEqual([stream.finishStream() for stream in streams], ['1', '1'])
+
+    def test_feeding_during_inference(self):
+        scheduler = self.model.createBatchScheduler()
+        streams = [scheduler.createStream() for _ in range(2)]
+        scheduler.close()
+        streams[0].feedAudioContent([0] * WINDOW)
+        self.native.inference_gate.clear()
+        decoder = self.run_in_thread(streams[0].intermediateDecode)
+        self.assertTrue(self.native.inference_started.wait(5))
+        # Streams that are not part of the running invocation can be fed meanwhile
+        feeder = self.run_in_thread(streams[1].feedAudioContent, [0] * WINDOW)
+        feeder.join(5)
+        self.assertFalse(feeder.is_alive())
+        self.native.inference_gate.set()
+        decoder.join(5)
+        self.assertFalse(decoder.is_alive())
+        self.assertEqual(self.native.invocations, [1])
+        self.assertEqual(streams[1].intermediateDecode(), '1')
+
+    def test_failure_of_scheduling_thread(self):
+        scheduler = self.model.createBatchScheduler(max_delay_ms=0)
+        stream = scheduler.createStream()
+        self.native.fail = True
+        stream.feedAudioContent([0] * WINDOW)
+        scheduler._thread.join(5)
+        self.assertFalse(scheduler._thread.is_alive())
+        for call in (lambda: stream.feedAudioContent([0]), stream.intermediateDecode, stream.finishStream,
+                     scheduler.createStream):
+            with self.assertRaisesRegex(RuntimeError, 'ProcessStreamsBatched failed'):
+                call()
+        stream.freeStream()
+        self.assertEqual(scheduler._streams, [])
+        scheduler.close()
+
+
+SMAPS_TEMPLATE = """\
+00400000-00452000 r-xp 00000000 08:02 173521                     /usr/bin/python3
+Size:                328 kB
+Rss:                 300 kB
+Pss:                 150 kB
+Shared_Clean:        300 kB
+Private_Dirty:         0 kB
+Anonymous:             0 kB
+VmFlags: rd ex mr mw me dw sd
+{model_start:x}-{model_end:x} r--s 00000000 {major:02x}:{minor:02x} {model_inode}                    {model_path}
+Size:                  8 kB
+Rss:                   8 kB
+Pss:                   6 kB
+Shared_Clean:          4 kB
+Shared_Dirty:          0 kB
+Private_Clean:         4 kB
+Private_Dirty:         0 kB
+Anonymous:             0 kB
+THPeligible:    0
+{model_end:x}-{model_end2:x} r--s 00001000 {major:02x}:{minor:02x} {model_inode}                    {model_path}
+Size:                  8 kB
+Rss:                   4 kB
+Pss:                   4 kB
+Shared_Clean:          0 kB
+Private_Clean:         0 kB
+Private_Dirty:         4 kB
+Anonymous:             {model_anonymous} kB
+7f0000000000-7f0000021000 rw-p 00000000 00:00 0
+Rss:                 132 kB
+Anonymous:           132 kB
+{scorer_start:x}-{scorer_end:x} r--p 00000000 {major:02x}:{minor:02x} {scorer_inode}                    {scorer_path}
+Size:                  4 kB
+Rss:                   4 kB
+Pss:                   2 kB
+Shared_Clean:          4 kB
+Private_Clean:         0 kB
+Anonymous:             0 kB
+"""
+
+
+class TestSharedMemory(unittest.TestCase):
+
+    def setUp(self):
+        deepspeech.impl = FakeNative().module()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.model_path = os.path.join(self.tmp_dir, 'model.pbmm')
+        self.scorer_path = os.path.join(self.tmp_dir, 'kenlm.scorer')
+        # The model is smaller than its mappings, the scorer only has its first page mapped
+        for path, size in ((self.model_path, 10000), (self.scorer_path, 4096 + 2 * 1024 * 1024)):
+            with open(path, 'wb') as model_file:
+                model_file.truncate(size)
+        self.model = deepspeech.Model(self.model_path, shared=True)
+        self.model.enableExternalScorer(self.scorer_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def smaps(self, model_anonymous=0):
+        model_stat, scorer_stat = os.stat(self.model_path), os.stat(self.scorer_path)
+        return SMAPS_TEMPLATE.format(major=os.major(model_stat.st_dev), minor=os.minor(model_stat.st_dev),
+                                     model_inode=model_stat.st_ino, model_path=self.model_path,
+                                     model_start=0x7f1000000000, model_end=0x7f1000002000, model_end2=0x7f1000004000,
+                                     model_anonymous=model_anonymous,
+                                     scorer_inode=scorer_stat.st_ino, scorer_path=self.scorer_path,
+                                     scorer_start=0x7f2000000000, scorer_end=0x7f2000001000)
+
+    def patched_smaps(self, **kwargs):
+        content = self.smaps(**kwargs)
+        opened = []
+
+        def fake_open(path, mode='r'):
+            opened.append(path)
+            return io.StringIO(content)
+
+        return mock.patch.object(deepspeech, 'open', fake_open, create=True), opened
+
+    def test_report(self):
+        patch, opened = self.patched_smaps()
+        with patch:
+            report = deepspeech.mappedMemoryReport([self.model_path, self.scorer_path], pid=42)
+        self.assertEqual(opened, ['/proc/42/smaps'])
+        # Overlapping mappings count once, mappings beyond the end of the file do not count
+        self.assertEqual(report[self.model_path], dict(file_size=10000, mapped=10000, rss=12 * 1024, pss=10 * 1024,
+                                                       shared=4 * 1024, private=8 * 1024, anonymous=0))
+        self.assertEqual(report[self.scorer_path], dict(file_size=4096 + 2 * 1024 * 1024, mapped=4096, rss=4 * 1024,
+                                                        pss=2 * 1024, shared=4 * 1024, private=0, anonymous=0))
+
+    def test_unmapped_threshold(self):
+        patch, _ = self.patched_smaps()
+        with patch:
+            with self.assertRaisesRegex(RuntimeError, "{} of {} bytes of '{}' are not memory-mapped".format(
+                    2 * 1024 * 1024, 4096 + 2 * 1024 * 1024, self.scorer_path)):
+                self.model.verifySharedMemory()
+            report = self.model.verifySharedMemory(max_unmapped_bytes=2 * 1024 * 1024)
+        self.assertEqual(sorted(report), sorted([self.model_path, self.scorer_path]))
+        self.model.disableExternalScorer()
+        patch, _ = self.patched_smaps()
+        with patch:
+            self.assertEqual(list(self.model.verifySharedMemory()), [self.model_path])
+
+    def test_copy_on_write(self):
+        patch, _ = self.patched_smaps(model_anonymous=4)
+        with patch:
+            with self.assertRaisesRegex(RuntimeError, "4096 bytes of the mapping of '{}' were copied on write".format(
+                    self.model_path)):
+                self.model.verifySharedMemory(max_unmapped_bytes=2 * 1024 * 1024)
+
+    def test_shared_requires_mapped_format(self):
+        with self.assertRaisesRegex(RuntimeError, 'memory-mapped model file'):
+            deepspeech.Model(os.path.join(self.tmp_dir, 'model.pb'), shared=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
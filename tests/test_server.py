@@ -0,0 +1,207 @@
+import asyncio
+import base64
+import importlib.util
+import json
+import os
+import struct
+import threading
+import unittest
+
+import numpy as np
+
+SERVER_PATH = os.path.join(os.path.dirname(__file__), '..', 'native_client', 'python', 'server.py')
+SPEC = importlib.util.spec_from_file_location('deepspeech_server', SERVER_PATH)
+server_module = importlib.util.module_from_spec(SPEC)
+SPEC.loader.exec_module(server_module)
+
+SAMPLE_RATE = 16000
+
+
+class StubStream:
+    """Transcripts are the number of fed samples, feeding blocks while the model is paused"""
+    def __init__(self, model):
+        self.model = model
+        self.fed = 0
+
+    def feedAudioContent(self, audio):
+        self.model.resume.wait()
+        if self.model.fail_after is not None and self.model.chunks_fed >= self.model.fail_after:
+            raise RuntimeError('feeding failed')
+        self.model.chunks_fed += 1
+        self.fed += len(audio)
+
+    def intermediateDecode(self):
+        return str(self.fed)
+
+    def finishStream(self):
+        self.model.freed += 1
+        return 'final {}'.format(self.fed)
+
+    def freeStream(self):
+        self.model.freed += 1
+
+
+class StubModel:
+    def __init__(self, fail_after=None):
+        self.fail_after = fail_after
+        self.resume = threading.Event()
+        self.resume.set()
+        self.chunks_fed = 0
+        self.freed = 0
+
+    def sampleRate(self):
+        return SAMPLE_RATE
+
+    def createStream(self):
+        return StubStream(self)
+
+
+class Client:
+    """Minimal WebSocket client sending unmasked frames"""
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def connect(cls, port):
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        key = base64.b64encode(os.urandom(16)).decode('latin-1')
+        writer.write('GET /stream HTTP/1.1\r\nHost: localhost\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                     'Sec-WebSocket-Key: {}\r\nSec-WebSocket-Version: 13\r\n\r\n'.format(key).encode('latin-1'))
+        status = await reader.readline()
+        assert b' 101 ' in status, status
+        while (await reader.readline()).strip():
+            pass
+        return cls(reader, writer)
+
+    async def send(self, opcode, payload):
+        length = len(payload)
+        if length < 126:
+            head = struct.pack('!BB', 0x80 | opcode, length)
+        elif length < (1 << 16):
+            head = struct.pack('!BBH', 0x80 | opcode, 126, length)
+        else:
+            head = struct.pack('!BBQ', 0x80 | opcode, 127, length)
+        self.writer.write(head + payload)
+        await self.writer.drain()
+
+    async def send_audio(self, num_samples):
+        await self.send(server_module.OPCODE_BINARY, np.ones(num_samples, dtype=np.int16).tobytes())
+
+    async def send_text(self, text):
+        await self.send(server_module.OPCODE_TEXT, text.encode('utf-8'))
+
+    async def receive(self):
+        """Returns the next JSON message or None if the server closed the connection"""
+        head = await self.reader.readexactly(2)
+        length = head[1] & 0x7F
+        if length == 126:
+            length = struct.unpack('!H', await self.reader.readexactly(2))[0]
+        elif length == 127:
+            length = struct.unpack('!Q', await self.reader.readexactly(8))[0]
+        payload = await self.reader.readexactly(length)
+        if head[0] & 0x0F == server_module.OPCODE_CLOSE:
+            return None
+        return json.loads(payload.decode('utf-8'))
+
+
+class TestStreamingServer(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def serve(self, model, test, **kwargs):
+        server = server_module.Server(model, max_workers=2, **kwargs)
+
+        async def run():
+            listener = await server.start(port=0)
+            try:
+                await asyncio.wait_for(test(server, listener.sockets[0].getsockname()[1]), timeout=30)
+            finally:
+                model.resume.set()
+                listener.close()
+                await listener.wait_closed()
+
+        try:
+            self.loop.run_until_complete(run())
+        finally:
+            server.shutdown()
+
+    def test_intermediate_and_final_transcripts(self):
+        model = StubModel()
+
+        async def test(server, port):
+            client = await Client.connect(port)
+            for _ in range(3):
+                await client.send_audio(SAMPLE_RATE // 2)
+            self.assertEqual(await client.receive(), {'type': 'intermediate', 'transcript': str(SAMPLE_RATE)})
+            await client.send_audio(100)
+            await client.send_text('intermediate')
+            self.assertEqual(await client.receive(), {'type': 'intermediate', 'transcript': str(3 * SAMPLE_RATE // 2 + 100)})
+            await client.send_text('finish')
+            self.assertEqual(await client.receive(), {'type': 'final', 'transcript': 'final {}'.format(3 * SAMPLE_RATE // 2 + 100)})
+            self.assertIsNone(await client.receive())
+            self.assertEqual(server.active_streams, 0)
+            self.assertEqual(server.total_streams, 1)
+
+        self.serve(model, test, intermediate_interval_ms=1000)
+        self.assertEqual(model.freed, 1)
+
+    def test_backpressure(self):
+        model = StubModel()
+        model.resume.clear()
+        chunk_samples = 128 * 1024
+        num_chunks = 200
+
+        async def test(server, port):
+            client = await Client.connect(port)
+
+            async def send_all():
+                for _ in range(num_chunks):
+                    await client.send_audio(chunk_samples)
+                await client.send_text('finish')
+
+            sender = asyncio.ensure_future(send_all())
+            # While the model does not process anything, the server stops reading and the client's sends block
+            await asyncio.wait([sender], timeout=1)
+            self.assertFalse(sender.done())
+            self.assertEqual(model.chunks_fed, 0)
+            model.resume.set()
+            await sender
+            self.assertEqual(await client.receive(), {'type': 'final', 'transcript': 'final {}'.format(num_chunks * chunk_samples)})
+            self.assertIsNone(await client.receive())
+
+        self.serve(model, test, max_pending_chunks=2, intermediate_interval_ms=0)
+        self.assertEqual(model.chunks_fed, num_chunks)
+
+    def test_failing_stream_with_full_queue(self):
+        model = StubModel(fail_after=1)
+        model.resume.clear()
+
+        async def test(server, port):
+            client = await Client.connect(port)
+            for _ in range(8):
+                await client.send_audio(1000)
+            # Lets the receive loop block on the full queue before processing fails
+            await asyncio.sleep(0.2)
+            model.resume.set()
+            self.assertEqual(await client.receive(), {'type': 'error', 'error': 'feeding failed'})
+            self.assertIsNone(await client.receive())
+            for _ in range(100):
+                if server.active_streams == 0:
+                    break
+                await asyncio.sleep(0.01)
+            self.assertEqual(server.active_streams, 0)
+
+        self.serve(model, test, max_pending_chunks=2, intermediate_interval_ms=0)
+        self.assertEqual(model.chunks_fed, 1)
+        self.assertEqual(model.freed, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
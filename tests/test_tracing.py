@@ -0,0 +1,61 @@
+import os
+import shutil
+import signal
+import tempfile
+import unittest
+from unittest import mock
+
+from absl.flags import IllegalFlagValueError
+from deepspeech_training.util.flags import FLAGS
+from deepspeech_training.util.tracing import StepTracer
+
+from .setup_helpers import create_test_flags
+
+
+def setUpModule():
+    create_test_flags()
+
+
+class TestStepTracer(unittest.TestCase):
+
+    def test_window(self):
+        tracer = StepTracer('traces', trace_steps='1:2-3')
+        self.assertEqual([step for step in range(6) if tracer.should_trace(1, step)], [2, 3])
+        self.assertFalse(any(tracer.should_trace(epoch, 2) for epoch in [0, 2]))
+        self.assertEqual(tracer.run_args(0, 2), {})
+        self.assertIn('run_metadata', tracer.run_args(1, 2))
+
+    def test_no_window(self):
+        tracer = StepTracer('traces')
+        self.assertFalse(any(tracer.should_trace(0, step) for step in range(6)))
+
+    def test_invalid_window(self):
+        with self.assertRaises(ValueError):
+            StepTracer('traces', trace_steps='2:20-5')
+
+    @unittest.skipIf(not hasattr(signal, 'SIGUSR1'), 'no SIGUSR1 on this platform')
+    def test_signal_steps(self):
+        previous_handler = signal.getsignal(signal.SIGUSR1)
+        self.addCleanup(signal.signal, signal.SIGUSR1, previous_handler)
+        output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, output_dir)
+        summary_writer = mock.Mock()
+        tracer = StepTracer(output_dir, signal_steps=2)
+        self.assertFalse(tracer.should_trace(0, 0))
+        os.kill(os.getpid(), signal.SIGUSR1)
+        traced = []
+        for step in range(4):
+            run_args = tracer.run_args(0, step)
+            if run_args:
+                traced.append(step)
+            tracer.save(run_args, 0, step, step, summary_writer)
+        self.assertEqual(traced, [0, 1])
+        self.assertEqual(sorted(os.listdir(output_dir)), ['trace_epoch_0_step_0.json', 'trace_epoch_0_step_1.json'])
+        self.assertEqual(summary_writer.add_run_metadata.call_count, 2)
+
+    def test_flag_validation(self):
+        trace_steps = FLAGS.trace_steps
+        self.addCleanup(setattr, FLAGS, 'trace_steps', trace_steps)
+        FLAGS.trace_steps = '2:5-20'
+        with self.assertRaises(IllegalFlagValueError):
+            FLAGS.trace_steps = '2:20-5'
@@ -3,6 +3,7 @@
 from __future__ import absolute_import, division, print_function
 
 import json
+import os
 import sys
 
 from multiprocessing import cpu_count
@@ -12,16 +13,17 @@ import progressbar
 import tensorflow as tf
 import tensorflow.compat.v1 as tfv1
 
-from ds_ctcdecoder import ctc_beam_search_decoder_batch, Scorer
+from ds_ctcdecoder import BatchDecoder, Scorer
 from six.moves import zip
 
 from .util.config import Config, initialize_globals
 from .util.checkpoints import load_graph_for_evaluation
-from .util.evaluate_tools import calculate_and_print_report, save_samples_json
-from .util.feeding import create_dataset
+from .util.evaluate_tools import calculate_and_print_report, decoded_candidates, save_samples_json
+from .util.feeding import audiofile_to_features, create_dataset
 from .util.flags import create_flags, FLAGS
 from .util.helpers import check_ctcdecoder_version
 from .util.logging import create_progressbar, log_error, log_progress
+from .util.logits_cache import LogitsSetWriter, get_logits_set_path
 
 check_ctcdecoder_version()
 
@@ -43,74 +45,166 @@ def sparse_tuple_to_texts(sp_tuple, alphabet):
     return [alphabet.Decode(res) for res in results]
 
 
-def evaluate(test_csvs, create_model):
-    if FLAGS.scorer_path:
-        scorer = Scorer(FLAGS.lm_alpha, FLAGS.lm_beta,
-                        FLAGS.scorer_path, Config.alphabet)
-    else:
-        scorer = None
-
-    test_sets = [create_dataset([csv], batch_size=FLAGS.test_batch_size, train_phase=False) for csv in test_csvs]
-    iterator = tfv1.data.Iterator.from_structure(tfv1.data.get_output_types(test_sets[0]),
-                                                 tfv1.data.get_output_shapes(test_sets[0]),
-                                                 output_classes=tfv1.data.get_output_classes(test_sets[0]))
-    test_init_ops = [iterator.make_initializer(test_set) for test_set in test_sets]
-
-    batch_wav_filename, (batch_x, batch_x_len), batch_y = iterator.get_next()
-
-    # One rate per layer
-    no_dropout = [None] * 6
-    logits, _ = create_model(batch_x=batch_x,
-                             seq_length=batch_x_len,
-                             dropout=no_dropout)
-
-    # Transpose to batch major and apply softmax for decoder
-    transposed = tf.nn.softmax(tf.transpose(a=logits, perm=[1, 0, 2]))
-
-    loss = tfv1.nn.ctc_loss(labels=batch_y,
-                            inputs=logits,
-                            sequence_length=batch_x_len)
-
-    tfv1.train.get_or_create_global_step()
-
-    # Get number of accessible CPU cores for this process
-    try:
-        num_processes = cpu_count()
-    except NotImplementedError:
-        num_processes = 1
-
-    with tfv1.Session(config=Config.session_config) as session:
-        load_graph_for_evaluation(session)
-
-        def run_test(init_op, dataset):
+def create_decoder(scorer, num_processes=None, beam_width=None, cutoff_prob=None, cutoff_top_n=None):
+    r"""
+    Creates a :class:`ds_ctcdecoder.BatchDecoder` configured by the decoder flags, unless
+    ``beam_width``, ``cutoff_prob`` or ``cutoff_top_n`` are given.
+    Its worker threads are kept alive for all batches decoded by it.
+    """
+    if num_processes is None:
+        # Get number of accessible CPU cores for this process
+        try:
+            num_processes = cpu_count()
+        except NotImplementedError:
+            num_processes = 1
+    return BatchDecoder(Config.alphabet,
+                        FLAGS.beam_width if beam_width is None else beam_width,
+                        num_processes=num_processes, scorer=scorer,
+                        cutoff_prob=FLAGS.cutoff_prob if cutoff_prob is None else cutoff_prob,
+                        cutoff_top_n=FLAGS.cutoff_top_n if cutoff_top_n is None else cutoff_top_n)
+
+
+class EvaluationEngine:
+    r"""
+    Keeps the acoustic model graph, a session with the loaded checkpoint and the decoder alive for
+    repeated evaluations. Test sets and decoder parameters can change between calls without paying
+    for graph construction and checkpoint restoration again. As the batch dimension of the graph is
+    dynamic, one graph serves all batch sizes. Decoder parameters start out as the values of the decoder
+    flags and are kept per engine (see :func:`set_decoder_params`).
+    Use as context manager or call :func:`close`.
+    """
+    def __init__(self, create_model):
+        self.create_model = create_model
+        self.graph = None
+        self.session = None
+        self.iterator = None
+        self.init_ops = {}
+        self.file_inputs = None
+        self.scorer = None
+        self.decoder = None
+        self.lm_alpha = FLAGS.lm_alpha
+        self.lm_beta = FLAGS.lm_beta
+        self.beam_width = FLAGS.beam_width
+        self.cutoff_prob = FLAGS.cutoff_prob
+        self.cutoff_top_n = FLAGS.cutoff_top_n
+
+    def _build(self):
+        if self.graph is not None:
+            return
+        self.graph = tf.Graph()
+        with self.graph.as_default():
+            # All test sets share one structure - samples of a set only get read when iterating it
+            structure_set = create_dataset([], batch_size=1, train_phase=False)
+            self.iterator = tfv1.data.Iterator.from_structure(tfv1.data.get_output_types(structure_set),
+                                                              tfv1.data.get_output_shapes(structure_set),
+                                                              output_classes=tfv1.data.get_output_classes(structure_set))
+            self.batch_wav_filename, (self.batch_x, self.batch_x_len), self.batch_y = self.iterator.get_next()
+
+            # One rate per layer
+            no_dropout = [None] * 6
+            logits, _ = self.create_model(batch_x=self.batch_x,
+                                          seq_length=self.batch_x_len,
+                                          dropout=no_dropout)
+
+            # Transpose to batch major and apply softmax for decoder
+            self.transposed = tf.nn.softmax(tf.transpose(a=logits, perm=[1, 0, 2]))
+
+            self.loss = tfv1.nn.ctc_loss(labels=self.batch_y,
+                                         inputs=logits,
+                                         sequence_length=self.batch_x_len)
+
+            tfv1.train.get_or_create_global_step()
+
+            self.session = tfv1.Session(config=Config.session_config)
+            load_graph_for_evaluation(self.session)
+
+    def _init_op(self, csv, batch_size):
+        key = (csv, batch_size)
+        if key not in self.init_ops:
+            self._build()
+            with self.graph.as_default():
+                test_set = create_dataset([csv], batch_size=batch_size, train_phase=False)
+                self.init_ops[key] = self.iterator.make_initializer(test_set)
+        return self.init_ops[key]
+
+    def _get_decoder(self):
+        if self.decoder is None:
+            if FLAGS.scorer_path and self.scorer is None:
+                self.scorer = Scorer(self.lm_alpha, self.lm_beta,
+                                     FLAGS.scorer_path, Config.alphabet)
+            self.decoder = create_decoder(self.scorer, beam_width=self.beam_width,
+                                          cutoff_prob=self.cutoff_prob, cutoff_top_n=self.cutoff_top_n)
+        return self.decoder
+
+    def set_decoder_params(self, lm_alpha=None, lm_beta=None, beam_width=None, cutoff_prob=None, cutoff_top_n=None):
+        r"""
+        Changes decoder parameters for all following evaluations. The scorer stays loaded.
+        Changing ``beam_width``, ``cutoff_prob`` or ``cutoff_top_n`` re-creates the (cheap) decoder.
+        """
+        if lm_alpha is not None:
+            self.lm_alpha = lm_alpha
+        if lm_beta is not None:
+            self.lm_beta = lm_beta
+        if self.scorer is not None and (lm_alpha is not None or lm_beta is not None):
+            self.scorer.reset_params(self.lm_alpha, self.lm_beta)
+        decoder_params = {'beam_width': beam_width, 'cutoff_prob': cutoff_prob, 'cutoff_top_n': cutoff_top_n}
+        for name, value in decoder_params.items():
+            if value is not None and value != getattr(self, name):
+                setattr(self, name, value)
+                self.decoder = None
+
+    def run_batches(self, csv, batch_size=None):
+        r"""
+        Runs the acoustic model over all samples of ``csv`` and yields one tuple of
+        (wav_filenames, softmax outputs (batch major), losses, lengths, transcripts) per batch.
+        """
+        init_op = self._init_op(csv, batch_size or FLAGS.test_batch_size)
+        # Initialize iterator to the appropriate dataset
+        self.session.run(init_op)
+        while True:
+            try:
+                batch_wav_filenames, batch_logits, batch_loss, batch_lengths, batch_transcripts = \
+                    self.session.run([self.batch_wav_filename, self.transposed, self.loss,
+                                      self.batch_x_len, self.batch_y])
+            except tf.errors.OutOfRangeError:
+                break
+            yield ([wav_filename.decode('UTF-8') for wav_filename in batch_wav_filenames],
+                   batch_logits,
+                   batch_loss,
+                   batch_lengths,
+                   sparse_tensor_value_to_texts(batch_transcripts, Config.alphabet))
+
+    def evaluate(self, test_csvs, batch_size=None):
+        r"""
+        Evaluates the model on all ``test_csvs``, prints a test report per set
+        and returns the samples of all sets.
+        """
+        decoder = self._get_decoder()
+        samples = []
+        for csv in test_csvs:
+            print('Testing model on {}'.format(csv))
             wav_filenames = []
             losses = []
             predictions = []
             ground_truths = []
+            candidates = [] if FLAGS.test_output_candidates > 0 else None
 
             bar = create_progressbar(prefix='Test epoch | ',
                                      widgets=['Steps: ', progressbar.Counter(), ' | ', progressbar.Timer()]).start()
             log_progress('Test epoch...')
 
             step_count = 0
-
-            # Initialize iterator to the appropriate dataset
-            session.run(init_op)
-
-            # First pass, compute losses and transposed logits for decoding
-            while True:
-                try:
-                    batch_wav_filenames, batch_logits, batch_loss, batch_lengths, batch_transcripts = \
-                        session.run([batch_wav_filename, transposed, loss, batch_x_len, batch_y])
-                except tf.errors.OutOfRangeError:
-                    break
-
-                decoded = ctc_beam_search_decoder_batch(batch_logits, batch_lengths, Config.alphabet, FLAGS.beam_width,
-                                                        num_processes=num_processes, scorer=scorer,
-                                                        cutoff_prob=FLAGS.cutoff_prob, cutoff_top_n=FLAGS.cutoff_top_n)
-                predictions.extend(d[0][1] for d in decoded)
-                ground_truths.extend(sparse_tensor_value_to_texts(batch_transcripts, Config.alphabet))
-                wav_filenames.extend(wav_filename.decode('UTF-8') for wav_filename in batch_wav_filenames)
+            for batch_wav_filenames, batch_logits, batch_loss, batch_lengths, batch_transcripts in \
+                    self.run_batches(csv, batch_size=batch_size):
+                decoded = decoder.decode_columns(batch_logits, batch_lengths,
+                                                 num_results=max(1, FLAGS.test_output_candidates))
+                # Best result of each batch element
+                predictions.extend(decoded.texts[i] for i in decoded.result_offsets[:-1])
+                if candidates is not None:
+                    candidates.extend(decoded_candidates(decoded, i, Config.alphabet)
+                                      for i in range(len(batch_lengths)))
+                ground_truths.extend(batch_transcripts)
+                wav_filenames.extend(batch_wav_filenames)
                 losses.extend(batch_loss)
 
                 step_count += 1
@@ -119,15 +213,97 @@ def evaluate(test_csvs, create_model):
             bar.finish()
 
             # Print test summary
-            test_samples = calculate_and_print_report(wav_filenames, ground_truths, predictions, losses, dataset)
-            return test_samples
-
-        samples = []
-        for csv, init_op in zip(test_csvs, test_init_ops):
-            print('Testing model on {}'.format(csv))
-            samples.extend(run_test(init_op, dataset=csv))
+            samples.extend(calculate_and_print_report(wav_filenames, ground_truths, predictions, losses, csv,
+                                                      candidates=candidates))
         return samples
 
+    def compute_logits(self, test_csvs, cache_dir=None, batch_size=None):
+        r"""
+        Runs the acoustic model over all ``test_csvs`` and returns one :class:`util.logits_cache.LogitsSet`
+        per test set (see :func:`compute_logits`).
+        """
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+        logits_sets = []
+        for index, csv in enumerate(test_csvs):
+            print('Computing acoustic model outputs for {}'.format(csv))
+            bar = create_progressbar(prefix='Computing logits | ',
+                                     widgets=['Steps: ', progressbar.Counter(), ' | ', progressbar.Timer()]).start()
+            step_count = 0
+
+            path = get_logits_set_path(cache_dir, index, csv) if cache_dir else None
+            with LogitsSetWriter(csv, path=path) as writer:
+                for batch_wav_filenames, batch_logits, batch_loss, batch_lengths, batch_transcripts in \
+                        self.run_batches(csv, batch_size=batch_size):
+                    writer.add_batch(batch_wav_filenames, batch_logits, batch_lengths, batch_transcripts, batch_loss)
+                    step_count += 1
+                    bar.update(step_count)
+
+                logits_sets.append(writer.finish())
+            bar.finish()
+        return logits_sets
+
+    def transcribe_file(self, wav_filename):
+        r"""
+        Transcribes one WAV file by feeding its features directly into the model graph.
+        Returns the decoded text with the highest probability.
+        """
+        self._build()
+        if self.file_inputs is None:
+            with self.graph.as_default():
+                wav_filename_input = tfv1.placeholder(tf.string, [], name='wav_filename')
+                features, features_len = audiofile_to_features(wav_filename_input)
+                self.file_inputs = (wav_filename_input, tf.expand_dims(features, 0), tf.expand_dims(features_len, 0))
+        wav_filename_input, file_features, file_features_len = self.file_inputs
+        features, features_len = self.session.run([file_features, file_features_len],
+                                                  feed_dict={wav_filename_input: wav_filename})
+        probs = self.session.run(self.transposed, feed_dict={self.batch_x: features, self.batch_x_len: features_len})
+        decoded = self._get_decoder().decode_columns(probs, features_len)
+        return decoded.texts[decoded.result_offsets[0]]
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
+            self.session = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def evaluate(test_csvs, create_model):
+    with EvaluationEngine(create_model) as engine:
+        return engine.evaluate(test_csvs)
+
+
+def compute_logits(test_csvs, create_model, cache_dir=None):
+    r"""
+    Runs the acoustic model once over all ``test_csvs`` and returns one
+    :class:`util.logits_cache.LogitsSet` per test set. The softmax outputs are stored
+    as float16, memory-mapped from ``cache_dir`` if provided and kept in memory otherwise.
+    This allows for repeated decoding (e.g. with different decoder parameters) through
+    :func:`evaluate_logits` without rebuilding the graph or reloading the checkpoint.
+    """
+    with EvaluationEngine(create_model) as engine:
+        return engine.compute_logits(test_csvs, cache_dir=cache_dir)
+
+
+def evaluate_logits(logits_set, decoder):
+    r"""
+    Decodes a :class:`util.logits_cache.LogitsSet` previously computed by :func:`compute_logits`
+    with ``decoder`` (see :func:`create_decoder`) and prints the test report.
+    """
+    predictions = []
+    for batch_probs, batch_lengths in logits_set.batches(FLAGS.test_batch_size):
+        decoded = decoder.decode(batch_probs, batch_lengths)
+        predictions.extend(d[0][1] for d in decoded)
+
+    return calculate_and_print_report(logits_set.wav_filenames, logits_set.transcripts, predictions,
+                                      logits_set.losses, logits_set.name)
+
 
 def main(_):
     initialize_globals()
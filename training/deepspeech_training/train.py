@@ -24,16 +24,25 @@ tfv1.logging.set_verbosity({
     '3': tfv1.logging.ERROR
 }.get(DESIRED_LOG_LEVEL))
 
+from collections import Counter
 from datetime import datetime
-from ds_ctcdecoder import ctc_beam_search_decoder, Scorer
-from .evaluate import evaluate
+from functools import partial
+from ds_ctcdecoder import Scorer
+from .evaluate import EvaluationEngine
 from six.moves import zip, range
+from .util.audio import AUDIO_TYPE_NP
+from .util.augmentations import get_augmentation_queue_depth
 from .util.config import Config, initialize_globals
-from .util.checkpoints import load_or_init_graph_for_training, load_graph_for_evaluation
+from .util.checkpoints import close_checkpoint_savers, create_checkpoint_saver, load_or_init_graph_for_training, \
+    load_graph_for_evaluation
 from .util.evaluate_tools import save_samples_json
-from .util.feeding import create_dataset, audio_to_features, audiofile_to_features
+from .util.feeding import create_dataset, audio_to_features
 from .util.flags import create_flags, FLAGS
-from .util.helpers import check_ctcdecoder_version, ExceptionBox
+from .util.graph_optimization import QUANTIZATION_DYNAMIC, QUANTIZATION_INT8, benchmark_graph, benchmark_tflite, \
+    convert_to_tflite, optimize_inference_graph, quantize_graph_weights
+from .util.helpers import check_ctcdecoder_version, ExceptionBox, MEGABYTE
+from .util.sample_collections import samples_from_sources
+from .util.tracing import StepTracer
 from .util.logging import create_progressbar, log_debug, log_error, log_info, log_progress, log_warn
 
 check_ctcdecoder_version()
@@ -227,8 +236,18 @@ def calculate_mean_edit_distance_and_loss(iterator, dropout, reuse):
     Next to total and average loss it returns the mean edit distance,
     the decoded result and the batch's original Y.
     '''
-    # Obtain the next batch of data
-    batch_filenames, (batch_x, batch_seq_len), batch_y = iterator.get_next()
+    # Obtain the next batch of data, timestamps around it measure the time spent waiting for the input pipeline
+    with tf.device(Config.cpu_device):
+        wait_start = tf.timestamp()
+        with tf.control_dependencies([wait_start]):
+            batch_filenames, (batch_x, batch_seq_len), batch_y = iterator.get_next()
+        with tf.control_dependencies([batch_filenames]):
+            wait_end = tf.timestamp()
+    batch_stats = {
+        'input_wait': wait_end - wait_start,
+        'samples': tf.size(batch_seq_len),
+        'audio_seconds': tf.cast(tf.reduce_sum(batch_seq_len), tf.float64) * FLAGS.feature_win_step / 1000.0,
+    }
 
     if FLAGS.train_cudnn:
         rnn_impl = rnn_impl_cudnn_rnn
@@ -248,7 +267,7 @@ def calculate_mean_edit_distance_and_loss(iterator, dropout, reuse):
     avg_loss = tf.reduce_mean(input_tensor=total_loss)
 
     # Finally we return the average loss
-    return avg_loss, non_finite_files
+    return avg_loss, non_finite_files, batch_stats
 
 
 # Adam Optimization
@@ -299,6 +318,9 @@ def get_tower_results(iterator, optimizer, dropout_rates):
     # Aggregate any non finite files in the batches
     tower_non_finite_files = []
 
+    # Input pipeline statistics of the towers' batches
+    tower_batch_stats = []
+
     with tfv1.variable_scope(tfv1.get_variable_scope()):
         # Loop over available_devices
         for i in range(len(Config.available_devices)):
@@ -309,7 +331,7 @@ def get_tower_results(iterator, optimizer, dropout_rates):
                 with tf.name_scope('tower_%d' % i):
                     # Calculate the avg_loss and mean_edit_distance and retrieve the decoded
                     # batch along with the original batch's labels (Y) of this tower
-                    avg_loss, non_finite_files = calculate_mean_edit_distance_and_loss(iterator, dropout_rates, reuse=i > 0)
+                    avg_loss, non_finite_files, batch_stats = calculate_mean_edit_distance_and_loss(iterator, dropout_rates, reuse=i > 0)
 
                     # Allow for variables to be re-used by the next tower
                     tfv1.get_variable_scope().reuse_variables()
@@ -325,13 +347,22 @@ def get_tower_results(iterator, optimizer, dropout_rates):
 
                     tower_non_finite_files.append(non_finite_files)
 
+                    tower_batch_stats.append(batch_stats)
+
     avg_loss_across_towers = tf.reduce_mean(input_tensor=tower_avg_losses, axis=0)
     tfv1.summary.scalar(name='step_loss', tensor=avg_loss_across_towers, collections=['step_summaries'])
 
     all_non_finite_files = tf.concat(tower_non_finite_files, axis=0)
 
+    # Towers wait for their batches concurrently
+    step_stats = {
+        'input_wait': tf.reduce_max([stats['input_wait'] for stats in tower_batch_stats]),
+        'samples': tf.add_n([stats['samples'] for stats in tower_batch_stats]),
+        'audio_seconds': tf.add_n([stats['audio_seconds'] for stats in tower_batch_stats]),
+    }
+
     # Return gradients and the average loss
-    return tower_gradients, avg_loss_across_towers, all_non_finite_files
+    return tower_gradients, avg_loss_across_towers, all_non_finite_files, step_stats
 
 
 def average_gradients(tower_gradients):
@@ -371,6 +402,70 @@ def average_gradients(tower_gradients):
     return average_grads
 
 
+def allreduce_gradients(grads_and_vars):
+    r'''
+    Averages gradients across all data-parallel processes (see --horovod) through ring all-reduce.
+    '''
+    import horovod.tensorflow as hvd  # pylint: disable=import-outside-toplevel
+    return [(hvd.allreduce(grad), var) for grad, var in grads_and_vars]
+
+
+def allreduce_sum(tensor):
+    r'''
+    Sums a tensor across all data-parallel processes (see --horovod).
+    '''
+    import horovod.tensorflow as hvd  # pylint: disable=import-outside-toplevel
+    return hvd.allreduce(tensor, op=hvd.Sum)
+
+
+def accumulate_gradients(optimizer, grads_and_vars, loss, global_step, reduce_gradients=None, reduce_batch_count=None):
+    r'''
+    Creates ops for accumulating gradients of several micro-batches before applying their mean.
+    Micro-batches with a non-finite loss are left out, so that one broken sample does not spoil
+    the whole accumulation window - and a window without any finite loss does not update the weights,
+    the optimizer state or the global step. Non-finite gradients of finite losses (e.g. overflows under
+    automatic mixed precision) are accumulated as they are, so that the (loss scale) optimizer
+    can skip the update as it would for a single batch.
+    If provided, ``reduce_gradients`` is applied to the mean gradients before applying them
+    (so that processes exchange gradients once per accumulation window and not per micro-batch).
+    If provided, ``reduce_batch_count`` sums the numbers of accumulated micro-batches of all processes,
+    so that they all agree on skipping a window.
+    Returns an initializer for the (local) accumulators, an op for accumulating the gradients
+    of the current micro-batch and an op that applies and resets the accumulated gradients.
+    '''
+    with tf.device(Config.cpu_device):
+        with tfv1.variable_scope('gradient_accumulation'):
+            accumulators = [tfv1.get_variable(var.op.name, shape=var.shape, dtype=var.dtype.base_dtype,
+                                              initializer=tfv1.zeros_initializer(), trainable=False,
+                                              collections=[tfv1.GraphKeys.LOCAL_VARIABLES])
+                            for _, var in grads_and_vars]
+            accumulated_batches = tfv1.get_variable('accumulated_batches', shape=[], dtype=tf.float32,
+                                                    initializer=tfv1.zeros_initializer(), trainable=False,
+                                                    collections=[tfv1.GraphKeys.LOCAL_VARIABLES])
+        init_op = tfv1.variables_initializer(accumulators + [accumulated_batches])
+
+        loss_is_finite = tf.math.is_finite(loss)
+        accumulate_op = tf.group(
+            [accumulator.assign_add(tf.where(loss_is_finite, grad, tf.zeros_like(grad)))
+             for accumulator, (grad, _) in zip(accumulators, grads_and_vars)] +
+            [accumulated_batches.assign_add(tf.cast(loss_is_finite, tf.float32))])
+
+    def apply_mean_gradients():
+        with tf.device(Config.cpu_device):
+            mean_grads_and_vars = [(accumulator / tf.maximum(accumulated_batches, 1.0), var)
+                                   for accumulator, (_, var) in zip(accumulators, grads_and_vars)]
+        if reduce_gradients is not None:
+            mean_grads_and_vars = reduce_gradients(mean_grads_and_vars)
+        return tf.group(optimizer.apply_gradients(mean_grads_and_vars, global_step=global_step))
+
+    total_batches = accumulated_batches if reduce_batch_count is None else reduce_batch_count(accumulated_batches)
+    apply_op = tf.cond(total_batches > 0, apply_mean_gradients, tf.no_op)
+    with tf.control_dependencies([apply_op]):
+        apply_op = tf.group([accumulator.assign(tf.zeros_like(accumulator)) for accumulator in accumulators] +
+                            [accumulated_batches.assign(0.0)])
+    return init_op, accumulate_op, apply_op
+
+
 
 # Logging
 # =======
@@ -405,19 +500,33 @@ def log_grads_and_vars(grads_and_vars):
         log_variable(variable, gradient=gradient)
 
 
+def scalar_summary(values, prefix=''):
+    r'''
+    Creates a summary of Python scalars for writing them next to the graph's summaries.
+    '''
+    return tfv1.Summary(value=[tfv1.Summary.Value(tag=prefix + tag, simple_value=value) for tag, value in values.items()])
+
+
 def train():
     exception_box = ExceptionBox()
 
+    # Data-parallel processes train on their own shards of the training samples and need their own feature caches
+    shard = (Config.rank, Config.num_ranks) if Config.num_ranks > 1 else None
+    feature_cache = FLAGS.feature_cache
+    if feature_cache and shard is not None:
+        feature_cache = '{}.shard{}'.format(feature_cache, Config.rank)
+
     # Create training and validation datasets
     train_set = create_dataset(FLAGS.train_files.split(','),
                                batch_size=FLAGS.train_batch_size,
                                epochs=FLAGS.epochs,
                                augmentations=Config.augmentations,
-                               cache_path=FLAGS.feature_cache,
+                               cache_path=feature_cache,
                                train_phase=True,
                                exception_box=exception_box,
                                process_ahead=len(Config.available_devices) * FLAGS.train_batch_size * 2,
-                               buffering=FLAGS.read_buffer)
+                               buffering=FLAGS.read_buffer,
+                               shard=shard)
 
     iterator = tfv1.data.Iterator.from_structure(tfv1.data.get_output_types(train_set),
                                                  tfv1.data.get_output_shapes(train_set),
@@ -433,7 +542,9 @@ def train():
                                    train_phase=False,
                                    exception_box=exception_box,
                                    process_ahead=len(Config.available_devices) * FLAGS.dev_batch_size * 2,
-                                   buffering=FLAGS.read_buffer) for source in dev_sources]
+                                   buffering=FLAGS.read_buffer,
+                                   shard=shard,
+                                   drop_shard_remainder=False) for source in dev_sources]
         dev_init_ops = [iterator.make_initializer(dev_set) for dev_set in dev_sets]
 
     if FLAGS.metrics_files:
@@ -443,7 +554,9 @@ def train():
                                        train_phase=False,
                                        exception_box=exception_box,
                                        process_ahead=len(Config.available_devices) * FLAGS.dev_batch_size * 2,
-                                       buffering=FLAGS.read_buffer) for source in metrics_sources]
+                                       buffering=FLAGS.read_buffer,
+                                       shard=shard,
+                                       drop_shard_remainder=False) for source in metrics_sources]
         metrics_init_ops = [iterator.make_initializer(metrics_set) for metrics_set in metrics_sets]
 
     # Dropout
@@ -470,7 +583,7 @@ def train():
         log_info('Enabling automatic mixed precision training.')
         optimizer = tfv1.train.experimental.enable_mixed_precision_graph_rewrite(optimizer)
 
-    gradients, loss, non_finite_files = get_tower_results(iterator, optimizer, dropout_rates)
+    gradients, loss, non_finite_files, step_stats = get_tower_results(iterator, optimizer, dropout_rates)
 
     # Average tower gradients across GPUs
     avg_tower_gradients = average_gradients(gradients)
@@ -478,15 +591,32 @@ def train():
 
     # global_step is automagically incremented by the optimizer
     global_step = tfv1.train.get_or_create_global_step()
-    apply_gradient_op = optimizer.apply_gradients(avg_tower_gradients, global_step=global_step)
-
-    # Summaries
+    reduce_gradients = allreduce_gradients if FLAGS.horovod else None
+    if FLAGS.gradient_accumulation_steps > 1:
+        # Every training step only accumulates, accumulated gradients get applied every n-th step
+        init_accumulators_op, apply_gradient_op, apply_accumulated_gradients_op = \
+            accumulate_gradients(optimizer, avg_tower_gradients, loss, global_step, reduce_gradients=reduce_gradients,
+                                 reduce_batch_count=allreduce_sum if FLAGS.horovod else None)
+    else:
+        if reduce_gradients is not None:
+            avg_tower_gradients = reduce_gradients(avg_tower_gradients)
+        apply_gradient_op = optimizer.apply_gradients(avg_tower_gradients, global_step=global_step)
+
+    if FLAGS.horovod:
+        # All processes start from the loaded or initialized variables of rank 0
+        import horovod.tensorflow as hvd  # pylint: disable=import-outside-toplevel
+        broadcast_variables_op = hvd.broadcast_global_variables(0)
+        # Summed loss and step count of the validation shards of all processes
+        set_totals = tfv1.placeholder(tf.float64, [2], name='set_totals')
+        reduce_set_totals_op = hvd.allreduce(set_totals, op=hvd.Sum)
+
+    # Summaries (only written by the chief process)
     step_summaries_op = tfv1.summary.merge_all('step_summaries')
     step_summary_writers = {
         'train': tfv1.summary.FileWriter(os.path.join(FLAGS.summary_dir, 'train'), max_queue=120),
         'dev': tfv1.summary.FileWriter(os.path.join(FLAGS.summary_dir, 'dev'), max_queue=120),
         'metrics': tfv1.summary.FileWriter(os.path.join(FLAGS.summary_dir, 'metrics'), max_queue=120),
-    }
+    } if Config.is_chief else {}
 
     human_readable_set_names = {
         'train': 'Training',
@@ -495,17 +625,23 @@ def train():
     }
 
     # Checkpointing
-    checkpoint_saver = tfv1.train.Saver(max_to_keep=FLAGS.max_to_keep)
+    checkpoint_saver = create_checkpoint_saver(max_to_keep=FLAGS.max_to_keep)
     checkpoint_path = os.path.join(FLAGS.save_checkpoint_dir, 'train')
 
-    best_dev_saver = tfv1.train.Saver(max_to_keep=1)
+    best_dev_saver = create_checkpoint_saver(max_to_keep=1)
     best_dev_path = os.path.join(FLAGS.save_checkpoint_dir, 'best_dev')
 
+    # Profiling
+    step_tracer = StepTracer(os.path.join(FLAGS.summary_dir, 'traces'),
+                             trace_steps=FLAGS.trace_steps if Config.is_chief else '',
+                             signal_steps=FLAGS.trace_signal_steps if Config.is_chief else 0)
+
     # Save flags next to checkpoints
-    os.makedirs(FLAGS.save_checkpoint_dir, exist_ok=True)
-    flags_file = os.path.join(FLAGS.save_checkpoint_dir, 'flags.txt')
-    with open(flags_file, 'w') as fout:
-        fout.write(FLAGS.flags_into_string())
+    if Config.is_chief:
+        os.makedirs(FLAGS.save_checkpoint_dir, exist_ok=True)
+        flags_file = os.path.join(FLAGS.save_checkpoint_dir, 'flags.txt')
+        with open(flags_file, 'w') as fout:
+            fout.write(FLAGS.flags_into_string())
 
     with tfv1.Session(config=Config.session_config) as session:
         log_debug('Session opened.')
@@ -515,20 +651,27 @@ def train():
 
         # Load checkpoint or initialize variables
         load_or_init_graph_for_training(session)
+        if FLAGS.horovod:
+            session.run(broadcast_variables_op)
+        if FLAGS.gradient_accumulation_steps > 1:
+            session.run(init_accumulators_op)
+        accumulated_steps = 0
 
         def run_set(set_name, epoch, init_op, dataset=None):
+            nonlocal accumulated_steps
             is_train = set_name == 'train'
             train_op = apply_gradient_op if is_train else []
             feed_dict = dropout_feed_dict if is_train else no_dropout_feed_dict
 
             total_loss = 0.0
             step_count = 0
+            total_stats = Counter()
 
             step_summary_writer = step_summary_writers.get(set_name)
             checkpoint_time = time.time()
 
-            if is_train and FLAGS.cache_for_epochs > 0 and FLAGS.feature_cache:
-                feature_cache_index = FLAGS.feature_cache + '.index'
+            if is_train and FLAGS.cache_for_epochs > 0 and feature_cache:
+                feature_cache_index = feature_cache + '.index'
                 if epoch % FLAGS.cache_for_epochs == 0 and os.path.isfile(feature_cache_index):
                     log_info('Invalidating feature cache')
                     os.remove(feature_cache_index)  # this will let TF also overwrite the related cache data files
@@ -549,15 +692,50 @@ def train():
             suffix = ' | Dataset: {}'.format(dataset) if dataset else None
             pbar = create_progressbar(prefix=prefix, widgets=widgets, suffix=suffix).start()
 
+            # Micro-batches of an accumulation window get summarized once, when their gradients get applied
+            window_stats = Counter()
+
+            def write_step_summaries(summary, stats, current_step):
+                step_time = stats['step_time']
+                step_summary_writer.add_summary(summary, current_step)
+                step_summary_writer.add_summary(scalar_summary({
+                    'step_time': step_time,
+                    'input_wait': stats['input_wait'],
+                    'compute_time': max(0.0, step_time - stats['input_wait']),
+                    'samples_per_second': stats['samples'] / step_time,
+                    'audio_seconds_per_second': stats['audio_seconds'] / step_time,
+                    'augmentation_queue_depth': stats['augmentation_queue_depth'],
+                }, prefix='step_stats/'), current_step)
+
+            def apply_accumulated_gradients(current_step):
+                nonlocal accumulated_steps
+                if window_stats['finite_steps'] == 0:
+                    log_warn('No micro-batch of the accumulation window before step {} had a finite loss - skipping '
+                             'its update{}'.format(current_step, ' if all processes agree' if FLAGS.horovod else ''))
+                apply_start = time.perf_counter()
+                session.run(apply_accumulated_gradients_op)
+                window_stats['step_time'] += time.perf_counter() - apply_start
+                accumulated_steps = 0
+                if step_summary_writer is not None:
+                    # Micro-batches with a non-finite loss got left out of the update
+                    finite_steps = window_stats['finite_steps']
+                    window_loss = window_stats['loss'] / finite_steps if finite_steps > 0 else float('nan')
+                    write_step_summaries(scalar_summary({'step_loss': window_loss}), window_stats, current_step)
+                window_stats.clear()
+
             # Initialize iterator to the appropriate dataset
             session.run(init_op)
 
             # Batch loop
+            current_step = 0
             while True:
                 try:
-                    _, current_step, batch_loss, problem_files, step_summary = \
-                        session.run([train_op, global_step, loss, non_finite_files, step_summaries_op],
-                                    feed_dict=feed_dict)
+                    trace_args = step_tracer.run_args(epoch, step_count) if is_train else {}
+                    step_start = time.perf_counter()
+                    _, current_step, batch_loss, problem_files, step_summary, batch_stats = \
+                        session.run([train_op, global_step, loss, non_finite_files, step_summaries_op, step_stats],
+                                    feed_dict=feed_dict, **trace_args)
+                    step_time = time.perf_counter() - step_start
                     exception_box.raise_if_set()
                 except tf.errors.OutOfRangeError:
                     exception_box.raise_if_set()
@@ -573,13 +751,47 @@ def train():
 
                 pbar.update(step_count)
 
-                step_summary_writer.add_summary(step_summary, current_step)
-
-                if is_train and FLAGS.checkpoint_secs > 0 and time.time() - checkpoint_time > FLAGS.checkpoint_secs:
+                # Input pipeline vs. compute time breakdown
+                queue_depth = get_augmentation_queue_depth()
+                if step_summary_writer is not None:
+                    # Traces are tagged by their step within the epoch, also for micro-batches
+                    step_tracer.save(trace_args, epoch, step_count - 1, current_step, step_summary_writer)
+                if is_train and FLAGS.gradient_accumulation_steps > 1:
+                    window_stats.update(batch_stats, step_time=step_time)
+                    window_stats['augmentation_queue_depth'] = queue_depth
+                    if np.isfinite(batch_loss):
+                        window_stats.update(loss=batch_loss, finite_steps=1)
+                    accumulated_steps += 1
+                    if accumulated_steps == FLAGS.gradient_accumulation_steps:
+                        apply_accumulated_gradients(current_step)
+                elif step_summary_writer is not None:
+                    write_step_summaries(step_summary, dict(batch_stats, step_time=step_time,
+                                                            augmentation_queue_depth=queue_depth), current_step)
+                total_stats.update(batch_stats, step_time=step_time, augmentation_queue_depth=queue_depth)
+
+                if is_train and Config.is_chief and FLAGS.checkpoint_secs > 0 and \
+                        time.time() - checkpoint_time > FLAGS.checkpoint_secs:
                     checkpoint_saver.save(session, checkpoint_path, global_step=current_step)
                     checkpoint_time = time.time()
 
             pbar.finish()
+            if is_train and FLAGS.gradient_accumulation_steps > 1 and accumulated_steps > 0:
+                # Applying the remainder of the epoch as a smaller effective batch
+                apply_accumulated_gradients(current_step)
+            if step_count > 0:
+                total_time = total_stats['step_time']
+                log_info('{} epoch {} - mean step time: {:.3f}s, input pipeline wait: {:.1%}, '
+                         'samples/s: {:.1f}, audio-seconds/s: {:.1f}, mean augmentation queue depth: {:.1f}'
+                         .format(human_readable_set_names[set_name], epoch, total_time / step_count,
+                                 total_stats['input_wait'] / total_time,
+                                 total_stats['samples'] / total_time,
+                                 total_stats['audio_seconds'] / total_time,
+                                 total_stats['augmentation_queue_depth'] / step_count))
+            if FLAGS.horovod and not is_train:
+                # All processes take their early stopping and learning rate decisions on the loss of the whole set
+                total_loss, step_count = session.run(reduce_set_totals_op,
+                                                     feed_dict={set_totals: [total_loss, step_count]})
+                step_count = int(step_count)
             mean_loss = total_loss / step_count if step_count > 0 else 0.0
             return mean_loss, step_count
 
@@ -594,7 +806,8 @@ def train():
                 log_progress('Training epoch %d...' % epoch)
                 train_loss, _ = run_set('train', epoch, train_init_op)
                 log_progress('Finished training epoch %d - loss: %f' % (epoch, train_loss))
-                checkpoint_saver.save(session, checkpoint_path, global_step=global_step)
+                if Config.is_chief:
+                    checkpoint_saver.save(session, checkpoint_path, global_step=global_step)
 
                 if FLAGS.dev_files:
                     # Validation
@@ -620,8 +833,9 @@ def train():
                     # Save new best model
                     if dev_loss < best_dev_loss:
                         best_dev_loss = dev_loss
-                        save_path = best_dev_saver.save(session, best_dev_path, global_step=global_step, latest_filename='best_dev_checkpoint')
-                        log_info("Saved new best validating model with loss %f to: %s" % (best_dev_loss, save_path))
+                        if Config.is_chief:
+                            save_path = best_dev_saver.save(session, best_dev_path, global_step=global_step, latest_filename='best_dev_checkpoint')
+                            log_info("Saved new best validating model with loss %f to: %s" % (best_dev_loss, save_path))
 
                     # Early stopping
                     if FLAGS.early_stop and epochs_without_improvement == FLAGS.es_epochs:
@@ -651,12 +865,21 @@ def train():
 
         except KeyboardInterrupt:
             pass
+        except BaseException:
+            # Waiting for checkpoints that are still being written in the background without hiding the training error
+            close_checkpoint_savers([checkpoint_saver, best_dev_saver], raise_errors=False)
+            raise
+        # Waiting for checkpoints that are still being written in the background
+        close_checkpoint_savers([checkpoint_saver, best_dev_saver])
         log_info('FINISHED optimization in {}'.format(datetime.utcnow() - train_start_time))
     log_debug('Session closed.')
 
 
-def test():
-    samples = evaluate(FLAGS.test_files.split(','), create_model)
+def test(engine=None):
+    if engine is None:
+        with EvaluationEngine(create_model) as engine:
+            return test(engine=engine)
+    samples = engine.evaluate(FLAGS.test_files.split(','))
     if FLAGS.test_output_file:
         save_samples_json(samples, FLAGS.test_output_file)
 
@@ -677,14 +900,17 @@ def create_inference_graph(batch_size=1, n_steps=16, tflite=False):
     input_tensor = tfv1.placeholder(tf.float32, [batch_size, n_steps if n_steps > 0 else None, 2 * Config.n_context + 1, Config.n_input], name='input_node')
     seq_length = tfv1.placeholder(tf.int32, [batch_size], name='input_lengths')
 
-    if batch_size <= 0:
-        # no state management since n_step is expected to be dynamic too (see below)
-        previous_state = None
-    else:
-        previous_state_c = tfv1.placeholder(tf.float32, [batch_size, Config.n_cell_dim], name='previous_state_c')
-        previous_state_h = tfv1.placeholder(tf.float32, [batch_size, Config.n_cell_dim], name='previous_state_h')
+    # The TF Lite converter only supports a dynamic first dimension and the unrolled LSTM of
+    # rnn_impl_static_rnn fixes the number of timesteps
+    if tflite and (batch_size is None or n_steps <= 0):
+        raise NotImplementedError('dynamic batch_size or n_steps is not supported by tflite')
 
-        previous_state = tf.nn.rnn_cell.LSTMStateTuple(previous_state_c, previous_state_h)
+    # With a dynamic batch size the state placeholders take one state per batch element,
+    # so that the native client can run a batch of whole utterances starting from zero states
+    previous_state_c = tfv1.placeholder(tf.float32, [batch_size, Config.n_cell_dim], name='previous_state_c')
+    previous_state_h = tfv1.placeholder(tf.float32, [batch_size, Config.n_cell_dim], name='previous_state_h')
+
+    previous_state = tf.nn.rnn_cell.LSTMStateTuple(previous_state_c, previous_state_h)
 
     # One rate per layer
     no_dropout = [None] * 6
@@ -711,22 +937,6 @@ def create_inference_graph(batch_size=1, n_steps=16, tflite=False):
     # Apply softmax for CTC decoder
     logits = tf.nn.softmax(logits, name='logits')
 
-    if batch_size <= 0:
-        if tflite:
-            raise NotImplementedError('dynamic batch_size does not support tflite nor streaming')
-        if n_steps > 0:
-            raise NotImplementedError('dynamic batch_size expect n_steps to be dynamic too')
-        return (
-            {
-                'input': input_tensor,
-                'input_lengths': seq_length,
-            },
-            {
-                'outputs': logits,
-            },
-            layers
-        )
-
     new_state_c, new_state_h = layers['rnn_output_state']
     new_state_c = tf.identity(new_state_c, name='new_state_c')
     new_state_h = tf.identity(new_state_h, name='new_state_h')
@@ -751,6 +961,56 @@ def create_inference_graph(batch_size=1, n_steps=16, tflite=False):
     return inputs, outputs, layers
 
 
+def representative_dataset(session, inputs, outputs, sources, max_steps):
+    r'''
+    Yields input values of the inference graph for calibrating post-training int8 quantization.
+    Samples of ``sources`` are fed through feature computation and acoustic model like the native client
+    does it: in chunks of n_steps feature windows, with the LSTM state carried over from chunk to chunk.
+    '''
+    window_samples = int(Config.audio_window_samples)
+    step_samples = int(Config.audio_step_samples)
+    window_size = 2 * Config.n_context + 1
+    batch_size, n_steps = inputs['input'].shape.as_list()[:2]
+    steps = 0
+    for sample in samples_from_sources(sources, labeled=False):
+        sample.change_audio_type(AUDIO_TYPE_NP)
+        audio = sample.audio[:, 0]
+        state_c = np.zeros([batch_size, Config.n_cell_dim], dtype=np.float32)
+        state_h = np.zeros([batch_size, Config.n_cell_dim], dtype=np.float32)
+        # Leading context is padded with zeros
+        mfccs = [np.zeros([Config.n_input], dtype=np.float32)] * Config.n_context
+        windows = []
+        for start in range(0, len(audio) - window_samples + 1, step_samples):
+            audio_window = audio[start:start + window_samples]
+            mfccs.append(session.run(outputs['mfccs'], feed_dict={inputs['input_samples']: audio_window})
+                         .reshape([Config.n_input]))
+            if len(mfccs) < window_size:
+                continue
+            windows.append(np.stack(mfccs[-window_size:]))
+            if len(windows) < n_steps:
+                continue
+            feed_dict = {
+                inputs['input']: np.tile(np.expand_dims(np.stack(windows), 0), [batch_size, 1, 1, 1]),
+                inputs['previous_state_c']: state_c,
+                inputs['previous_state_h']: state_h,
+                inputs['input_samples']: audio_window,
+            }
+            yield [feed_dict[tensor] for tensor in inputs.values()]
+            state_c, state_h = session.run([outputs['new_state_c'], outputs['new_state_h']], feed_dict=feed_dict)
+            windows = []
+            steps += 1
+            if steps >= max_steps:
+                return
+
+
+def log_optimization_report(size_before, latency_before, size_after, latency_after):
+    log_info('Export optimization - model size: {:.2f} MB -> {:.2f} MB ({:+.1%}), '
+             'latency: {:.2f} ms -> {:.2f} ms ({:+.1%})'.format(size_before / MEGABYTE, size_after / MEGABYTE,
+                                                                size_after / size_before - 1.0,
+                                                                latency_before * 1000, latency_after * 1000,
+                                                                latency_after / latency_before - 1.0))
+
+
 def file_relative_read(fname):
     return open(os.path.join(os.path.dirname(__file__), fname)).read()
 
@@ -773,6 +1033,10 @@ def export():
     outputs['metadata_beam_width'] = tf.constant([FLAGS.export_beam_width], name='metadata_beam_width')
     outputs['metadata_alphabet'] = tf.constant([Config.alphabet.Serialize()], name='metadata_alphabet')
 
+    if FLAGS.n_steps <= 0:
+        # Streams of the native client run all timesteps they buffered at once, if there are at least these many
+        outputs['metadata_min_steps'] = tf.constant([FLAGS.export_min_steps], name='metadata_min_steps')
+
     if FLAGS.export_language:
         outputs['metadata_language'] = tf.constant([FLAGS.export_language.encode('utf-8')], name='metadata_language')
 
@@ -807,20 +1071,47 @@ def export():
             graph_def=frozen_graph,
             dest_nodes=output_names)
 
+        input_names = [tensor.op.name for tensor in inputs.values()]
+        export_graph = frozen_graph
+        if FLAGS.export_optimize:
+            export_graph = optimize_inference_graph(export_graph, input_names, output_names)
+
         if not FLAGS.export_tflite:
+            export_graph = quantize_graph_weights(export_graph, input_names, output_names, FLAGS.export_quantization)
             with open(output_graph_path, 'wb') as fout:
-                fout.write(frozen_graph.SerializeToString())
+                fout.write(export_graph.SerializeToString())
+            if FLAGS.export_optimize and FLAGS.export_benchmark_runs > 0:
+                benchmark_names = [outputs[key].op.name for key in ['outputs', 'new_state_c', 'new_state_h', 'mfccs']]
+                log_optimization_report(
+                    len(frozen_graph.SerializeToString()),
+                    benchmark_graph(frozen_graph, benchmark_names, runs=FLAGS.export_benchmark_runs),
+                    len(export_graph.SerializeToString()),
+                    benchmark_graph(export_graph, benchmark_names, runs=FLAGS.export_benchmark_runs))
         else:
             output_tflite_path = os.path.join(FLAGS.export_dir, output_filename.replace('.pb', '.tflite'))
 
-            converter = tf.lite.TFLiteConverter(frozen_graph, input_tensors=inputs.values(), output_tensors=outputs.values())
-            converter.optimizations = [tf.lite.Optimize.DEFAULT]
-            # AudioSpectrogram and Mfcc ops are custom but have built-in kernels in TFLite
-            converter.allow_custom_ops = True
-            tflite_model = converter.convert()
+            representative = None
+            if FLAGS.export_quantization == QUANTIZATION_INT8:
+                if not FLAGS.export_representative_files:
+                    log_error('Full integer quantization requires samples for calibration, '
+                              'please specify them through --export_representative_files.')
+                    sys.exit(1)
+                representative = partial(representative_dataset, session, inputs, outputs,
+                                         FLAGS.export_representative_files.split(','),
+                                         FLAGS.export_representative_steps)
+            tflite_model = convert_to_tflite(export_graph, list(inputs.values()), list(outputs.values()),
+                                             FLAGS.export_quantization, representative_dataset=representative)
 
             with open(output_tflite_path, 'wb') as fout:
                 fout.write(tflite_model)
+            if FLAGS.export_optimize and FLAGS.export_benchmark_runs > 0:
+                # Compared to the former export: no graph optimization and dynamic-range quantization
+                baseline_model = convert_to_tflite(frozen_graph, list(inputs.values()), list(outputs.values()),
+                                                   QUANTIZATION_DYNAMIC)
+                log_optimization_report(len(baseline_model),
+                                        benchmark_tflite(baseline_model, runs=FLAGS.export_benchmark_runs),
+                                        len(tflite_model),
+                                        benchmark_tflite(tflite_model, runs=FLAGS.export_benchmark_runs))
 
         log_info('Models exported at %s' % (FLAGS.export_dir))
 
@@ -860,44 +1151,12 @@ def package_zip():
     log_info('Exported packaged model {}'.format(archive))
 
 
-def do_single_file_inference(input_file_path):
-    with tfv1.Session(config=Config.session_config) as session:
-        inputs, outputs, _ = create_inference_graph(batch_size=1, n_steps=-1)
-
-        # Restore variables from training checkpoint
-        load_graph_for_evaluation(session)
-
-        features, features_len = audiofile_to_features(input_file_path)
-        previous_state_c = np.zeros([1, Config.n_cell_dim])
-        previous_state_h = np.zeros([1, Config.n_cell_dim])
-
-        # Add batch dimension
-        features = tf.expand_dims(features, 0)
-        features_len = tf.expand_dims(features_len, 0)
-
-        # Evaluate
-        features = create_overlapping_windows(features).eval(session=session)
-        features_len = features_len.eval(session=session)
-
-        logits = outputs['outputs'].eval(feed_dict={
-            inputs['input']: features,
-            inputs['input_lengths']: features_len,
-            inputs['previous_state_c']: previous_state_c,
-            inputs['previous_state_h']: previous_state_h,
-        }, session=session)
-
-        logits = np.squeeze(logits)
-
-        if FLAGS.scorer_path:
-            scorer = Scorer(FLAGS.lm_alpha, FLAGS.lm_beta,
-                            FLAGS.scorer_path, Config.alphabet)
-        else:
-            scorer = None
-        decoded = ctc_beam_search_decoder(logits, Config.alphabet, FLAGS.beam_width,
-                                          scorer=scorer, cutoff_prob=FLAGS.cutoff_prob,
-                                          cutoff_top_n=FLAGS.cutoff_top_n)
-        # Print highest probability result
-        print(decoded[0][1])
+def do_single_file_inference(input_file_path, engine=None):
+    if engine is None:
+        with EvaluationEngine(create_model) as engine:
+            return do_single_file_inference(input_file_path, engine=engine)
+    # Print highest probability result
+    print(engine.transcribe_file(input_file_path))
 
 
 def early_training_checks():
@@ -926,28 +1185,32 @@ def main(_):
         tfv1.set_random_seed(FLAGS.random_seed)
         train()
 
-    if FLAGS.test_files:
-        tfv1.reset_default_graph()
-        test()
+    if not Config.is_chief:
+        # Testing, exporting and inference are left to the chief of the data-parallel processes
+        return
 
-    if FLAGS.export_dir and not FLAGS.export_zip:
-        tfv1.reset_default_graph()
-        export()
+    # Testing and single file inference share the graph and the loaded checkpoint
+    with EvaluationEngine(create_model) as engine:
+        if FLAGS.test_files:
+            test(engine=engine)
 
-    if FLAGS.export_zip:
-        tfv1.reset_default_graph()
-        FLAGS.export_tflite = True
+        if FLAGS.export_dir and not FLAGS.export_zip:
+            tfv1.reset_default_graph()
+            export()
 
-        if os.listdir(FLAGS.export_dir):
-            log_error('Directory {} is not empty, please fix this.'.format(FLAGS.export_dir))
-            sys.exit(1)
+        if FLAGS.export_zip:
+            tfv1.reset_default_graph()
+            FLAGS.export_tflite = True
 
-        export()
-        package_zip()
+            if os.listdir(FLAGS.export_dir):
+                log_error('Directory {} is not empty, please fix this.'.format(FLAGS.export_dir))
+                sys.exit(1)
 
-    if FLAGS.one_shot_infer:
-        tfv1.reset_default_graph()
-        do_single_file_inference(FLAGS.one_shot_infer)
+            export()
+            package_zip()
+
+        if FLAGS.one_shot_infer:
+            do_single_file_inference(FLAGS.one_shot_infer, engine=engine)
 
 
 def run_script():
@@ -23,6 +23,9 @@ AUDIO_TYPE_OPUS = 'application/vnd.mozilla.opus'
 SERIALIZABLE_AUDIO_TYPES = [AUDIO_TYPE_WAV, AUDIO_TYPE_OPUS]
 LOADABLE_AUDIO_EXTENSIONS = {'.wav': AUDIO_TYPE_WAV}
 
+MAX_IN_MEMORY_DURATION = 10 * 60  # seconds
+STREAMING_BLOCK_DURATION_MS = 60 * 1000
+
 OPUS_PCM_LEN_SIZE = 4
 OPUS_RATE_SIZE = 4
 OPUS_CHANNELS_SIZE = 1
@@ -162,7 +165,138 @@ def convert_audio(src_audio_path, dst_audio_path, file_type=None, audio_format=D
     transformer.build(src_audio_path, dst_audio_path)
 
 
+def _np_to_converted_pcm(audio, rate, audio_format):
+    audio = audio.mean(axis=1) if audio.shape[1] > 1 else audio[:, 0]
+    if rate != audio_format.rate:
+        # late binding librosa and its dependencies
+        # pre-importing sklearn fixes https://github.com/scikit-learn/scikit-learn/issues/14485
+        import sklearn  # pylint: disable=import-outside-toplevel,unused-import
+        from librosa.core import resample  # pylint: disable=import-outside-toplevel
+        audio = resample(audio, rate, audio_format.rate)
+    return np_to_pcm(np.clip(audio, -1.0, 1.0), audio_format)
+
+
+def decode_audio_file(audio_path, audio_format=DEFAULT_FORMAT):
+    """
+    Decodes an audio file of any format supported by libsndfile in-process and converts it
+    into PCM data of the requested format (down-mixing and resampling if required).
+    Falls back to SoX only for formats that libsndfile cannot read.
+
+    Parameters
+    ----------
+    audio_path : str
+        Path to the audio file
+    audio_format : AudioFormat
+        Required format of the resulting PCM data
+
+    Returns
+    -------
+    bytes
+        PCM data in audio_format
+    """
+    import soundfile  # pylint: disable=import-outside-toplevel
+    try:
+        audio, rate = soundfile.read(audio_path, dtype='float32', always_2d=True)
+    except RuntimeError:
+        # Not supported by libsndfile
+        _, tmp_file_path = tempfile.mkstemp(suffix='.wav')
+        try:
+            convert_audio(audio_path, tmp_file_path, file_type='wav', audio_format=audio_format)
+            with wave.open(tmp_file_path, 'r') as wav_file:
+                return wav_file.readframes(wav_file.getnframes())
+        finally:
+            os.remove(tmp_file_path)
+    return _np_to_converted_pcm(audio, rate, audio_format)
+
+
+def stream_audio_file(audio_path, audio_format=DEFAULT_FORMAT, block_duration_ms=STREAMING_BLOCK_DURATION_MS):
+    """
+    Decodes and converts an audio file (like decode_audio_file) block by block, so that memory usage does not
+    depend on the duration of the file. Every block gets resampled independently.
+
+    Returns
+    -------
+    iterable of bytes
+        Consecutive blocks of PCM data in audio_format
+    """
+    import soundfile  # pylint: disable=import-outside-toplevel
+    try:
+        sound_file = soundfile.SoundFile(audio_path)
+    except RuntimeError:
+        # Not supported by libsndfile
+        yield decode_audio_file(audio_path, audio_format=audio_format)
+        return
+    with sound_file:
+        block_size = int(sound_file.samplerate * block_duration_ms / 1000)
+        for block in sound_file.blocks(blocksize=block_size, dtype='float32', always_2d=True):
+            yield _np_to_converted_pcm(block, sound_file.samplerate, audio_format)
+
+
+def is_wav_file_of_format(audio_path, audio_format=DEFAULT_FORMAT):
+    if not audio_path.endswith('.wav'):
+        return False
+    with wave.open(audio_path, 'r') as wav_file:
+        return read_audio_format_from_wav_file(wav_file) == audio_format
+
+
+def load_audio_file(audio_path,
+                    audio_format=DEFAULT_FORMAT,
+                    stream_long=False,
+                    max_in_memory_duration=MAX_IN_MEMORY_DURATION):
+    """
+    Prepares an audio file for getting read as WAV data of the requested format.
+
+    Parameters
+    ----------
+    audio_path : str
+        Path to the audio file
+    audio_format : AudioFormat
+        Required format of the WAV data
+    stream_long : bool
+        If the caller streams non-WAV files itself (like read_frames_from_file): whether to leave files that are
+        longer than max_in_memory_duration seconds to it, so that they can get decoded in constant memory
+    max_in_memory_duration : float
+        See stream_long
+
+    Returns
+    -------
+    str or io.BytesIO
+        The path itself, if it points to a WAV file that already is in audio_format or (with stream_long)
+        to a file that is longer than max_in_memory_duration seconds,
+        otherwise an in-memory WAV file with the decoded and converted audio data
+    """
+    if is_wav_file_of_format(audio_path, audio_format):
+        return audio_path
+    if stream_long:
+        import soundfile  # pylint: disable=import-outside-toplevel
+        try:
+            if soundfile.info(audio_path).duration > max_in_memory_duration:
+                return audio_path
+        except RuntimeError:
+            pass
+    wav_data = io.BytesIO()
+    write_wav(wav_data, decode_audio_file(audio_path, audio_format=audio_format), audio_format=audio_format)
+    wav_data.seek(0)
+    return wav_data
+
+
+def _load_audio_file(path_and_format):
+    audio_path, audio_format, stream_long = path_and_format
+    return load_audio_file(audio_path, audio_format=audio_format, stream_long=stream_long)
+
+
+def load_audio_files(audio_paths, audio_format=DEFAULT_FORMAT, stream_long=False, threads=None, process_ahead=None):
+    """Applies load_audio_file to all paths of an iterable within a background thread pool,
+    so that decoding and resampling of upcoming files overlaps with processing the current one.
+    Results are yielded in the order of audio_paths."""
+    with LimitingPool(processes=threads, process_ahead=process_ahead, use_threads=True) as pool:
+        yield from pool.imap(_load_audio_file, map(lambda path: (path, audio_format, stream_long), audio_paths))
+
+
 class AudioFile:
+    """Opens an audio file of any supported format as WAV file of the requested format. Files that already
+    have that format are read directly, all others get decoded and converted in memory.
+    audio_path can also be the result of load_audio_file."""
     def __init__(self, audio_path, as_path=False, audio_format=DEFAULT_FORMAT):
         self.audio_path = audio_path
         self.audio_format = audio_format
@@ -171,19 +305,20 @@ class AudioFile:
         self.tmp_file_path = None
 
     def __enter__(self):
-        if self.audio_path.endswith('.wav'):
-            self.open_file = wave.open(self.audio_path, 'r')
-            if read_audio_format_from_wav_file(self.open_file) == self.audio_format:
-                if self.as_path:
-                    self.open_file.close()
-                    return self.audio_path
-                return self.open_file
-            self.open_file.close()
-        _, self.tmp_file_path = tempfile.mkstemp(suffix='.wav')
-        convert_audio(self.audio_path, self.tmp_file_path, file_type='wav', audio_format=self.audio_format)
-        if self.as_path:
+        source = self.audio_path
+        if isinstance(source, str):
+            source = load_audio_file(source, audio_format=self.audio_format)
+        if isinstance(source, str):
+            if self.as_path:
+                return source
+        elif self.as_path:
+            _, self.tmp_file_path = tempfile.mkstemp(suffix='.wav')
+            with open(self.tmp_file_path, 'wb') as tmp_file:
+                tmp_file.write(source.getbuffer())
             return self.tmp_file_path
-        self.open_file = wave.open(self.tmp_file_path, 'r')
+        else:
+            source.seek(0)
+        self.open_file = wave.open(source, 'r')
         return self.open_file
 
     def __exit__(self, *args):
@@ -206,17 +341,44 @@ def read_frames(wav_file, frame_duration_ms=30, yield_remainder=False):
             break
 
 
+def read_frames_from_pcm_blocks(pcm_blocks, audio_format=DEFAULT_FORMAT, frame_duration_ms=30, yield_remainder=False):
+    frame_size = int(audio_format.rate * (frame_duration_ms / 1000.0)) * audio_format.channels * audio_format.width
+    buffer = b''
+    for block in pcm_blocks:
+        buffer += block
+        offset = 0
+        while len(buffer) - offset >= frame_size:
+            yield buffer[offset:offset + frame_size]
+            offset += frame_size
+        buffer = buffer[offset:]
+    if yield_remainder and len(buffer) > 0:
+        yield buffer
+
+
 def read_frames_from_file(audio_path, audio_format=DEFAULT_FORMAT, frame_duration_ms=30, yield_remainder=False):
+    if isinstance(audio_path, str) and not is_wav_file_of_format(audio_path, audio_format):
+        # Constant memory decoding and conversion
+        yield from read_frames_from_pcm_blocks(stream_audio_file(audio_path, audio_format=audio_format),
+                                               audio_format=audio_format,
+                                               frame_duration_ms=frame_duration_ms,
+                                               yield_remainder=yield_remainder)
+        return
     with AudioFile(audio_path, audio_format=audio_format) as wav_file:
         for frame in read_frames(wav_file, frame_duration_ms=frame_duration_ms, yield_remainder=yield_remainder):
             yield frame
 
 
+def get_frame_energy(frame, audio_format=DEFAULT_FORMAT):
+    samples = np.frombuffer(frame, dtype=get_dtype(audio_format)).astype(np.float32)
+    return float(np.mean(samples ** 2)) if len(samples) > 0 else 0.0
+
+
 def vad_split(audio_frames,
               audio_format=DEFAULT_FORMAT,
               num_padding_frames=10,
               threshold=0.5,
-              aggressiveness=3):
+              aggressiveness=3,
+              max_segment_duration_ms=None):
     from webrtcvad import Vad  # pylint: disable=import-outside-toplevel
     if audio_format.channels != 1:
         raise ValueError('VAD-splitting requires mono samples')
@@ -231,8 +393,10 @@ def vad_split(audio_frames,
     vad = Vad(int(aggressiveness))
     voiced_frames = []
     frame_duration_ms = 0
-    frame_index = 0
+    # Number of frames up to and including the current one
+    num_frames = 0
     for frame_index, frame in enumerate(audio_frames):
+        num_frames = frame_index + 1
         frame_duration_ms = get_pcm_duration(len(frame), audio_format) * 1000
         if int(frame_duration_ms) not in [10, 20, 30]:
             raise ValueError('VAD-splitting only supported for frame durations 10, 20, or 30 ms')
@@ -252,14 +416,24 @@ def vad_split(audio_frames,
             if num_unvoiced > threshold * ring_buffer.maxlen:
                 triggered = False
                 yield b''.join(voiced_frames), \
-                      frame_duration_ms * max(0, frame_index - len(voiced_frames)), \
-                      frame_duration_ms * frame_index
+                      frame_duration_ms * (num_frames - len(voiced_frames)), \
+                      frame_duration_ms * num_frames
                 ring_buffer.clear()
                 voiced_frames = []
+        if max_segment_duration_ms is not None and len(voiced_frames) * frame_duration_ms > max_segment_duration_ms:
+            # Forced split at the lowest-energy frame of the second half of the too long segment,
+            # so that segment durations (and memory usage) stay bounded also without any pauses
+            half = len(voiced_frames) // 2
+            energies = [get_frame_energy(f, audio_format) for f in voiced_frames[half:]]
+            split = half + int(np.argmin(energies)) + 1
+            yield b''.join(voiced_frames[:split]), \
+                  frame_duration_ms * (num_frames - len(voiced_frames)), \
+                  frame_duration_ms * (num_frames - len(voiced_frames) + split)
+            voiced_frames = voiced_frames[split:]
     if len(voiced_frames) > 0:
         yield b''.join(voiced_frames), \
-              frame_duration_ms * (frame_index - len(voiced_frames)), \
-              frame_duration_ms * (frame_index + 1)
+              frame_duration_ms * (num_frames - len(voiced_frames)), \
+              frame_duration_ms * num_frames
 
 
 def pack_number(n, num_bytes):
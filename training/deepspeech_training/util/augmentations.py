@@ -13,6 +13,9 @@ from .sample_collections import samples_from_source
 BUFFER_SIZE = 1 * MEGABYTE
 SPEC_PARSER = re.compile(r'^(?P<cls>[a-z_]+)(\[(?P<params>.*)\])?$')
 
+# Worker pools of running apply_sample_augmentations calls
+active_augmentation_pools = set()
+
 
 class Augmentation:
     def __init__(self, p=1.0):
@@ -218,12 +221,26 @@ def apply_sample_augmentations(samples,
             with LimitingPool(process_ahead=process_ahead,
                               initializer=_init_augmentation_worker,
                               initargs=(context,)) as pool:
-                yield from pool.imap(_augment_sample, timed_samples())
+                active_augmentation_pools.add(pool)
+                try:
+                    yield from pool.imap(_augment_sample, timed_samples())
+                finally:
+                    active_augmentation_pools.discard(pool)
     finally:
         for augmentation in augmentations:
             augmentation.stop()
 
 
+def get_augmentation_queue_depth():
+    """
+    Returns
+    -------
+    int
+        Number of samples that are currently queued or being augmented in worker pools of apply_sample_augmentations
+    """
+    return sum(pool.processed for pool in list(active_augmentation_pools))
+
+
 def _enqueue_overlay_samples(sample_source, queue, buffering=BUFFER_SIZE):
     """
     As the central distribution point for overlay samples this function is supposed to run in one process only.
@@ -1,11 +1,159 @@
+import os
 import sys
+import queue
+import threading
+import numpy as np
 import tensorflow as tf
 import tensorflow.compat.v1 as tfv1
 
 from .flags import FLAGS
+from .helpers import ExceptionBox
 from .logging import log_info, log_error, log_warn
 
 
+class AsyncCheckpointSaver:
+    """Drop-in replacement for `tfv1.train.Saver.save` that does not block training while writing.
+    A save copies all variables to host memory with one session run and hands the copy to a background
+    thread. The thread writes the checkpoint under a temporary prefix, renames its files into place and only
+    then updates the checkpoint state file, so that a checkpoint is either complete or not referenced at all.
+    Checkpoints are written in order and a save blocks while `max_pending` saves are still in flight."""
+    def __init__(self, var_list=None, max_to_keep=5, max_pending=1):
+        """
+        Parameters
+        ----------
+        var_list : list of tf.Variable and SaveableObject
+            Variables and saveable objects to save - defaults to all global variables and the
+            `GraphKeys.SAVEABLE_OBJECTS` collection like `tfv1.train.Saver`
+        max_to_keep : int
+            Number of most recent checkpoints to keep per checkpoint state file
+        max_pending : int
+            Maximum number of snapshots that are held in host memory until they got written
+        """
+        if var_list is None:
+            var_list = tfv1.global_variables() + tfv1.get_collection(tfv1.GraphKeys.SAVEABLE_OBJECTS)
+        entries = []
+        for item in var_list:
+            if isinstance(item, tf.Variable):
+                entries.append((item.op.name, '', item))
+            else:
+                # e.g. the canonical weights of CudnnLSTM that get computed from its opaque parameter buffer
+                entries.extend((spec.name, spec.slice_spec, spec.tensor) for spec in item.specs)
+        entries.sort(key=lambda entry: entry[0])
+        self.tensor_names = [name for name, _, _ in entries]
+        self.slice_specs = [slice_spec for _, slice_spec, _ in entries]
+        self.tensors = [tensor for _, _, tensor in entries]
+        self.max_to_keep = max_to_keep
+        self.kept_checkpoints = {}
+        self.exception_box = ExceptionBox()
+        # Separate CPU-only graph that writes fed snapshots in the checkpoint format of tfv1.train.Saver
+        self.write_graph = tf.Graph()
+        with self.write_graph.as_default(), tf.device('/cpu:0'):
+            self.prefix_placeholder = tfv1.placeholder(tf.string, [], name='prefix')
+            self.value_placeholders = [tfv1.placeholder(t.dtype.base_dtype, t.shape, name='value_{}'.format(i))
+                                       for i, t in enumerate(self.tensors)]
+            self.write_op = tf.raw_ops.SaveV2(prefix=self.prefix_placeholder,
+                                              tensor_names=self.tensor_names,
+                                              shape_and_slices=self.slice_specs,
+                                              tensors=self.value_placeholders)
+        self.write_session = tfv1.Session(graph=self.write_graph,
+                                          config=tfv1.ConfigProto(device_count={'GPU': 0}))
+        self.write_graph.finalize()
+        self.in_flight = threading.BoundedSemaphore(max(1, max_pending))
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._write_loop, daemon=True)
+        self.thread.start()
+
+    def save(self, session, save_path, global_step=None, latest_filename=None):
+        """Takes a snapshot of all variables and schedules writing it - returns the future checkpoint path.
+        Raises the exception of a failed previous write."""
+        self.exception_box.raise_if_set()
+        if global_step is not None:
+            if not isinstance(global_step, (int, np.integer)):
+                global_step = tfv1.train.global_step(session, global_step)
+            save_path = '{}-{}'.format(save_path, global_step)
+        self.in_flight.acquire()
+        try:
+            # The write that just freed a slot might have failed
+            self.exception_box.raise_if_set()
+            values = session.run(self.tensors)
+        except BaseException:
+            self.in_flight.release()
+            raise
+        self.queue.put((save_path, latest_filename or 'checkpoint', values))
+        return save_path
+
+    def _write_loop(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                self.queue.task_done()
+                return
+            try:
+                if self.exception_box.exception is None:
+                    self._write(*job)
+            except Exception as ex:  # pylint: disable = broad-except
+                self.exception_box.exception = ex
+            finally:
+                self.in_flight.release()
+                self.queue.task_done()
+
+    def _write(self, save_path, latest_filename, values):
+        temp_path = '{}.tmp{}'.format(save_path, os.getpid())
+        feed_dict = dict(zip(self.value_placeholders, values))
+        feed_dict[self.prefix_placeholder] = temp_path
+        self.write_session.run(self.write_op, feed_dict=feed_dict)
+        # Index file last, as it is what readers look for
+        temp_files = sorted(tf.io.gfile.glob(temp_path + '.*'), key=lambda f: f.endswith('.index'))
+        for temp_file in temp_files:
+            tf.io.gfile.rename(temp_file, save_path + temp_file[len(temp_path):], overwrite=True)
+        save_dir = os.path.dirname(save_path)
+        kept = self.kept_checkpoints.setdefault((save_dir, latest_filename), [])
+        if save_path in kept:
+            kept.remove(save_path)
+        kept.append(save_path)
+        removed = kept[:-self.max_to_keep] if self.max_to_keep else []
+        del kept[:len(removed)]
+        # Removing files only once the state file does not reference them anymore
+        tfv1.train.update_checkpoint_state(save_dir, save_path, all_model_checkpoint_paths=kept,
+                                           latest_filename=latest_filename)
+        for removed_path in removed:
+            tfv1.train.remove_checkpoint(removed_path)
+
+    def flush(self):
+        """Blocks until all scheduled checkpoints got written"""
+        self.queue.join()
+        self.exception_box.raise_if_set()
+
+    def close(self):
+        """Writes all scheduled checkpoints and stops the background thread"""
+        self.queue.put(None)
+        self.thread.join()
+        self.write_session.close()
+        self.exception_box.raise_if_set()
+
+
+def create_checkpoint_saver(max_to_keep):
+    """Saver for training checkpoints - writing in the background if --checkpoint_async_saves is set"""
+    if FLAGS.checkpoint_async_saves > 0:
+        return AsyncCheckpointSaver(max_to_keep=max_to_keep, max_pending=FLAGS.checkpoint_async_saves)
+    return tfv1.train.Saver(max_to_keep=max_to_keep)
+
+
+def close_checkpoint_savers(savers, raise_errors=True):
+    """Waits for the checkpoints of all asynchronous savers to get written and stops their threads.
+    Failed writes get logged and - if raise_errors is set - the first one gets re-raised after closing all savers."""
+    errors = []
+    for saver in savers:
+        if isinstance(saver, AsyncCheckpointSaver):
+            try:
+                saver.close()
+            except Exception as ex:  # pylint: disable = broad-except
+                log_error('Writing checkpoints failed: {}'.format(ex))
+                errors.append(ex)
+    if raise_errors and errors:
+        raise errors[0]
+
+
 def _load_checkpoint(session, checkpoint_path, allow_drop_layers):
     # Load the checkpoint and put all variables into loading list
     # we will exclude variables we do not wish to load and then
@@ -65,13 +213,17 @@ def _load_checkpoint(session, checkpoint_path, allow_drop_layers):
                 init_vars.add(v)
         load_vars -= init_vars
 
+    # Restoring all variables with one session run by feeding checkpoint values into their initializers
+    # (like v.load does per variable) - this also works on finalized graphs
+    feed_dict = {}
     for v in sorted(load_vars, key=lambda v: v.op.name):
         log_info('Loading variable from checkpoint: %s' % (v.op.name))
-        v.load(ckpt.get_tensor(v.op.name), session=session)
+        feed_dict[v.initializer.inputs[1]] = ckpt.get_tensor(v.op.name)
 
     for v in sorted(init_vars, key=lambda v: v.op.name):
         log_info('Initializing variable: %s' % (v.op.name))
-        session.run(v.initializer)
+
+    session.run([v.initializer for v in load_vars | init_vars], feed_dict=feed_dict)
 
 
 def _checkpoint_path_or_none(checkpoint_filename):
@@ -82,9 +234,7 @@ def _checkpoint_path_or_none(checkpoint_filename):
 
 
 def _initialize_all_variables(session):
-    init_vars = tfv1.global_variables()
-    for v in init_vars:
-        session.run(v.initializer)
+    session.run([v.initializer for v in tfv1.global_variables()])
 
 
 def _load_or_init_impl(session, method_order, allow_drop_layers):
@@ -73,6 +73,19 @@ def initialize_globals():
                                         intra_op_parallelism_threads=FLAGS.intra_op_parallelism_threads,
                                         gpu_options=tfv1.GPUOptions(allow_growth=FLAGS.use_allow_growth))
 
+    # Multi-process data parallelism - every process trains on its own GPU (if any) and its own shard of the data
+    c.rank, c.num_ranks = 0, 1
+    if FLAGS.horovod:
+        try:
+            import horovod.tensorflow as hvd  # pylint: disable=import-outside-toplevel
+        except ImportError:
+            log_error('--horovod requires Horovod (pip install horovod)')
+            sys.exit(1)
+        hvd.init()
+        c.rank, c.num_ranks = hvd.rank(), hvd.size()
+        c.session_config.gpu_options.visible_device_list = str(hvd.local_rank())
+    c.is_chief = c.rank == 0
+
     # CPU device
     c.cpu_device = '/cpu:0'
 
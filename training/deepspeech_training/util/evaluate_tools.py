@@ -37,12 +37,12 @@ def wer_cer_batch(samples):
 
 
 def process_decode_result(item):
-    wav_filename, ground_truth, prediction, loss = item
+    wav_filename, ground_truth, prediction, loss, candidates = item
     char_distance = levenshtein(ground_truth, prediction)
     char_length = len(ground_truth)
     word_distance = levenshtein(ground_truth.split(), prediction.split())
     word_length = len(ground_truth.split())
-    return AttrDict({
+    sample = AttrDict({
         'wav_filename': wav_filename,
         'src': ground_truth,
         'res': prediction,
@@ -54,16 +54,29 @@ def process_decode_result(item):
         'cer': char_distance / char_length,
         'wer': word_distance / word_length,
     })
+    if candidates is not None:
+        sample.candidates = candidates
+    return sample
 
 
-def calculate_and_print_report(wav_filenames, labels, decodings, losses, dataset_name):
+def calculate_and_print_report(wav_filenames, labels, decodings, losses, dataset_name, candidates=None):
     r'''
     This routine will calculate and print a WER report.
     It'll compute the `mean` WER and create ``Sample`` objects of the ``report_count`` top lowest
     loss items from the provided WER results tuple (only items with WER!=0 and ordered by their WER).
+    If provided, ``candidates`` (see :func:`decoded_candidates`) get attached to their samples.
     '''
-    samples = pmap(process_decode_result, zip(wav_filenames, labels, decodings, losses))
+    if candidates is None:
+        candidates = [None] * len(wav_filenames)
+    samples = pmap(process_decode_result, zip(wav_filenames, labels, decodings, losses, candidates))
+    return print_samples_report(samples, losses, dataset_name)
 
+
+def print_samples_report(samples, losses, dataset_name):
+    r'''
+    Sorts samples that got created by :func:`process_decode_result` and prints their WER report.
+    This allows callers to process results one by one while they arrive.
+    '''
     # Getting the WER and CER from the accumulated edit distances and lengths
     samples_wer, samples_cer = wer_cer_batch(samples)
 
@@ -118,6 +131,49 @@ def print_report(samples, losses, wer, cer, dataset_name):
         print_single_sample(s)
 
 
+def decoded_candidates(decoded, batch_index, alphabet, offset_ms=0):
+    r'''
+    Converts the N-best results of element ``batch_index`` of a :class:`ds_ctcdecoder.DecodedBatch`
+    into a list of candidate transcripts with their confidences and words. Every word gets its
+    start and end time in milliseconds (shifted by ``offset_ms``) and the summed acoustic log
+    probability of its tokens as confidence.
+    '''
+    step_ms = FLAGS.feature_win_step
+    space_label = alphabet.GetSpaceLabel()
+
+    def decode_word(tokens):
+        text = alphabet.Decode(tokens.tolist())
+        return text.decode('utf-8', errors='replace') if isinstance(text, bytes) else text
+
+    candidates = []
+    for result in range(decoded.result_offsets[batch_index], decoded.result_offsets[batch_index + 1]):
+        token_start, token_end = decoded.token_offsets[result], decoded.token_offsets[result + 1]
+        tokens = decoded.tokens[token_start:token_end]
+        timesteps = decoded.timesteps[token_start:token_end]
+        log_probs = decoded.log_probs[token_start:token_end]
+        words = []
+        word_start = None
+        for i in range(len(tokens) + 1):
+            if i < len(tokens) and tokens[i] != space_label:
+                if word_start is None:
+                    word_start = i
+                continue
+            if word_start is not None:
+                words.append({
+                    'word': decode_word(tokens[word_start:i]),
+                    'start': int(offset_ms + timesteps[word_start] * step_ms),
+                    'end': int(offset_ms + (timesteps[i - 1] + 1) * step_ms),
+                    'confidence': float(log_probs[word_start:i].sum()),
+                })
+                word_start = None
+        candidates.append({
+            'transcript': decoded.texts[result],
+            'confidence': float(decoded.confidences[result]),
+            'words': words,
+        })
+    return candidates
+
+
 def save_samples_json(samples, output_path):
     ''' Save decoded tuples as JSON, converting NumPy floats to Python floats.
 
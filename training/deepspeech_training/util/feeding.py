@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, division, print_function
 
+import threading
+
 from collections import Counter
 from functools import partial
 
@@ -13,7 +15,7 @@ from .config import Config
 from .text import text_to_char_array
 from .flags import FLAGS
 from .augmentations import apply_sample_augmentations, apply_graph_augmentations
-from .audio import read_frames_from_file, vad_split, pcm_to_np, DEFAULT_FORMAT
+from .audio import load_audio_files, read_frames_from_file, vad_split, pcm_to_np, DEFAULT_FORMAT
 from .sample_collections import samples_from_sources
 from .helpers import remember_exception, MEGABYTE
 
@@ -92,14 +94,17 @@ def create_dataset(sources,
                    train_phase=False,
                    exception_box=None,
                    process_ahead=None,
-                   buffering=1 * MEGABYTE):
+                   buffering=1 * MEGABYTE,
+                   shard=None,
+                   drop_shard_remainder=True):
     epoch_counter = Counter()  # survives restarts of the dataset and its generator
 
     def generate_values():
         epoch = epoch_counter['epoch']
         if train_phase:
             epoch_counter['epoch'] += 1
-        samples = samples_from_sources(sources, buffering=buffering, labeled=True)
+        samples = samples_from_sources(sources, buffering=buffering, labeled=True, shard=shard,
+                                       drop_shard_remainder=drop_shard_remainder)
         num_samples = len(samples)
         samples = apply_sample_augmentations(samples,
                                              augmentations,
@@ -147,30 +152,123 @@ def split_audio_file(audio_path,
                      outlier_duration_ms=10000,
                      outlier_batch_size=1,
                      exception_box=None):
+    dataset = split_audio_files([audio_path],
+                                audio_format=audio_format,
+                                batch_size=batch_size,
+                                aggressiveness=aggressiveness,
+                                outlier_duration_ms=outlier_duration_ms,
+                                outlier_batch_size=outlier_batch_size,
+                                exception_box=exception_box)
+    return dataset.map(lambda file_index, time_start, time_end, features, features_len:
+                       (time_start, time_end, features, features_len))
+
+
+def sorted_segment_pools(segments, pool_size=None):
+    """Collects (file_index, time_start, time_end, segment_buffer) tuples of consecutive files into pools of
+    (at least) pool_size segments and yields the segments of every pool sorted by length, so that consecutive
+    segments have similar durations. Without pool_size segments are passed through as they are."""
+    pool = []
+    for segment in segments:
+        pool.append(segment)
+        if pool_size is None or len(pool) >= pool_size:
+            pool.sort(key=lambda segment: len(segment[3]))
+            yield from pool
+            pool.clear()
+    pool.sort(key=lambda segment: len(segment[3]))
+    yield from pool
+
+
+class FileSegmentCounter:
+    """Keeps track of the segments of files that get transcribed from one shared dataset of pooled segments
+    (see :func:`split_audio_files`). The number of segments of a file gets announced by the dataset's generator
+    thread, while the consumer counts the segments it got results for - in any order and across file boundaries."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._num_segments = {}
+        self._num_done = Counter()
+
+    def set_num_segments(self, file_index, num_segments):
+        """Announces the total number of segments of a file (including ones that are already done)"""
+        with self._lock:
+            self._num_segments[file_index] = num_segments
+
+    def add_done(self, file_index, count=1):
+        """Counts segments of a file as done"""
+        with self._lock:
+            self._num_done[file_index] += count
+
+    def pop_finished(self):
+        """Returns the indices of all files whose segments are done (in ascending order) and forgets about them"""
+        with self._lock:
+            finished = sorted(file_index for file_index, num_segments in self._num_segments.items()
+                              if self._num_done[file_index] >= num_segments)
+            for file_index in finished:
+                del self._num_segments[file_index]
+                del self._num_done[file_index]
+            return finished
+
+
+def split_audio_files(audio_paths,
+                      audio_format=DEFAULT_FORMAT,
+                      batch_size=1,
+                      aggressiveness=3,
+                      outlier_duration_ms=10000,
+                      outlier_batch_size=1,
+                      max_segment_duration_ms=None,
+                      pool_size=None,
+                      skip_segment=None,
+                      on_file_split=None,
+                      exception_box=None):
+    """Creates one dataset of VAD-split segments of all files in audio_paths.
+    Every element of a batch is tagged with the index of its source file within audio_paths,
+    so that one session can transcribe many files while results get routed back to their files.
+    audio_paths can also be a lazy iterable (e.g. a work queue).
+    Batches are filled across file boundaries. If pool_size is provided, segments of consecutive files
+    are collected into pools of (at least) pool_size segments that get sorted by length
+    (see :func:`sorted_segment_pools`), so that batches contain segments of similar durations and require less padding.
+    If max_segment_duration_ms is provided, longer voice activity gets split at its quietest frames,
+    so that memory usage does not depend on file durations.
+    If provided, segments for which skip_segment(file_index, time_start, time_end) returns True are left out
+    and on_file_split(file_index, num_segments) gets called as soon as the number of segments of a file is known
+    (including skipped ones) - from the generator thread of the dataset (see :class:`FileSegmentCounter`)."""
+    def generate_segments():
+        # Decoding and resampling of upcoming files happens in background threads
+        # Files that are too long for being decoded in memory get streamed by read_frames_from_file
+        audio_files = load_audio_files(audio_paths, audio_format=audio_format, stream_long=True)
+        for file_index, audio_file in enumerate(audio_files):
+            frames = read_frames_from_file(audio_file, audio_format=audio_format)
+            segments = vad_split(frames,
+                                 audio_format=audio_format,
+                                 aggressiveness=aggressiveness,
+                                 max_segment_duration_ms=max_segment_duration_ms)
+            num_segments = 0
+            for segment in segments:
+                num_segments += 1
+                segment_buffer, time_start, time_end = segment
+                if skip_segment is not None and skip_segment(file_index, time_start, time_end):
+                    continue
+                yield file_index, time_start, time_end, segment_buffer
+            if on_file_split is not None:
+                on_file_split(file_index, num_segments)
+
     def generate_values():
-        frames = read_frames_from_file(audio_path)
-        segments = vad_split(frames, aggressiveness=aggressiveness)
-        for segment in segments:
-            segment_buffer, time_start, time_end = segment
-            samples = pcm_to_np(segment_buffer, audio_format)
-            yield time_start, time_end, samples
-
-    def to_mfccs(time_start, time_end, samples):
+        for file_index, time_start, time_end, segment_buffer in sorted_segment_pools(generate_segments(), pool_size):
+            yield file_index, time_start, time_end, pcm_to_np(segment_buffer, audio_format)
+
+    def to_mfccs(file_index, time_start, time_end, samples):
         features, features_len = audio_to_features(samples, audio_format.rate)
-        return time_start, time_end, features, features_len
-
-    def create_batch_set(bs, criteria):
-        return (tf.data.Dataset
-                .from_generator(remember_exception(generate_values, exception_box),
-                                output_types=(tf.int32, tf.int32, tf.float32))
-                .map(to_mfccs, num_parallel_calls=tf.data.experimental.AUTOTUNE)
-                .filter(criteria)
-                .padded_batch(bs, padded_shapes=([], [], [None, Config.n_input], [])))
-
-    nds = create_batch_set(batch_size,
-                           lambda start, end, f, fl: end - start <= int(outlier_duration_ms))
-    ods = create_batch_set(outlier_batch_size,
-                           lambda start, end, f, fl: end - start > int(outlier_duration_ms))
-    dataset = nds.concatenate(ods)
+        return file_index, time_start, time_end, features, features_len
+
+    dataset = (tf.data.Dataset
+               .from_generator(remember_exception(generate_values, exception_box),
+                               output_types=(tf.int32, tf.int32, tf.int32, tf.float32))
+               .map(to_mfccs, num_parallel_calls=tf.data.experimental.AUTOTUNE))
+    # Segments of up to outlier_duration_ms go into batches of batch_size, longer ones into batches of
+    # outlier_batch_size - in one pass, so that VAD-splitting does not have to be repeated for the outliers
+    dataset = dataset.apply(tf.data.experimental.bucket_by_sequence_length(
+        lambda index, start, end, f, fl: end - start,
+        [int(outlier_duration_ms) + 1],
+        [batch_size, outlier_batch_size],
+        padded_shapes=([], [], [], [None, Config.n_input], [])))
     dataset = dataset.prefetch(len(Config.available_devices))
     return dataset
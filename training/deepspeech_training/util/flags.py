@@ -3,6 +3,8 @@ from __future__ import absolute_import, division, print_function
 import os
 import absl.flags
 
+from .helpers import parse_trace_steps
+
 FLAGS = absl.flags.FLAGS
 
 # sphinx-doc: training_ref_flags_start
@@ -57,7 +59,7 @@ def create_flags():
     f.DEFINE_integer('dev_batch_size', 1, 'number of elements in a validation batch')
     f.DEFINE_integer('test_batch_size', 1, 'number of elements in a test batch')
 
-    f.DEFINE_integer('export_batch_size', 1, 'number of elements per batch on the exported graph')
+    f.DEFINE_integer('export_batch_size', 1, 'number of elements per batch on the exported graph - 0 for a dynamic batch size, which together with --n_steps -1 allows the native client to transcribe many utterances in one model invocation')
 
     # Performance
 
@@ -66,6 +68,8 @@ def create_flags():
     f.DEFINE_boolean('use_allow_growth', False, 'use Allow Growth flag which will allocate only required amount of GPU memory and prevent full allocation of available GPU memory')
     f.DEFINE_boolean('load_cudnn', False, 'Specifying this flag allows one to convert a CuDNN RNN checkpoint to a checkpoint capable of running on a CPU graph.')
     f.DEFINE_boolean('train_cudnn', False, 'use CuDNN RNN backend for training on GPU. Note that checkpoints created with this flag can only be used with CuDNN RNN, i.e. fine tuning on a CPU device will not work')
+    f.DEFINE_boolean('horovod', False, 'data-parallel training with one process per GPU (or per CPU) as started by horovodrun - every process trains on its own shard of the training samples, gradients get averaged through ring all-reduce and only the process of rank 0 writes checkpoints and summaries')
+    f.DEFINE_integer('gradient_accumulation_steps', 1, 'number of training steps (micro-batches) whose gradients get accumulated and averaged before they are applied - the effective batch size is this number times --train_batch_size times number of GPUs - batches with non-finite loss are left out of the average')
     f.DEFINE_boolean('automatic_mixed_precision', False, 'whether to allow automatic mixed precision training. USE OF THIS FLAG IS UNSUPPORTED. Checkpoints created with automatic mixed precision training will not be usable without mixed precision.')
 
     # Sample limits
@@ -80,6 +84,7 @@ def create_flags():
     f.DEFINE_string('load_checkpoint_dir', '', 'directory in which checkpoints are stored - defaults to directory "deepspeech/checkpoints" within user\'s data home specified by the XDG Base Directory Specification')
     f.DEFINE_string('save_checkpoint_dir', '', 'directory to which checkpoints are saved - defaults to directory "deepspeech/checkpoints" within user\'s data home specified by the XDG Base Directory Specification')
     f.DEFINE_integer('checkpoint_secs', 600, 'checkpoint saving interval in seconds')
+    f.DEFINE_integer('checkpoint_async_saves', 0, 'maximum number of checkpoints that are written in the background while training continues - a save blocks if as many are still being written - 0 for saving synchronously')
     f.DEFINE_integer('max_to_keep', 5, 'number of checkpoint files to keep - default value is 5')
     f.DEFINE_string('load_train', 'auto', 'what checkpoint to load before starting the training process. "last" for loading most recent epoch checkpoint, "best" for loading best validation loss checkpoint, "init" for initializing a new checkpoint, "auto" for trying several options.')
     f.DEFINE_string('load_evaluate', 'auto', 'what checkpoint to load for evaluation tasks (test epochs, model export, single file inference, etc). "last" for loading most recent epoch checkpoint, "best" for loading best validation loss checkpoint, "auto" for trying several options.')
@@ -93,7 +98,13 @@ def create_flags():
     f.DEFINE_string('export_dir', '', 'directory in which exported models are stored - if omitted, the model won\'t get exported')
     f.DEFINE_boolean('remove_export', False, 'whether to remove old exported models')
     f.DEFINE_boolean('export_tflite', False, 'export a graph ready for TF Lite engine')
-    f.DEFINE_integer('n_steps', 16, 'how many timesteps to process at once by the export graph, higher values mean more latency')
+    f.DEFINE_integer('n_steps', 16, 'how many timesteps to process at once by the export graph, higher values mean more latency - -1 for a dynamic number of timesteps per invocation (not supported by TF Lite)')
+    f.DEFINE_integer('export_min_steps', 16, 'for graphs exported with --n_steps -1: minimum number of timesteps a stream of the native client buffers before it runs them (and all further buffered timesteps) through the acoustic model in one invocation - 0 for running whole utterances when the stream gets finished')
+    f.DEFINE_boolean('export_optimize', False, 'optimize the exported graph by folding constants, fusing clipped ReLU layers and removing training-only nodes')
+    f.DEFINE_string('export_quantization', 'dynamic', 'post-training quantization of the exported model: "none", "dynamic" (TFLite only: 8 bit weights with dynamic-range quantization of activations), "float16" (half precision weights) or "int8" (TFLite: full integer quantization calibrated with --export_representative_files, TensorFlow: 8 bit weights)')
+    f.DEFINE_string('export_representative_files', '', 'comma-separated list of SDB or CSV files with samples for calibrating --export_quantization int8 of TFLite models')
+    f.DEFINE_integer('export_representative_steps', 100, 'maximum number of model invocations for calibrating --export_quantization int8 of TFLite models')
+    f.DEFINE_integer('export_benchmark_runs', 0, 'with --export_optimize: number of model invocations for reporting model size and latency with and without optimization - 0 for no report, as it benchmarks both models and TFLite exports get converted a second time without optimization')
     f.DEFINE_boolean('export_zip', False, 'export a TFLite model and package with LM and info.json')
     f.DEFINE_string('export_file_name', 'output_graph', 'name for the exported model file name')
     f.DEFINE_integer('export_beam_width', 500, 'default beam width to embed into exported graph')
@@ -123,8 +134,11 @@ def create_flags():
     f.DEFINE_integer('report_count', 5, 'number of phrases for each of best WER, median WER and worst WER to print out during a WER report')
 
     f.DEFINE_string('summary_dir', '', 'target directory for TensorBoard summaries - defaults to directory "deepspeech/summaries" within user\'s data home specified by the XDG Base Directory Specification')
+    f.DEFINE_string('trace_steps', '', 'training steps to capture full TensorFlow traces of, as "EPOCH:FIRST-LAST" with zero-based step numbers within the epoch (e.g. "2:500-520") - traces get written to "traces" in --summary_dir as Chrome traces and TensorBoard run metadata')
+    f.DEFINE_integer('trace_signal_steps', 10, 'number of training steps to trace after the training process received SIGUSR1 - 0 for not handling the signal')
 
     f.DEFINE_string('test_output_file', '', 'path to a file to save all src/decoded/distance/loss tuples generated during a test epoch')
+    f.DEFINE_integer('test_output_candidates', 0, 'number of candidate transcripts per sample (N-best, with confidences and word timings) to additionally save into --test_output_file - 0 for none')
 
     # Geometry
 
@@ -168,6 +182,10 @@ def create_flags():
     f.DEFINE_float('lm_alpha_max', 5, 'the maximum of the alpha hyperparameter of the CTC decoder explored during hyperparameter optimization. Language Model weight.')
     f.DEFINE_float('lm_beta_max', 5, 'the maximum beta hyperparameter of the CTC decoder explored during hyperparameter optimization. Word insertion weight.')
     f.DEFINE_integer('n_trials', 2400, 'the number of trials to run during hyperparameter optimization.')
+    f.DEFINE_integer('n_trial_processes', 1, 'number of worker processes running hyperparameter optimization trials in parallel. Each worker holds its own scorer and pulls trials from the shared --study_storage.')
+    f.DEFINE_string('study_storage', '', 'Optuna storage URL for hyperparameter optimization (e.g. "sqlite:///study.db"). An existing study named --study_name is resumed. If empty, the study is kept in memory or - if --n_trial_processes > 1 - in a temporary SQLite database.')
+    f.DEFINE_string('study_name', 'lm_optimizer', 'name of the hyperparameter optimization study within --study_storage')
+    f.DEFINE_string('logits_cache_dir', '', 'directory in which the acoustic model outputs of --test_files get cached (float16, memory-mapped) during hyperparameter optimization, so that trials only have to re-run the CTC decoder. If empty, outputs are kept in memory.')
 
     # Register validators for paths which require a file to be specified
 
@@ -175,6 +193,29 @@ def create_flags():
                          os.path.isfile,
                          message='The file pointed to by --alphabet_config_path must exist and be readable.')
 
+    f.register_validator('export_quantization',
+                         lambda value: value in ['none', 'dynamic', 'float16', 'int8'],
+                         message='--export_quantization has to be one of "none", "dynamic", "float16" or "int8".')
+
+    f.register_validator('export_min_steps',
+                         lambda value: value >= 0,
+                         message='--export_min_steps has to be at least 0.')
+
+    f.register_validator('gradient_accumulation_steps',
+                         lambda value: value >= 1,
+                         message='--gradient_accumulation_steps has to be at least 1.')
+
+    def valid_trace_steps(value):
+        try:
+            parse_trace_steps(value)
+            return True
+        except ValueError:
+            return False
+
+    f.register_validator('trace_steps',
+                         valid_trace_steps,
+                         message='--trace_steps has to be of the form "EPOCH:FIRST-LAST" with FIRST not after LAST.')
+
     f.register_validator('one_shot_infer',
                          lambda value: not value or os.path.isfile(value),
                          message='The file pointed to by --one_shot_infer must exist and be readable.')
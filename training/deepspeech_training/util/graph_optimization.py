@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+import time
+
+from collections import defaultdict
+
+import numpy as np
+import tensorflow as tf
+import tensorflow.compat.v1 as tfv1
+
+QUANTIZATION_NONE = 'none'
+QUANTIZATION_DYNAMIC = 'dynamic'
+QUANTIZATION_FLOAT16 = 'float16'
+QUANTIZATION_INT8 = 'int8'
+
+# Weights smaller than this are not worth quantizing
+MIN_QUANTIZED_WEIGHTS = 1024
+
+
+def node_name(input_name):
+    return input_name.lstrip('^').split(':')[0]
+
+
+class GraphDefRewriter:
+    """Index over the nodes of a GraphDef for rewriting it in-place"""
+    def __init__(self, graph_def):
+        self.graph_def = graph_def
+        self.nodes = {node.name: node for node in graph_def.node}
+        self.consumers = defaultdict(list)
+        for node in graph_def.node:
+            for index, input_name in enumerate(node.input):
+                self.consumers[node_name(input_name)].append((node, index))
+
+    def node(self, name, op=None):
+        node = self.nodes.get(node_name(name))
+        return node if node is not None and (op is None or node.op == op) else None
+
+    def const_value(self, name):
+        node = self.node(name, op='Const')
+        return None if node is None else tf.make_ndarray(node.attr['value'].tensor)
+
+    def add_const(self, name, value):
+        node = self.graph_def.node.add()
+        node.name = name
+        node.op = 'Const'
+        node.attr['dtype'].type = tf.as_dtype(value.dtype).as_datatype_enum
+        node.attr['value'].tensor.CopyFrom(tf.make_tensor_proto(value))
+        self.nodes[name] = node
+        return name
+
+    def set_input(self, node, index, input_name):
+        self.consumers[node_name(node.input[index])].remove((node, index))
+        node.input[index] = input_name
+        self.consumers[node_name(input_name)].append((node, index))
+
+
+def fuse_clipped_relu_layers(graph_def, protected_nodes):
+    """
+    Fuses the clipped ReLU activations of dense layers (MatMul, BiasAdd, Relu, Minimum) into the layers.
+    As min(relu(x), clip) = clip / 6 * relu6(x * 6 / clip), weights and bias of a layer get scaled by 6 / clip
+    and Relu and Minimum get replaced by a Relu6 (that runtimes fuse into the matrix multiplication). The factor
+    clip / 6 gets folded into the weights of a following dense layer or applied by a (cheap) multiplication.
+
+    Parameters
+    ----------
+    graph_def : tf.GraphDef
+        Frozen graph without training nodes - gets changed in-place
+    protected_nodes : list of str
+        Names of nodes that must not be changed or removed
+
+    Returns
+    -------
+    int
+        Number of fused layers
+    """
+    rewriter = GraphDefRewriter(graph_def)
+    protected_nodes = set(protected_nodes)
+    removed_nodes = set()
+
+    def single_consumer(node):
+        return node is not None and node.name not in protected_nodes and len(rewriter.consumers[node.name]) == 1
+
+    fused = 0
+    for minimum in list(graph_def.node):
+        if minimum.op != 'Minimum' or minimum.name in protected_nodes:
+            continue
+        relu = rewriter.node(minimum.input[0], op='Relu')
+        clip = rewriter.const_value(minimum.input[1])
+        if not single_consumer(relu) or clip is None or clip.size != 1 or float(clip) <= 0:
+            continue
+        bias_add = rewriter.node(relu.input[0], op='BiasAdd')
+        if not single_consumer(bias_add):
+            continue
+        matmul = rewriter.node(bias_add.input[0], op='MatMul')
+        if not single_consumer(matmul):
+            continue
+        weights, bias = rewriter.const_value(matmul.input[1]), rewriter.const_value(bias_add.input[1])
+        if weights is None or bias is None:
+            continue
+        scale = 6.0 / float(clip)
+        rewriter.set_input(matmul, 1, rewriter.add_const(matmul.name + '/clip_fused_weights',
+                                                         (weights * scale).astype(weights.dtype)))
+        rewriter.set_input(bias_add, 1, rewriter.add_const(bias_add.name + '/clip_fused_bias',
+                                                           (bias * scale).astype(bias.dtype)))
+        relu.op = 'Relu6'
+
+        # Folding the inverse scale into following dense layers if possible
+        consumers = list(rewriter.consumers[minimum.name])
+        if len(consumers) > 0 and all(consumer.op == 'MatMul' and index == 0
+                                      and not consumer.attr['transpose_a'].b
+                                      and rewriter.const_value(consumer.input[1]) is not None
+                                      for consumer, index in consumers):
+            for consumer, _ in consumers:
+                next_weights = rewriter.const_value(consumer.input[1])
+                rewriter.set_input(consumer, 1, rewriter.add_const(consumer.name + '/clip_unscaled_weights',
+                                                                   (next_weights / scale).astype(next_weights.dtype)))
+                rewriter.set_input(consumer, 0, relu.name)
+            removed_nodes.add(minimum.name)
+        else:
+            minimum.op = 'Mul'
+            rewriter.set_input(minimum, 1, rewriter.add_const(minimum.name + '/clip_scale',
+                                                              np.array(1.0 / scale, dtype=clip.dtype)))
+        fused += 1
+
+    kept_nodes = [node for node in graph_def.node if node.name not in removed_nodes]
+    del graph_def.node[:]
+    graph_def.node.extend(kept_nodes)
+    return fused
+
+
+def cast_weights_to_float16(graph_def, min_elements=MIN_QUANTIZED_WEIGHTS):
+    """
+    Stores large float32 constants of a frozen graph as float16 and casts them back to float32 on load.
+    This halves the model size while computations stay in float32.
+
+    Returns
+    -------
+    int
+        Number of converted constants
+    """
+    rewriter = GraphDefRewriter(graph_def)
+    converted = 0
+    for node in list(graph_def.node):
+        if node.op != 'Const' or node.attr['dtype'].type != tf.float32.as_datatype_enum:
+            continue
+        value = rewriter.const_value(node.name)
+        if value.size < min_elements:
+            continue
+        half_name = rewriter.add_const(node.name + '/float16', value.astype(np.float16))
+        node.op = 'Cast'
+        node.ClearField('input')
+        node.input.append(half_name)
+        node.ClearField('attr')
+        node.attr['SrcT'].type = tf.float16.as_datatype_enum
+        node.attr['DstT'].type = tf.float32.as_datatype_enum
+        node.attr['Truncate'].b = False
+        converted += 1
+    return converted
+
+
+def optimize_inference_graph(graph_def, input_names, output_names):
+    """
+    Optimizes a frozen inference graph: strips training-only nodes (Identity, CheckNumerics),
+    folds constants and fuses clipped ReLU dense layers.
+
+    Parameters
+    ----------
+    graph_def : tf.GraphDef
+        Frozen inference graph
+    input_names : list of str
+        Names of the input nodes
+    output_names : list of str
+        Names of the output nodes
+
+    Returns
+    -------
+    tf.GraphDef
+        Optimized graph
+    """
+    from tensorflow.tools.graph_transforms import TransformGraph  # pylint: disable=import-outside-toplevel
+    protected_nodes = list(input_names) + list(output_names)
+    graph_def = tfv1.graph_util.remove_training_nodes(graph_def, protected_nodes=protected_nodes)
+    graph_def = TransformGraph(graph_def, input_names, output_names, ['fold_constants(ignore_errors=true)'])
+    fuse_clipped_relu_layers(graph_def, protected_nodes)
+    return tfv1.graph_util.extract_sub_graph(graph_def, output_names)
+
+
+def quantize_graph_weights(graph_def, input_names, output_names, quantization):
+    """
+    Quantizes the weights of a frozen graph for the TensorFlow runtime - float16: half precision storage,
+    int8: 8 bit storage with dequantization on load. Other quantizations leave the graph as it is.
+
+    Returns
+    -------
+    tf.GraphDef
+        Quantized graph
+    """
+    if quantization == QUANTIZATION_FLOAT16:
+        cast_weights_to_float16(graph_def)
+    elif quantization == QUANTIZATION_INT8:
+        from tensorflow.tools.graph_transforms import TransformGraph  # pylint: disable=import-outside-toplevel
+        graph_def = TransformGraph(graph_def, input_names, output_names,
+                                   ['quantize_weights(minimum_size={})'.format(MIN_QUANTIZED_WEIGHTS)])
+    return graph_def
+
+
+def convert_to_tflite(graph_def, input_tensors, output_tensors, quantization, representative_dataset=None):
+    """
+    Converts a frozen graph into a TFLite model with the given post-training quantization.
+    Quantization int8 also quantizes activations and requires a representative dataset
+    (a callable that returns a generator of input value lists).
+
+    Returns
+    -------
+    bytes
+        TFLite model
+    """
+    converter = tf.lite.TFLiteConverter(graph_def, input_tensors=input_tensors, output_tensors=output_tensors)
+    if quantization != QUANTIZATION_NONE:
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantization == QUANTIZATION_FLOAT16:
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantization == QUANTIZATION_INT8:
+        converter.representative_dataset = tf.lite.RepresentativeDataset(representative_dataset)
+    # AudioSpectrogram and Mfcc ops are custom but have built-in kernels in TFLite
+    converter.allow_custom_ops = True
+    return converter.convert()
+
+
+def zero_feed(shape, dtype, dynamic_dim=1):
+    return np.zeros([dynamic_dim if dim is None or dim < 0 else dim for dim in shape], dtype=dtype)
+
+
+def benchmark_graph(graph_def, output_names, runs=10):
+    """
+    Measures the mean latency of running a frozen graph on zero inputs (unknown dimensions become 1).
+
+    Returns
+    -------
+    float
+        Mean latency in seconds
+    """
+    with tf.Graph().as_default() as graph:
+        tfv1.import_graph_def(graph_def, name='')
+        placeholders = [op for op in graph.get_operations() if op.type == 'Placeholder']
+        feed_dict = {op.outputs[0]: zero_feed(op.outputs[0].shape.as_list(), op.outputs[0].dtype.as_numpy_dtype)
+                     for op in placeholders}
+        fetches = [graph.get_tensor_by_name(name + ':0') for name in output_names]
+        with tfv1.Session(graph=graph) as session:
+            session.run(fetches, feed_dict=feed_dict)  # warm-up
+            start = time.perf_counter()
+            for _ in range(runs):
+                session.run(fetches, feed_dict=feed_dict)
+            return (time.perf_counter() - start) / max(1, runs)
+
+
+def benchmark_tflite(model_content, runs=10):
+    """
+    Measures the mean latency of invoking a TFLite model on zero inputs.
+
+    Returns
+    -------
+    float
+        Mean latency in seconds
+    """
+    interpreter = tf.lite.Interpreter(model_content=model_content)
+    interpreter.allocate_tensors()
+    for details in interpreter.get_input_details():
+        interpreter.set_tensor(details['index'], zero_feed(details['shape'], details['dtype']))
+    interpreter.invoke()  # warm-up
+    start = time.perf_counter()
+    for _ in range(runs):
+        interpreter.invoke()
+    return (time.perf_counter() - start) / max(1, runs)
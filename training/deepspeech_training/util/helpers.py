@@ -1,4 +1,5 @@
 import os
+import re
 import sys
 import time
 import heapq
@@ -6,6 +7,7 @@ import semver
 import random
 
 from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
 from collections import namedtuple
 
 KILO = 1024
@@ -17,6 +19,8 @@ SIZE_PREFIX_LOOKUP = {'k': KILOBYTE, 'm': MEGABYTE, 'g': GIGABYTE, 't': TERABYTE
 
 ValueRange = namedtuple('ValueRange', 'start end r')
 
+TRACE_STEPS_PATTERN = re.compile(r'^(?P<epoch>\d+):(?P<first>\d+)-(?P<last>\d+)$')
+
 
 def parse_file_size(file_size):
     file_size = file_size.lower().strip()
@@ -29,6 +33,26 @@ def parse_file_size(file_size):
     return SIZE_PREFIX_LOOKUP[e] * n if e in SIZE_PREFIX_LOOKUP else n
 
 
+def parse_trace_steps(spec):
+    """
+    Parameters
+    ----------
+    spec : str
+        Trace window as "EPOCH:FIRST-LAST" or empty string for none
+
+    Returns
+    -------
+    tuple of int or None
+        (epoch, first step, last step) tuple
+    """
+    if not spec:
+        return None
+    match = TRACE_STEPS_PATTERN.match(spec)
+    if not match or int(match.group('first')) > int(match.group('last')):
+        raise ValueError('Trace steps "{}" not of the form "EPOCH:FIRST-LAST"'.format(spec))
+    return int(match.group('epoch')), int(match.group('first')), int(match.group('last'))
+
+
 def keep_only_digits(txt):
     return ''.join(filter(str.isdigit, txt))
 
@@ -77,15 +101,45 @@ class Interleaved:
         return self.len
 
 
+class Sharded:
+    """Collection view that only contains every n-th element of an indexable collection.
+    By default all shards of a collection get the same length (by leaving out the remainder), so that
+    data-parallel processes iterating their shards are taking the same number of steps.
+    With drop_remainder=False, every element ends up in exactly one shard.
+    The collection must support len() and indexing."""
+    def __init__(self, collection, shard_index, num_shards, drop_remainder=True):
+        self.collection = collection
+        self.shard_index = shard_index
+        self.num_shards = num_shards
+        if drop_remainder:
+            self.len = len(collection) // num_shards
+        else:
+            self.len = (len(collection) - shard_index + num_shards - 1) // num_shards
+
+    def __getitem__(self, i):
+        if not 0 <= i < self.len:
+            raise IndexError('Shard index out of range')
+        return self.collection[i * self.num_shards + self.shard_index]
+
+    def __iter__(self):
+        for i in range(self.len):
+            yield self[i]
+
+    def __len__(self):
+        return self.len
+
+
 class LimitingPool:
     """Limits unbound ahead-processing of multiprocessing.Pool's imap method
     before items get consumed by the iteration caller.
     This prevents OOM issues in situations where items represent larger memory allocations."""
-    def __init__(self, processes=None, initializer=None, initargs=None, process_ahead=None, sleeping_for=0.1):
+    def __init__(self, processes=None, initializer=None, initargs=None, process_ahead=None, sleeping_for=0.1,
+                 use_threads=False):
         self.process_ahead = os.cpu_count() if process_ahead is None else process_ahead
         self.sleeping_for = sleeping_for
         self.processed = 0
-        self.pool = Pool(processes=processes, initializer=initializer, initargs=initargs)
+        pool_type = ThreadPool if use_threads else Pool
+        self.pool = pool_type(processes=processes, initializer=initializer, initargs=initargs)
 
     def __enter__(self):
         return self
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import fcntl
+import hashlib
+import threading
+
+from collections import defaultdict
+
+from .helpers import MEGABYTE
+
+RECORD_SEGMENT = 'segment'
+RECORD_DONE = 'done'
+
+# Byte-range locks on the journal file are used as mutexes: the first byte guards appending,
+# every other lock position is derived from a source path and represents the claim on that file.
+APPEND_LOCK_OFFSET = 0
+READ_CHUNK_SIZE = 1 * MEGABYTE
+
+
+def get_claim_offset(src_path):
+    return 1 + int.from_bytes(hashlib.sha1(src_path.encode('utf-8')).digest()[:7], 'big')
+
+
+class TranscriptionJournal:
+    """Append-only log of transcription results that allows interrupted transcription jobs to resume.
+    Every transcribed segment and every finished file gets recorded as one JSON line.
+    Several processes can share one journal as a common work queue: a file is only transcribed by
+    the process that holds its claim (a byte-range lock on the journal file), and claims are released
+    automatically by the operating system if a process dies. All methods are thread-safe."""
+    def __init__(self, path):
+        """
+        Parameters
+        ----------
+        path : str
+            Path to the journal file - gets created if not existing
+        """
+        self.path = path
+        self.journal_file = open(path, 'a+b')
+        self.read_position = 0
+        self.segments = defaultdict(list)
+        self.segment_keys = defaultdict(set)
+        self.finished = set()
+        self.claimed = set()
+        self.lock = threading.RLock()
+        self.refresh()
+
+    def _lock(self, offset, blocking=True):
+        flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+        try:
+            fcntl.lockf(self.journal_file, flags, 1, offset)
+        except (BlockingIOError, PermissionError):
+            return False
+        return True
+
+    def _unlock(self, offset):
+        fcntl.lockf(self.journal_file, fcntl.LOCK_UN, 1, offset)
+
+    def refresh(self):
+        """Reads all records that got appended (also by other processes) since the last refresh"""
+        with self.lock:
+            self._refresh()
+
+    def _refresh(self):
+        # Reading through the locking file descriptor, as closing any other descriptor of the journal
+        # file would release all locks of this process
+        data = b''
+        while True:
+            chunk = os.pread(self.journal_file.fileno(), READ_CHUNK_SIZE, self.read_position + len(data))
+            if len(chunk) == 0:
+                break
+            data += chunk
+        lines = data.split(b'\n')
+        for line in lines[:-1]:
+            self.read_position += len(line) + 1
+            try:
+                record = json.loads(line.decode('utf-8'))
+            except ValueError:
+                continue
+            src_path = record['file']
+            if record['type'] == RECORD_SEGMENT:
+                self._add_known_segment(src_path, record['segment'])
+            elif record['type'] == RECORD_DONE:
+                self._forget(src_path)
+                self.finished.add(src_path)
+        # Either empty or the incomplete record of an interrupted write
+        return len(lines[-1])
+
+    def _add_known_segment(self, src_path, segment):
+        self.segments[src_path].append(segment)
+        self.segment_keys[src_path].add((segment['start'], segment['end']))
+
+    def _forget(self, src_path):
+        self.segments.pop(src_path, None)
+        self.segment_keys.pop(src_path, None)
+
+    def _append(self, records):
+        data = b''.join((json.dumps(record, ensure_ascii=False, default=float) + '\n').encode('utf-8')
+                        for record in records)
+        self._lock(APPEND_LOCK_OFFSET)
+        try:
+            # Catching up with the records of other processes, so that the own ones will not get read again
+            incomplete = self._refresh()
+            if incomplete > 0:
+                # Terminating the incomplete record of an interrupted write
+                data = b'\n' + data
+                self.read_position += incomplete
+            os.write(self.journal_file.fileno(), data)
+            os.fsync(self.journal_file.fileno())
+            self.read_position += len(data)
+        finally:
+            self._unlock(APPEND_LOCK_OFFSET)
+
+    def claim(self, src_path):
+        """
+        Tries to claim a file for transcription.
+
+        Returns
+        -------
+        bool
+            True, if the file is neither finished nor claimed by another process
+        """
+        with self.lock:
+            if src_path in self.claimed:
+                return True
+            if not self._lock(get_claim_offset(src_path), blocking=False):
+                return False
+            self._refresh()
+            if src_path in self.finished:
+                self._unlock(get_claim_offset(src_path))
+                return False
+            self.claimed.add(src_path)
+            return True
+
+    def is_known_segment(self, src_path, time_start, time_end):
+        """True, if the segment was already transcribed by an earlier run"""
+        with self.lock:
+            return (time_start, time_end) in self.segment_keys[src_path]
+
+    def add_segments(self, file_segments):
+        """Records transcription results of claimed files as list of (source path, tlog entry) tuples"""
+        with self.lock:
+            self._append({'type': RECORD_SEGMENT, 'file': src_path, 'segment': segment}
+                         for src_path, segment in file_segments)
+            for src_path, segment in file_segments:
+                self._add_known_segment(src_path, segment)
+
+    def finish(self, src_path):
+        """Marks a claimed file as finished and releases its claim"""
+        with self.lock:
+            self._append([{'type': RECORD_DONE, 'file': src_path}])
+            self._forget(src_path)
+            self.finished.add(src_path)
+            if src_path in self.claimed:
+                self.claimed.remove(src_path)
+                self._unlock(get_claim_offset(src_path))
+
+    def close(self):
+        with self.lock:
+            for src_path in self.claimed:
+                self._unlock(get_claim_offset(src_path))
+            self.claimed.clear()
+            self.journal_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+
+import numpy as np
+
+PROBS_SUFFIX = '.probs'
+META_SUFFIX = '.json'
+PROBS_DTYPE = np.float16
+
+
+class LogitsSet:
+    """Read-only collection of acoustic model outputs (softmax probabilities) of an evaluation set.
+    Probabilities of all samples are concatenated along the time axis into one compact float16
+    array that is either held in memory or memory-mapped from disk."""
+    def __init__(self, name, probs, lengths, wav_filenames, transcripts, losses):
+        """
+        Parameters
+        ----------
+        name : str
+            Name of the set (typically the source CSV or SDB path) - used for reporting
+        probs : numpy.ndarray
+            Array of shape [total number of time steps, number of classes] holding the
+            un-padded softmax outputs of all samples one after another
+        lengths : list of int
+            Number of time steps per sample
+        wav_filenames : list of str
+            Sample IDs
+        transcripts : list of str
+            Ground truth transcripts
+        losses : list of float
+            CTC losses per sample
+        """
+        self.name = name
+        self.probs = probs
+        self.lengths = np.asarray(lengths, dtype=np.int32)
+        self.offsets = np.concatenate([[0], np.cumsum(self.lengths)]).astype(np.int64)
+        self.wav_filenames = wav_filenames
+        self.transcripts = transcripts
+        self.losses = losses
+
+    @property
+    def num_classes(self):
+        return self.probs.shape[1]
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def batches(self, batch_size):
+        """
+        Yields zero-padded batches of probabilities ready to be fed into the batched CTC decoder.
+
+        Parameters
+        ----------
+        batch_size : int
+            Maximum number of samples per batch
+
+        Returns
+        -------
+        iterable of tuple
+            (probabilities as float32 array of shape [batch_size, max_length, num_classes], lengths)
+        """
+        for start in range(0, len(self), batch_size):
+            lengths = self.lengths[start:start + batch_size]
+            batch_probs = np.zeros((len(lengths), max(1, lengths.max()), self.num_classes), dtype=np.float32)
+            for i, length in enumerate(lengths):
+                offset = self.offsets[start + i]
+                batch_probs[i, :length] = self.probs[offset:offset + length]
+            yield batch_probs, lengths
+
+
+def load_logits_set(path):
+    """Opens a LogitsSet that was written by a LogitsSetWriter to path - the probabilities get memory-mapped"""
+    with open(path + META_SUFFIX, 'r') as meta_file:
+        meta = json.load(meta_file)
+    total_length = sum(meta['lengths'])
+    if total_length > 0:
+        probs = np.memmap(path + PROBS_SUFFIX, dtype=PROBS_DTYPE, mode='r', shape=(total_length, meta['num_classes']))
+    else:
+        probs = np.zeros((0, meta['num_classes']), dtype=PROBS_DTYPE)
+    return LogitsSet(meta['name'], probs, meta['lengths'], meta['wav_filenames'], meta['transcripts'], meta['losses'])
+
+
+class LogitsSetWriter:
+    """Incrementally collects batches of acoustic model outputs into a LogitsSet.
+    If a path is provided, probabilities are streamed to disk and memory-mapped once finished,
+    otherwise they are kept in memory."""
+    def __init__(self, name, path=None):
+        """
+        Parameters
+        ----------
+        name : str
+            Name of the set - see LogitsSet
+        path : str
+            Path prefix of the files the set should get written to - if None, the set is kept in memory
+        """
+        self.name = name
+        self.path = path
+        self.probs_file = None if path is None else open(path + PROBS_SUFFIX, 'wb')
+        self.chunks = []
+        self.num_classes = None
+        self.lengths = []
+        self.wav_filenames = []
+        self.transcripts = []
+        self.losses = []
+
+    def __enter__(self):
+        return self
+
+    def add_batch(self, wav_filenames, probs, lengths, transcripts, losses):
+        """
+        Adds a batch of (padded) softmax outputs.
+
+        Parameters
+        ----------
+        wav_filenames : list of str
+            Sample IDs of the batch
+        probs : numpy.ndarray
+            Batch-major probabilities of shape [batch_size, max_length, num_classes]
+        lengths : list of int
+            Actual number of time steps per sample
+        transcripts : list of str
+            Ground truth transcripts of the batch
+        losses : list of float
+            CTC losses of the batch
+        """
+        self.num_classes = probs.shape[2]
+        for sample_probs, length in zip(probs, lengths):
+            chunk = np.ascontiguousarray(sample_probs[:length], dtype=PROBS_DTYPE)
+            if self.probs_file is None:
+                self.chunks.append(chunk)
+            else:
+                self.probs_file.write(chunk.tobytes())
+            self.lengths.append(int(length))
+        self.wav_filenames.extend(wav_filenames)
+        self.transcripts.extend(transcripts)
+        self.losses.extend(float(loss) for loss in losses)
+
+    def finish(self):
+        """Finalizes writing and returns the resulting LogitsSet"""
+        num_classes = 0 if self.num_classes is None else self.num_classes
+        if self.probs_file is None:
+            probs = np.concatenate(self.chunks) if self.chunks else np.zeros((0, num_classes), dtype=PROBS_DTYPE)
+            self.chunks = []
+            return LogitsSet(self.name, probs, self.lengths, self.wav_filenames, self.transcripts, self.losses)
+        self.probs_file.close()
+        self.probs_file = None
+        with open(self.path + META_SUFFIX, 'w') as meta_file:
+            json.dump({
+                'name': self.name,
+                'num_classes': num_classes,
+                'lengths': self.lengths,
+                'wav_filenames': self.wav_filenames,
+                'transcripts': self.transcripts,
+                'losses': self.losses
+            }, meta_file, ensure_ascii=False)
+        return load_logits_set(self.path)
+
+    def __exit__(self, *args):
+        if self.probs_file is not None:
+            self.probs_file.close()
+            self.probs_file = None
+
+
+def get_logits_set_path(cache_dir, index, source):
+    """Path prefix for caching the outputs of the index-th evaluation source within cache_dir"""
+    return os.path.join(cache_dir, '{}_{}'.format(index, os.path.splitext(os.path.basename(source))[0]))
@@ -6,7 +6,7 @@ import json
 from pathlib import Path
 from functools import partial
 
-from .helpers import MEGABYTE, GIGABYTE, Interleaved
+from .helpers import MEGABYTE, GIGABYTE, Interleaved, Sharded
 from .audio import Sample, DEFAULT_FORMAT, AUDIO_TYPE_OPUS, SERIALIZABLE_AUDIO_TYPES, get_audio_type_from_extension
 
 BIG_ENDIAN = 'big'
@@ -386,7 +386,7 @@ def samples_from_source(sample_source, buffering=BUFFER_SIZE, labeled=None):
     raise ValueError('Unknown file type: "{}"'.format(ext))
 
 
-def samples_from_sources(sample_sources, buffering=BUFFER_SIZE, labeled=None):
+def samples_from_sources(sample_sources, buffering=BUFFER_SIZE, labeled=None, shard=None, drop_shard_remainder=True):
     """
     Loads and combines samples from a list of source files. Sources are combined in an interleaving way to
     keep default sample order from shortest to longest.
@@ -402,6 +402,12 @@ def samples_from_sources(sample_sources, buffering=BUFFER_SIZE, labeled=None):
         If False: Ignores transcripts (if available) and always reads (unlabeled) util.audio.Sample instances.
         If None: Reads util.sample_collections.LabeledSample instances from sources with transcripts and
         util.audio.Sample instances from sources with no transcripts.
+    shard : tuple of int or None
+        If a (shard index, number of shards) tuple: Only reads every n-th sample of every source, starting with the
+        sample of the given index. Shards keep the order of the samples.
+    drop_shard_remainder : bool
+        If True, all shards get the same number of samples (by leaving out the remainder of every source).
+        If False, every sample belongs to exactly one shard.
 
     Returns
     -------
@@ -410,7 +416,10 @@ def samples_from_sources(sample_sources, buffering=BUFFER_SIZE, labeled=None):
     sample_sources = list(sample_sources)
     if len(sample_sources) == 0:
         raise ValueError('No files')
-    if len(sample_sources) == 1:
-        return samples_from_source(sample_sources[0], buffering=buffering, labeled=labeled)
     cols = list(map(partial(samples_from_source, buffering=buffering, labeled=labeled), sample_sources))
+    if shard is not None:
+        # Sharding every source, as only they are indexable (avoids loading samples of other shards)
+        cols = [Sharded(col, *shard, drop_remainder=drop_shard_remainder) for col in cols]
+    if len(cols) == 1:
+        return cols[0]
     return Interleaved(*cols, key=lambda s: s.duration)
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+import os
+import signal
+
+import tensorflow.compat.v1 as tfv1
+from tensorflow.python.client import timeline
+
+from .helpers import parse_trace_steps
+from .logging import log_info
+
+
+class StepTracer:
+    """Captures full TensorFlow traces of training steps within a configured window of an epoch
+    or of the steps following the reception of SIGUSR1 by the process.
+    Every traced step gets written as Chrome trace (chrome://tracing) and as TensorBoard run metadata."""
+    def __init__(self, output_dir, trace_steps='', signal_steps=0):
+        """
+        Parameters
+        ----------
+        output_dir : str
+            Directory to write Chrome traces to
+        trace_steps : str
+            Trace window as "EPOCH:FIRST-LAST" (zero-based step numbers within the epoch)
+        signal_steps : int
+            Number of steps to trace after receiving SIGUSR1 - 0 for not installing a signal handler
+        """
+        self.output_dir = output_dir
+        self.window = parse_trace_steps(trace_steps)
+        self.signal_steps = signal_steps
+        self.pending_signal_steps = 0
+        if signal_steps > 0 and hasattr(signal, 'SIGUSR1'):
+            signal.signal(signal.SIGUSR1, self._on_signal)
+
+    def _on_signal(self, signum, frame):
+        # Only sets a counter, as the handler interrupts arbitrary Python code
+        self.pending_signal_steps = self.signal_steps
+
+    def should_trace(self, epoch, step):
+        """True, if step number ``step`` (zero-based) of epoch ``epoch`` is to be traced"""
+        if self.pending_signal_steps > 0:
+            return True
+        if self.window is None:
+            return False
+        window_epoch, first, last = self.window
+        return epoch == window_epoch and first <= step <= last
+
+    def run_args(self, epoch, step):
+        """Keyword arguments for session.run - empty if the step is not to be traced"""
+        if not self.should_trace(epoch, step):
+            return {}
+        return dict(options=tfv1.RunOptions(trace_level=tfv1.RunOptions.FULL_TRACE),
+                    run_metadata=tfv1.RunMetadata())
+
+    def save(self, run_args, epoch, step, global_step, summary_writer):
+        """Writes the trace of a step that was run with ``run_args``"""
+        if 'run_metadata' not in run_args:
+            return
+        if self.pending_signal_steps > 0:
+            self.pending_signal_steps -= 1
+        run_metadata = run_args['run_metadata']
+        os.makedirs(self.output_dir, exist_ok=True)
+        trace_path = os.path.join(self.output_dir, 'trace_epoch_{}_step_{}.json'.format(epoch, step))
+        with open(trace_path, 'w') as trace_file:
+            trace_file.write(timeline.Timeline(run_metadata.step_stats).generate_chrome_trace_format())
+        summary_writer.add_run_metadata(run_metadata, 'epoch_{}_step_{}'.format(epoch, step), global_step)
+        log_info('Wrote trace of step {} of epoch {} to {}'.format(step, epoch, trace_path))
@@ -13,13 +13,14 @@ import logging
 logging.getLogger('sox').setLevel(logging.ERROR)
 import glob
 
-from deepspeech_training.util.audio import AudioFile
 from deepspeech_training.util.config import Config, initialize_globals
-from deepspeech_training.util.feeding import split_audio_file
+from deepspeech_training.util.evaluate_tools import decoded_candidates
+from deepspeech_training.util.feeding import FileSegmentCounter, split_audio_files
 from deepspeech_training.util.flags import create_flags, FLAGS
+from deepspeech_training.util.helpers import ExceptionBox
+from deepspeech_training.util.journal import TranscriptionJournal
 from deepspeech_training.util.logging import log_error, log_info, log_progress, create_progressbar
-from ds_ctcdecoder import ctc_beam_search_decoder_batch, Scorer
-from multiprocessing import Process, cpu_count
+from ds_ctcdecoder import BatchDecoder, Scorer
 
 
 def fail(message, code=1):
@@ -27,64 +28,127 @@ def fail(message, code=1):
     sys.exit(code)
 
 
-def transcribe_file(audio_path, tlog_path):
+def write_tlog(dst_path, transcripts):
+    transcripts = sorted(transcripts, key=lambda t: t['start'])
+    tmp_path = dst_path + '.tmp'
+    with open(tmp_path, 'w') as tlog_file:
+        json.dump(transcripts, tlog_file, default=float)
+    os.replace(tmp_path, dst_path)
+
+
+def transcribe_files(src_paths, dst_paths, journal=None):
+    r'''
+    Transcribes all files of src_paths within one TensorFlow session, so that graph, checkpoint and scorer
+    get loaded only once. VAD segments of all files are streamed through one shared dataset and their
+    results get routed back to the transcription logs of dst_paths. Every transcription log gets written
+    as soon as all segments of its file got transcribed.
+    If a TranscriptionJournal is provided, only files that could be claimed from it get transcribed,
+    segments that are already recorded in it are skipped and all new results are recorded.
+    '''
     from deepspeech_training.train import create_model  # pylint: disable=cyclic-import,import-outside-toplevel
     from deepspeech_training.util.checkpoints import load_graph_for_evaluation
     initialize_globals()
     scorer = Scorer(FLAGS.lm_alpha, FLAGS.lm_beta, FLAGS.scorer_path, Config.alphabet)
-    try:
-        num_processes = cpu_count()
-    except NotImplementedError:
-        num_processes = 1
-    with AudioFile(audio_path, as_path=True) as wav_path:
-        data_set = split_audio_file(wav_path,
-                                    batch_size=FLAGS.batch_size,
-                                    aggressiveness=FLAGS.vad_aggressiveness,
-                                    outlier_duration_ms=FLAGS.outlier_duration_ms,
-                                    outlier_batch_size=FLAGS.outlier_batch_size)
-        iterator = tf.data.Iterator.from_structure(data_set.output_types, data_set.output_shapes,
-                                                   output_classes=data_set.output_classes)
-        batch_time_start, batch_time_end, batch_x, batch_x_len = iterator.get_next()
-        no_dropout = [None] * 6
-        logits, _ = create_model(batch_x=batch_x, seq_length=batch_x_len, dropout=no_dropout)
-        transposed = tf.nn.softmax(tf.transpose(logits, [1, 0, 2]))
-        tf.train.get_or_create_global_step()
-        with tf.Session(config=Config.session_config) as session:
-            load_graph_for_evaluation(session)
-            session.run(iterator.make_initializer(data_set))
-            transcripts = []
-            while True:
-                try:
-                    starts, ends, batch_logits, batch_lengths = \
-                        session.run([batch_time_start, batch_time_end, transposed, batch_x_len])
-                except tf.errors.OutOfRangeError:
-                    break
-                decoded = ctc_beam_search_decoder_batch(batch_logits, batch_lengths, Config.alphabet, FLAGS.beam_width,
-                                                        num_processes=num_processes,
-                                                        scorer=scorer)
-                decoded = list(d[0][1] for d in decoded)
-                transcripts.extend(zip(starts, ends, decoded))
-            transcripts.sort(key=lambda t: t[0])
-            transcripts = [{'start': int(start),
-                            'end': int(end),
-                            'transcript': transcript} for start, end, transcript in transcripts]
-            with open(tlog_path, 'w') as tlog_file:
-                json.dump(transcripts, tlog_file, default=float)
-
-
-def transcribe_many(src_paths,dst_paths):
+    decoder = BatchDecoder(Config.alphabet, FLAGS.beam_width, scorer=scorer)
+
+    # Files in the order they get fed into the dataset - index by the file indices of the batches
+    files = []
+    transcripts = []
+    # Segment counts of files get announced by the generator thread of the dataset
+    segment_counter = FileSegmentCounter()
+
+    def claim_files():
+        for src_path, dst_path in zip(src_paths, dst_paths):
+            if journal is not None:
+                if not journal.claim(src_path):
+                    continue
+                transcripts.append(list(journal.segments[src_path]))
+            else:
+                transcripts.append([])
+            segment_counter.add_done(len(files), count=len(transcripts[-1]))
+            files.append((src_path, dst_path))
+            yield src_path
+
+    def skip_segment(file_index, time_start, time_end):
+        return journal is not None and journal.is_known_segment(files[file_index][0], int(time_start), int(time_end))
+
+    num_finished = 0
+
+    def finish_file(file_index):
+        nonlocal num_finished
+        src_path, dst_path = files[file_index]
+        write_tlog(dst_path, transcripts[file_index])
+        transcripts[file_index] = None
+        if journal is not None:
+            journal.finish(src_path)
+        num_finished += 1
+        log_progress('Transcribed file "{}" to "{}"'.format(src_path, dst_path))
+        pbar.update(num_finished)
+
+    exception_box = ExceptionBox()
+    data_set = split_audio_files(claim_files(),
+                                 batch_size=FLAGS.batch_size,
+                                 aggressiveness=FLAGS.vad_aggressiveness,
+                                 outlier_duration_ms=FLAGS.outlier_duration_ms,
+                                 outlier_batch_size=FLAGS.outlier_batch_size,
+                                 max_segment_duration_ms=FLAGS.max_segment_duration_ms or None,
+                                 pool_size=FLAGS.segment_pool_size if FLAGS.segment_pool_size > 0 else None,
+                                 skip_segment=skip_segment,
+                                 on_file_split=segment_counter.set_num_segments,
+                                 exception_box=exception_box)
+    iterator = tf.data.Iterator.from_structure(data_set.output_types, data_set.output_shapes,
+                                               output_classes=data_set.output_classes)
+    batch_file_index, batch_time_start, batch_time_end, batch_x, batch_x_len = iterator.get_next()
+    no_dropout = [None] * 6
+    logits, _ = create_model(batch_x=batch_x, seq_length=batch_x_len, dropout=no_dropout)
+    transposed = tf.nn.softmax(tf.transpose(logits, [1, 0, 2]))
+    tf.train.get_or_create_global_step()
     pbar = create_progressbar(prefix='Transcribing files | ', max_value=len(src_paths)).start()
-    for i in range(len(src_paths)):
-        p = Process(target=transcribe_file, args=(src_paths[i], dst_paths[i]))
-        p.start()
-        p.join()
-        log_progress('Transcribed file {} of {} from "{}" to "{}"'.format(i + 1, len(src_paths), src_paths[i], dst_paths[i]))
-        pbar.update(i)
+    with tf.Session(config=Config.session_config) as session:
+        load_graph_for_evaluation(session)
+        session.run(iterator.make_initializer(data_set))
+        while True:
+            try:
+                file_indices, starts, ends, batch_logits, batch_lengths = \
+                    session.run([batch_file_index, batch_time_start, batch_time_end, transposed, batch_x_len])
+            except tf.errors.OutOfRangeError:
+                exception_box.raise_if_set()
+                break
+            decoded = decoder.decode_columns(batch_logits, batch_lengths, num_results=max(1, FLAGS.candidates))
+            file_segments = []
+            for i, (file_index, start, end) in enumerate(zip(file_indices, starts, ends)):
+                entry = {'start': int(start),
+                         'end': int(end),
+                         'transcript': decoded.texts[decoded.result_offsets[i]]}
+                if FLAGS.candidates > 0:
+                    entry['candidates'] = decoded_candidates(decoded, i, Config.alphabet, offset_ms=int(start))
+                transcripts[file_index].append(entry)
+                segment_counter.add_done(file_index)
+                file_segments.append((files[file_index][0], entry))
+            if journal is not None:
+                journal.add_segments(file_segments)
+            for file_index in segment_counter.pop_finished():
+                finish_file(file_index)
+    for file_index, file_transcripts in enumerate(transcripts):
+        if file_transcripts is not None:
+            finish_file(file_index)
     pbar.finish()
+    return num_finished
+
+
+def transcribe_many(src_paths, dst_paths):
+    if FLAGS.journal:
+        with TranscriptionJournal(FLAGS.journal) as journal:
+            num_finished = transcribe_files(src_paths, dst_paths, journal=journal)
+        log_info('Transcribed {} files - {} of {} files are finished according to journal "{}"'
+                 .format(num_finished, len(journal.finished.intersection(src_paths)), len(src_paths), FLAGS.journal))
+    else:
+        num_finished = transcribe_files(src_paths, dst_paths)
+        log_info('Transcribed {} files'.format(num_finished))
 
 
 def transcribe_one(src_path, dst_path):
-    transcribe_file(src_path, dst_path)
+    transcribe_files([src_path], [dst_path])
     log_info('Transcribed file "{}" to "{}"'.format(src_path, dst_path))
 
 
@@ -114,12 +178,12 @@ def main(_):
                 catalog_entries = [(resolve(catalog_dir, e['audio']), resolve(catalog_dir, e['tlog'])) for e in catalog_entries]
                 if any(map(lambda e: not os.path.isfile(e[0]), catalog_entries)):
                     fail('Missing source file(s) in catalog')
-                if not FLAGS.force and any(map(lambda e: os.path.isfile(e[1]), catalog_entries)):
+                if not FLAGS.force and not FLAGS.journal and any(map(lambda e: os.path.isfile(e[1]), catalog_entries)):
                     fail('Destination file(s) from catalog already existing, use --force for overwriting')
                 if any(map(lambda e: not os.path.isdir(os.path.dirname(e[1])), catalog_entries)):
                     fail('Missing destination directory for at least one catalog entry')
-                src_paths,dst_paths = zip(*paths)
-                transcribe_many(src_paths,dst_paths)
+                src_paths, dst_paths = zip(*catalog_entries)
+                transcribe_many(src_paths, dst_paths)
             else:
                 # Transcribe one file
                 dst_path = os.path.abspath(FLAGS.dst) if FLAGS.dst else os.path.splitext(src_path)[0] + '.tlog'
@@ -144,7 +208,7 @@ def main(_):
                 else:
                     wav_paths = glob.glob(src_path + "/**/*.wav")
                 dst_paths = [path.replace('.wav','.tlog') for path in wav_paths]
-                transcribe_many(wav_paths,dst_paths)
+                transcribe_many(wav_paths, dst_paths)
 
 
 if __name__ == '__main__':
@@ -165,4 +229,16 @@ if __name__ == '__main__':
     tf.app.flags.DEFINE_integer('batch_size', 40, 'Default batch size')
     tf.app.flags.DEFINE_float('outlier_duration_ms', 10000, 'Duration in ms after which samples are considered outliers')
     tf.app.flags.DEFINE_integer('outlier_batch_size', 1, 'Batch size for duration outliers (defaults to 1)')
+    tf.app.flags.DEFINE_integer('max_segment_duration_ms', 60000, 'Maximum duration of a VAD segment - longer voice '
+                                                                   'activity gets split at its quietest frame. Keeps '
+                                                                   'memory bounded for long recordings - 0 for no limit')
+    tf.app.flags.DEFINE_integer('segment_pool_size', 400, 'Number of VAD segments (from consecutive files) to collect '
+                                                          'and sort by duration before batching - 0 for no sorting')
+    tf.app.flags.DEFINE_string('journal', '', 'Path to a work journal for catalog and directory jobs. All transcription '
+                                              'results get recorded there, so that a re-run skips finished files and '
+                                              'resumes partially transcribed ones. Several processes with the same '
+                                              'arguments can share one journal for distributing the work. Destination '
+                                              'files of unfinished entries get overwritten.')
+    tf.app.flags.DEFINE_integer('candidates', 0, 'Number of candidate transcripts (N-best, with confidences and word '
+                                                 'timings) to additionally write per segment - 0 for none')
     tf.app.run(main)